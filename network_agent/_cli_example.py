@@ -1,5 +1,6 @@
-from chat_engine import chat, print_conversation
+from chat_engine import chat_stream, print_conversation
 from bedrock_utils import initialize_bedrock_client
+from history import HistoryManager
 from tools import get_all_tools
 
 
@@ -8,6 +9,7 @@ def main():
     bedrock_client = initialize_bedrock_client()
     tools = get_all_tools()
     messages = []
+    history = HistoryManager()
     
     print("Welcome to the AWS Network Assistant. You can ask about VPCs, Internet Gateways, NAT Gateways, Route Tables, and other network components.")
     print("Type 'exit', 'quit', or 'bye' to end the conversation.")
@@ -17,8 +19,10 @@ def main():
         messages.append({"role": "user", "content": [{"text": user_input}]})
         if user_input.lower() in ['exit', 'quit', 'bye']:
             break
-        response = chat(user_input, messages, bedrock_client, tools)
-        print("Assistant:", response[-1]["content"][0]["text"])
+        print("Assistant: ", end="", flush=True)
+        for text in chat_stream(user_input, messages, bedrock_client, tools, history=history):
+            print(text, end="", flush=True)
+        print()
     
     print("\nFinal Conversation History:")
     print_conversation(messages)
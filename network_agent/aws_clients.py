@@ -0,0 +1,213 @@
+# aws_clients.py
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+# Pool-wide defaults, overridable through the environment so deployments can
+# tune them without a code change.
+MAX_POOL_CONNECTIONS = int(os.environ.get("NW_MAX_POOL_CONNECTIONS", "50"))
+TCP_KEEPALIVE = os.environ.get("NW_TCP_KEEPALIVE", "true").lower() == "true"
+RETRY_MAX_ATTEMPTS = int(os.environ.get("NW_RETRY_MAX_ATTEMPTS", "5"))
+RETRY_MODE = os.environ.get("NW_RETRY_MODE", "standard")
+CONNECT_TIMEOUT = int(os.environ.get("NW_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = int(os.environ.get("NW_READ_TIMEOUT", "60"))
+
+
+class ClientPool:
+    """
+    Thread-safe pool of boto3 clients keyed by (service, region, profile).
+
+    boto3 clients are expensive to build (endpoint and service model loading,
+    HTTP connection pool setup) but safe to share across threads once created.
+    Sessions are not thread-safe, so every session and client creation happens
+    under the pool lock and each profile gets exactly one session. boto3 itself is
+    imported when the first client is created, so importing this module is cheap.
+    """
+
+    def __init__(self, max_pool_connections: int = MAX_POOL_CONNECTIONS,
+                 tcp_keepalive: bool = TCP_KEEPALIVE,
+                 retry_max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 retry_mode: str = RETRY_MODE,
+                 connect_timeout: int = CONNECT_TIMEOUT,
+                 read_timeout: int = READ_TIMEOUT):
+        self._config_options = dict(
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=tcp_keepalive,
+            retries={"max_attempts": retry_max_attempts, "mode": retry_mode},
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
+        self._config: Optional["Config"] = None
+        self._lock = threading.Lock()
+        self._sessions: Dict[Optional[str], "boto3.session.Session"] = {}
+        self._clients: Dict[Tuple[str, str, Optional[str]], Any] = {}
+        self._event_handlers: List[Tuple[str, Callable[..., Any]]] = []
+
+    @property
+    def config(self) -> "Config":
+        if self._config is None:
+            from botocore.config import Config
+            self._config = Config(**self._config_options)
+        return self._config
+
+    def _get_session(self, profile: Optional[str]) -> "boto3.session.Session":
+        # Caller must hold self._lock
+        session = self._sessions.get(profile)
+        if session is None:
+            import boto3
+            session = boto3.session.Session(profile_name=profile)
+            self._sessions[profile] = session
+        return session
+
+    def get_client(self, service: str, region: str, profile: Optional[str] = None) -> Any:
+        """
+        Return a shared client for the service/region/profile, creating it on first use.
+
+        Args:
+        service (str): The AWS service name (e.g., "ec2", "bedrock-runtime").
+        region (str): The AWS region to connect to.
+        profile (Optional[str]): Named credentials profile. Defaults to the default credential chain.
+
+        Returns:
+        Any: A configured boto3 client.
+        """
+        key = (service, region, profile)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                session = self._get_session(profile)
+                client = session.client(service, region_name=region, config=self.config)
+                for event_name, handler in self._event_handlers:
+                    client.meta.events.register(event_name, handler)
+                self._clients[key] = client
+                logger.info(f"Created pooled {service} client for region: {region}")
+            return client
+
+    def add_event_handler(self, event_name: str, handler: Callable[..., Any]) -> None:
+        """
+        Register a botocore event handler (e.g., "before-call") on every pooled client, current and future.
+
+        Args:
+        event_name (str): The botocore event, optionally narrowed (e.g., "before-call.ec2").
+        handler (Callable[..., Any]): Called with the event's keyword arguments.
+        """
+        with self._lock:
+            self._event_handlers.append((event_name, handler))
+            for client in self._clients.values():
+                client.meta.events.register(event_name, handler)
+
+    def access_key_id(self, profile: Optional[str] = None) -> Optional[str]:
+        """Return the access key ID of a profile's credentials (no AWS call for static credentials)."""
+        with self._lock:
+            credentials = self._get_session(profile).get_credentials()
+        return credentials.access_key if credentials else None
+
+    def clear(self) -> None:
+        """Drop all pooled clients and sessions (e.g., after credentials rotate)."""
+        with self._lock:
+            self._clients.clear()
+            self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+_default_pool = ClientPool()
+
+
+def get_client(service: str, region: str, profile: Optional[str] = None) -> Any:
+    """
+    Return a pooled boto3 client from the process-wide pool.
+
+    Args:
+    service (str): The AWS service name (e.g., "ec2").
+    region (str): The AWS region to connect to.
+    profile (Optional[str]): Named credentials profile, if any.
+
+    Returns:
+    Any: A configured boto3 client shared with every other caller.
+    """
+    return _default_pool.get_client(service, region, profile)
+
+
+def get_pool() -> ClientPool:
+    """Return the process-wide client pool."""
+    return _default_pool
+
+
+# Seconds after a failed account ID lookup during which "unknown" is returned without retrying
+ACCOUNT_RETRY_SECONDS = 30
+
+_account_ids: Dict[Optional[str], str] = {}
+# profile -> time.monotonic() before which a failed lookup is not retried
+_account_failures: Dict[Optional[str], float] = {}
+_account_lock = threading.Lock()
+# Callables (profile -> account ID or None) consulted before calling STS
+_account_resolvers: List[Callable[[Optional[str]], Optional[str]]] = []
+
+
+def add_account_resolver(resolver: Callable[[Optional[str]], Optional[str]]) -> None:
+    """
+    Register a lookup that get_account_id tries before calling STS.
+
+    Lets a persistent store remember account IDs across processes, so a warm start
+    needs no STS call. A resolver returns None when it does not know the account.
+    """
+    _account_resolvers.append(resolver)
+
+
+def get_account_id(profile: Optional[str] = None) -> str:
+    """
+    Return the AWS account ID for a credentials profile, looked up once per process.
+
+    Args:
+    profile (Optional[str]): Named credentials profile, if any.
+
+    Returns:
+    str: The account ID, or "unknown" if it could not be determined.
+    """
+    account_id = _account_ids.get(profile)
+    if account_id is not None:
+        return account_id
+    # Every AWS call asks for the account (e.g., to pick its rate limit bucket), so a failed
+    # lookup is only retried after a pause rather than by each call, one at a time
+    if time.monotonic() < _account_failures.get(profile, 0):
+        return "unknown"
+
+    with _account_lock:
+        if time.monotonic() < _account_failures.get(profile, 0):
+            return "unknown"
+        if profile not in _account_ids:
+            for resolver in _account_resolvers:
+                try:
+                    account_id = resolver(profile)
+                except Exception as e:
+                    logger.warning(f"Account ID resolver failed: {str(e)}")
+                    account_id = None
+                if account_id:
+                    _account_ids[profile] = account_id
+                    return account_id
+            try:
+                # STS is a global service; any region works for get_caller_identity
+                sts = get_client("sts", "us-east-1", profile)
+                _account_ids[profile] = sts.get_caller_identity()["Account"]
+            except Exception as e:
+                # Remember the failure only briefly, so a later call can still succeed
+                _account_failures[profile] = time.monotonic() + ACCOUNT_RETRY_SECONDS
+                logger.warning(f"Could not determine AWS account ID (retrying in {ACCOUNT_RETRY_SECONDS}s): "
+                               f"{str(e)}")
+                return "unknown"
+        return _account_ids[profile]
@@ -1,9 +1,13 @@
 # bedrock_utils.py
-import boto3
 import json
 import logging
+import os
+import sys
 from botocore.exceptions import BotoCoreError, ClientError
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterator, List, Any, Optional
+from aws_clients import get_client
+import rate_limit
+import telemetry
 
 # Set up logging
 logging.basicConfig(
@@ -13,17 +17,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Queue Bedrock calls under a shared, throttling-aware rate limit
+rate_limit.install()
 
 # Define available models
 AVAILABLE_MODELS = {
     "claude_3_sonnet": "anthropic.claude-3-sonnet-20240229-v1:0",
     "claude_3_haiku": "anthropic.claude-3-haiku-20240307-v1:0",
     "claude_2": "anthropic.claude-v2:1",
+    "claude_3_5_haiku": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+    "claude_3_7_sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
     # Add more models as needed
 }
 
-# Default model
-DEFAULT_MODEL = "claude_3_haiku"
+# Default model, overridable with NW_MODEL (one of the AVAILABLE_MODELS keys)
+DEFAULT_MODEL = os.environ.get("NW_MODEL", "claude_3_haiku")
+
+# Models that accept cachePoint blocks; other models reject them with a ValidationException
+PROMPT_CACHE_MODELS = {"claude_3_5_haiku", "claude_3_7_sonnet"}
+
+# Insert prompt cache points by default (only applied to models in PROMPT_CACHE_MODELS)
+PROMPT_CACHING = os.environ.get("NW_PROMPT_CACHING", "false").lower() == "true"
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
 
 
 SYSTEM_MESSAGE = """
@@ -60,24 +76,26 @@ Always prioritize providing correct information over guessing or making assumpti
 """
 
 
-def initialize_bedrock_client(region_name: str = "us-west-2") -> boto3.client:
+def initialize_bedrock_client(region_name: str = "us-west-2", profile: Optional[str] = None) -> Any:
     """
     Initialize and return a Bedrock runtime client.
 
-    This function creates a boto3 client for the Bedrock runtime service.
+    This function returns the pooled boto3 client for the Bedrock runtime service,
+    so every session in the process shares one client and its connection pool.
     It's used to interact with the Bedrock API for model invocations.
 
     Args:
-    region_name (str): The AWS region to connect to. Defaults to "us-east-1".
+    region_name (str): The AWS region to connect to. Defaults to "us-west-2".
+    profile (Optional[str]): Named credentials profile. Defaults to the default credential chain.
 
     Returns:
-    boto3.client: A configured Bedrock runtime client.
+    Any: A configured Bedrock runtime client.
 
     Raises:
     BotoCoreError: If there's an issue creating the Bedrock client.
     """
     try:
-        client = boto3.client("bedrock-runtime", region_name=region_name)
+        client = get_client("bedrock-runtime", region_name, profile)
         logger.info(f"Bedrock client initialized for region: {region_name}")
         return client
     except BotoCoreError as e:
@@ -85,21 +103,44 @@ def initialize_bedrock_client(region_name: str = "us-west-2") -> boto3.client:
         raise
 
 
+def _with_rolling_cache_point(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return messages with a cache point after the last message, leaving the history untouched."""
+    if not messages:
+        return messages
+    last = messages[-1]
+    return messages[:-1] + [{"role": last["role"], "content": list(last["content"]) + [CACHE_POINT]}]
+
+
 def create_converse_request(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]],
-    max_tokens: int = 500, temperature: float = 0.7, top_p: float = 1, model_key: str = DEFAULT_MODEL
+    max_tokens: int = 500, temperature: float = 0.7, top_p: float = 1, model_key: str = DEFAULT_MODEL,
+    cache_prompt: bool = PROMPT_CACHING
 ) -> Dict[str, Any]:
     """
     Create a request object for the Bedrock converse API.
+
+    With cache_prompt enabled on a model that supports it, cache points are placed after
+    the system prompt, after the tool specs, and after the latest message. Every loop
+    iteration of a tool-using turn then reads the shared prefix from the prompt cache
+    instead of reprocessing it.
     """
     try:
         model_id = AVAILABLE_MODELS.get(model_key)
         if not model_id:
             raise ValueError(f"Invalid model key: {model_key}. Available models are: {', '.join(AVAILABLE_MODELS.keys())}")
 
+        system = [{"text": SYSTEM_MESSAGE}]
+        if cache_prompt and model_key not in PROMPT_CACHE_MODELS:
+            logger.debug(f"Prompt caching is not supported by model {model_key}; sending without cache points")
+            cache_prompt = False
+        if cache_prompt:
+            system = system + [CACHE_POINT]
+            tools = tools + [CACHE_POINT]
+            messages = _with_rolling_cache_point(messages)
+
         request = {
             "modelId": model_id,
             "messages": messages,
-            "system": [{"text": SYSTEM_MESSAGE}],
+            "system": system,
             "inferenceConfig": {
                 "maxTokens": max_tokens,
                 "temperature": temperature,
@@ -117,18 +158,53 @@ def create_converse_request(messages: List[Dict[str, Any]], tools: List[Dict[str
         raise
 
 
+def report_usage(usage: Dict[str, Any], model_key: str,
+                 usage_callback: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+    """
+    Normalize and log the token usage of one Bedrock request, including prompt cache reads/writes.
+
+    Args:
+    usage (Dict[str, Any]): The usage field of a Converse or ConverseStream response.
+    model_key (str): Key for the model that served the request.
+    usage_callback (Optional[Callable[[Dict[str, int]], None]]): Receives the normalized usage.
+
+    Returns:
+    Dict[str, int]: Input, output, cache read and cache write token counts.
+    """
+    report = {
+        "inputTokens": usage.get("inputTokens", 0),
+        "outputTokens": usage.get("outputTokens", 0),
+        "cacheReadInputTokens": usage.get("cacheReadInputTokens", 0),
+        "cacheWriteInputTokens": usage.get("cacheWriteInputTokens", 0),
+    }
+    logger.info(f"Token usage for {model_key}: input={report['inputTokens']} output={report['outputTokens']} "
+                f"cache_read={report['cacheReadInputTokens']} cache_write={report['cacheWriteInputTokens']}")
+    if usage_callback:
+        usage_callback(report)
+    return report
+
+
+def _usage_attributes(usage: Dict[str, int]) -> Dict[str, int]:
+    return {
+        "input_tokens": usage["inputTokens"],
+        "output_tokens": usage["outputTokens"],
+        "cache_read_tokens": usage["cacheReadInputTokens"],
+        "cache_write_tokens": usage["cacheWriteInputTokens"],
+    }
 
 
-def converse_with_claude(bedrock_client: boto3.client, request: Dict[str, Any], model_key: str = DEFAULT_MODEL) -> Optional[Dict[str, Any]]:
+def converse_with_claude(bedrock_client: Any, request: Dict[str, Any], model_key: str = DEFAULT_MODEL,
+                         usage_callback: Optional[Callable[[Dict[str, int]], None]] = None) -> Optional[Dict[str, Any]]:
     """
     Send a request to Claude via the Bedrock converse API.
 
     This function sends the prepared request to the Bedrock API and handles the response.
 
     Args:
-    bedrock_client (boto3.client): The Bedrock runtime client.
+    bedrock_client (Any): The Bedrock runtime client.
     request (Dict[str, Any]): The prepared request payload.
     model_key (str): Key for the model to use. Defaults to DEFAULT_MODEL.
+    usage_callback (Optional[Callable[[Dict[str, int]], None]]): Receives the request's token usage.
 
     Returns:
     Optional[Dict[str, Any]]: The model's response message, or None if an error occurred.
@@ -144,8 +220,11 @@ def converse_with_claude(bedrock_client: boto3.client, request: Dict[str, Any],
             raise ValueError(f"Invalid model key: {model_key}. Available models are: {', '.join(AVAILABLE_MODELS.keys())}")
 
         request["modelId"] = model_id  # Ensure the correct model ID is used
-        response = bedrock_client.converse(**request)
-        logger.info(f"Successfully received response from Bedrock using model: {DEFAULT_MODEL}")
+        with telemetry.span(telemetry.MODEL, model_key, streaming=False) as model_span:
+            response = bedrock_client.converse(**request)
+            logger.info(f"Successfully received response from Bedrock using model: {DEFAULT_MODEL}")
+            usage = report_usage(response.get('usage', {}), model_key, usage_callback)
+            model_span.set(stop_reason=response.get('stopReason'), **_usage_attributes(usage))
         return response['output']['message']
     except ClientError as e:
         error_code = e.response['Error']['Code']
@@ -156,4 +235,111 @@ def converse_with_claude(bedrock_client: boto3.client, request: Dict[str, Any],
         raise
     except Exception as e:
         logger.error(f"Unexpected error in converse_with_claude: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def converse_stream_with_claude(bedrock_client: Any, request: Dict[str, Any],
+                                model_key: str = DEFAULT_MODEL,
+                                usage_callback: Optional[Callable[[Dict[str, int]], None]] = None
+                                ) -> Iterator[Dict[str, Any]]:
+    """
+    Send a request to Claude via the Bedrock ConverseStream API and yield events as they arrive.
+
+    Text deltas are yielded immediately. toolUse input arrives as JSON fragments, which are
+    accumulated per content block and yielded as a complete toolUse once the block ends, so
+    callers can start the tool before the rest of the message has been generated.
+
+    Args:
+    bedrock_client (Any): The Bedrock runtime client.
+    request (Dict[str, Any]): The prepared request payload.
+    model_key (str): Key for the model to use. Defaults to DEFAULT_MODEL.
+    usage_callback (Optional[Callable[[Dict[str, int]], None]]): Receives the request's token usage.
+
+    Yields:
+    Dict[str, Any]: One of
+        {"type": "text", "text": str} for each text delta,
+        {"type": "tool_use", "toolUse": Dict} for each completed toolUse block,
+        {"type": "message", "message": Dict, "stopReason": str, "usage": Dict} once the stream ends,
+        with the fully assembled assistant message.
+
+    Raises:
+    ClientError: If there's an API-specific error from Bedrock.
+    ValueError: If an invalid model key is provided.
+    """
+    model_span = None
+    try:
+        model_id = AVAILABLE_MODELS.get(model_key)
+        if not model_id:
+            raise ValueError(f"Invalid model key: {model_key}. Available models are: {', '.join(AVAILABLE_MODELS.keys())}")
+
+        request["modelId"] = model_id  # Ensure the correct model ID is used
+        # Not made current across yields, so tools started mid-stream nest under the turn, not the model call
+        model_span = telemetry.start(telemetry.MODEL, model_key, streaming=True)
+        with telemetry.activate(model_span):
+            response = bedrock_client.converse_stream(**request)
+
+        blocks: Dict[int, Dict[str, Any]] = {}
+        stop_reason = None
+        usage: Dict[str, Any] = {}
+        for event in response['stream']:
+            if 'time_to_first_token_ms' not in model_span.attributes and (
+                    'contentBlockStart' in event or 'contentBlockDelta' in event):
+                model_span.set(time_to_first_token_ms=round(model_span.duration_ms, 1))
+            if 'contentBlockStart' in event:
+                start = event['contentBlockStart']
+                tool_start = start['start'].get('toolUse')
+                if tool_start:
+                    blocks[start['contentBlockIndex']] = {
+                        "toolUse": {"toolUseId": tool_start['toolUseId'], "name": tool_start['name']},
+                        "input": []
+                    }
+            elif 'contentBlockDelta' in event:
+                index = event['contentBlockDelta']['contentBlockIndex']
+                delta = event['contentBlockDelta']['delta']
+                if 'text' in delta:
+                    blocks.setdefault(index, {"text": []})["text"].append(delta['text'])
+                    yield {"type": "text", "text": delta['text']}
+                elif 'toolUse' in delta:
+                    blocks[index]["input"].append(delta['toolUse'].get('input', ''))
+            elif 'contentBlockStop' in event:
+                block = blocks.get(event['contentBlockStop']['contentBlockIndex'])
+                if block and 'toolUse' in block:
+                    raw_input = "".join(block.pop("input"))
+                    block['toolUse']['input'] = json.loads(raw_input) if raw_input else {}
+                    yield {"type": "tool_use", "toolUse": block['toolUse']}
+            elif 'messageStop' in event:
+                stop_reason = event['messageStop'].get('stopReason')
+            elif 'metadata' in event:
+                usage = event['metadata'].get('usage', {})
+
+        content = []
+        for index in sorted(blocks):
+            block = blocks[index]
+            if 'text' in block:
+                content.append({"text": "".join(block['text'])})
+            else:
+                content.append({"toolUse": block['toolUse']})
+        logger.info(f"Successfully streamed response from Bedrock using model: {model_key}")
+        report = report_usage(usage, model_key, usage_callback)
+        model_span.set(stop_reason=stop_reason, **_usage_attributes(report))
+        telemetry.finish(model_span)
+        yield {
+            "type": "message",
+            "message": {"role": "assistant", "content": content},
+            "stopReason": stop_reason,
+            "usage": report
+        }
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        error_message = e.response['Error']['Message']
+        logger.error(f"Bedrock API error: {error_code} - {error_message}")
+        if error_code == "ValidationException":
+            logger.warning("Check if the conversation alternates correctly between user and assistant roles")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in converse_stream_with_claude: {str(e)}")
+        raise
+    finally:
+        # Ends the span of a failed or abandoned stream
+        if model_span is not None and model_span.end is None:
+            telemetry.finish(model_span, sys.exc_info()[1])
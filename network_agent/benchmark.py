@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The benchmark runs against a local EC2 stand-in: never touch real credentials or the user's inventory store
+os.environ["NW_INVENTORY_DB"] = ""
+os.environ["AWS_ACCESS_KEY_ID"] = "benchmark"
+os.environ["AWS_SECRET_ACCESS_KEY"] = "benchmark"
+os.environ.pop("AWS_PROFILE", None)
+os.environ.pop("AWS_SESSION_TOKEN", None)
+
+from moto import mock_aws  # noqa: E402
+
+from aws_clients import get_client  # noqa: E402
+from chat_engine import aexecute_tool_uses, chat, chat_stream  # noqa: E402
+from history import HistoryManager  # noqa: E402
+from tools import get_all_tools, get_registry  # noqa: E402
+from tools.cache import invalidate_cache  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+
+REGION = "us-west-2"
+# Synthetic account sizes; --vpcs etc. override individual numbers
+SCALES = {
+    "small": {"vpcs": 20, "instances": 1000, "security_groups": 200, "rules": 2000},
+    "medium": {"vpcs": 50, "instances": 5000, "security_groups": 1000, "rules": 10000},
+    "large": {"vpcs": 200, "instances": 20000, "security_groups": 5000, "rules": 50000},
+}
+SUBNETS_PER_VPC = 4
+# Instances launched per RunInstances call
+LAUNCH_BATCH = 50
+# Ports the synthetic rules open, cycled through
+RULE_PORTS = [22, 80, 443, 3306, 5432, 6379, 8080, 8443, 9090, 27017]
+
+
+def populate(scale: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Create a synthetic account in the EC2 stand-in.
+
+    Each VPC gets SUBNETS_PER_VPC subnets, an internet gateway with a public route
+    table on the first subnet, and a NAT gateway used by the private subnets'
+    route table. Security groups are spread across VPCs and the rules across
+    groups, mixing CIDR peers (a few open to the internet) and group references.
+    Instances are spread across subnets, each in one of its VPC's groups.
+
+    Returns:
+    Dict[str, Any]: IDs and addresses the benchmark cases refer to.
+    """
+    ec2 = get_client("ec2", REGION)
+    vpc_blocks = ipaddress.ip_network("10.0.0.0/8").subnets(new_prefix=20)
+    vpcs: List[Dict[str, Any]] = []
+    for _ in range(scale["vpcs"]):
+        block = next(vpc_blocks)
+        vpc_id = ec2.create_vpc(CidrBlock=str(block))['Vpc']['VpcId']
+        subnet_ids = [ec2.create_subnet(VpcId=vpc_id, CidrBlock=str(cidr))['Subnet']['SubnetId']
+                      for cidr in list(block.subnets(new_prefix=22))[:SUBNETS_PER_VPC]]
+        igw_id = ec2.create_internet_gateway()['InternetGateway']['InternetGatewayId']
+        ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+        public_rt = ec2.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
+        ec2.create_route(RouteTableId=public_rt, DestinationCidrBlock="0.0.0.0/0", GatewayId=igw_id)
+        ec2.associate_route_table(RouteTableId=public_rt, SubnetId=subnet_ids[0])
+        allocation = ec2.allocate_address(Domain="vpc")['AllocationId']
+        nat_id = ec2.create_nat_gateway(SubnetId=subnet_ids[0], AllocationId=allocation)['NatGateway']['NatGatewayId']
+        private_rt = ec2.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
+        ec2.create_route(RouteTableId=private_rt, DestinationCidrBlock="0.0.0.0/0", NatGatewayId=nat_id)
+        for subnet_id in subnet_ids[1:]:
+            ec2.associate_route_table(RouteTableId=private_rt, SubnetId=subnet_id)
+        vpcs.append({"VpcId": vpc_id, "CidrBlock": str(block), "SubnetIds": subnet_ids, "GroupIds": []})
+    logger.info(f"Created {len(vpcs)} VPCs")
+
+    rules_per_group = max(1, scale["rules"] // max(1, scale["security_groups"]))
+    for index in range(scale["security_groups"]):
+        vpc = vpcs[index % len(vpcs)]
+        group_id = ec2.create_security_group(GroupName=f"bench-{index}", Description="benchmark",
+                                             VpcId=vpc["VpcId"])['GroupId']
+        permissions = []
+        for rule in range(rules_per_group):
+            port = RULE_PORTS[(index + rule) % len(RULE_PORTS)]
+            if rule == 0 and vpc["GroupIds"]:
+                peer = {"UserIdGroupPairs": [{"GroupId": vpc["GroupIds"][-1]}]}
+            elif rule == 1 and index % 10 == 0:
+                port, peer = 22, {"IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+            else:
+                peer = {"IpRanges": [{"CidrIp": f"172.{16 + rule % 16}.{index % 256}.0/24"}]}
+            permissions.append({"IpProtocol": "tcp", "FromPort": port, "ToPort": port + rule // len(RULE_PORTS),
+                                **peer})
+        ec2.authorize_security_group_ingress(GroupId=group_id, IpPermissions=permissions)
+        vpc["GroupIds"].append(group_id)
+    logger.info(f"Created {scale['security_groups']} security groups with {rules_per_group} rules each")
+
+    subnets = [(vpc, subnet_id) for vpc in vpcs for subnet_id in vpc["SubnetIds"]]
+    remaining = scale["instances"]
+    addresses: List[str] = []
+    position = 0
+    while remaining > 0:
+        vpc, subnet_id = subnets[position % len(subnets)]
+        count = min(LAUNCH_BATCH, remaining)
+        groups = vpc["GroupIds"][position % len(vpc["GroupIds"]):][:1] if vpc["GroupIds"] else []
+        launched = ec2.run_instances(ImageId="ami-12345678", InstanceType="t3.micro", MinCount=count,
+                                     MaxCount=count, SubnetId=subnet_id, SecurityGroupIds=groups)['Instances']
+        if len(addresses) < 2 and vpc is vpcs[0]:
+            addresses.extend(instance['PrivateIpAddress'] for instance in launched[:2 - len(addresses)])
+        remaining -= count
+        position += 1
+    logger.info(f"Launched {scale['instances']} instances")
+    return {"vpcs": vpcs, "addresses": addresses}
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Return latency statistics in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(func: Callable[[], Any], iterations: int, before: Optional[Callable[[], None]] = None
+            ) -> Tuple[Dict[str, Any], Any]:
+    """Time func over iterations (running before, untimed, ahead of each call); returns (stats, last result)."""
+    samples = []
+    result = None
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples), result
+
+
+def tool_cases(account: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    vpc = account["vpcs"][0]
+    cases = [
+        ("list_vpcs", {}),
+        ("list_subnets", {"vpc_id": vpc["VpcId"]}),
+        ("get_route_tables", {"vpc_id": vpc["VpcId"]}),
+        ("describe_network_acls", {"vpc_id": vpc["VpcId"]}),
+        ("check_internet_gateway", {"vpc_id": vpc["VpcId"]}),
+        ("check_nat_gateway", {"vpc_id": vpc["VpcId"]}),
+        ("describe_security_groups", {"vpc_id": vpc["VpcId"]}),
+        ("describe_instances", {}),
+        ("get_vpc_topology", {}),
+        ("get_vpc_topology", {"vpc_ids": [vpc["VpcId"]]}),
+        ("query_security_group_rules", {"port": 22, "peer": "internet"}),
+        ("find_cidr_overlaps", {}),
+        ("find_free_cidr_blocks", {"prefix_length": 24, "vpc_id": vpc["VpcId"]}),
+        ("calculate_cidr_range", {"cidrs": [v["CidrBlock"] for v in account["vpcs"]]}),
+    ]
+    if len(account["addresses"]) == 2:
+        source, destination = account["addresses"]
+        cases.append(("check_reachability", {"source": source, "destination": destination, "port": 443}))
+    return cases
+
+
+def _tool_use(name: str, arguments: Dict[str, Any], index: int = 0) -> Dict[str, Any]:
+    return {"toolUseId": f"tooluse_{name}_{index}", "name": name, "input": arguments}
+
+
+def bench_tools(account: Dict[str, Any], iterations: int) -> Dict[str, Any]:
+    """
+    Time each tool through registry dispatch, cold (cache cleared before every call)
+    and warm (served from the describe cache), plus JSON serialization of its result.
+    """
+    registry = get_registry()
+    results = {}
+    for name, arguments in tool_cases(account):
+        label = name if name not in results else f"{name}[{','.join(arguments)}]"
+        tool_use = _tool_use(name, arguments)
+        cold, response = measure(lambda: registry.dispatch(tool_use), iterations, before=invalidate_cache)
+        warm, _ = measure(lambda: registry.dispatch(tool_use), iterations)
+        result = response["toolResult"]
+        payload = result["content"][0]["json"]
+        serialize, encoded = measure(lambda: json.dumps(payload, default=str), iterations)
+        results[label] = {
+            "arguments": arguments,
+            "status": result["status"],
+            "cold": cold,
+            "warm": warm,
+            "serialize": serialize,
+            "result_bytes": len(encoded),
+        }
+        if result["status"] == "error":
+            results[label]["error"] = payload.get("error")
+        logger.info(f"{label}: cold p50 {cold['p50_ms']} ms, warm p50 {warm['p50_ms']} ms, {len(encoded)} bytes")
+    return results
+
+
+def bench_dispatch(iterations: int) -> Dict[str, Any]:
+    """Measure the fixed cost of the dispatch path on a cheap, AWS-free tool."""
+    registry = get_registry()
+    arguments = {"cidr": "10.0.0.0/16"}
+    tool = registry.get("calculate_cidr_range")
+    batch = [_tool_use("calculate_cidr_range", arguments, i) for i in range(8)]
+    direct, _ = measure(lambda: tool.handler(**arguments), iterations)
+    dispatched, _ = measure(lambda: registry.dispatch(_tool_use("calculate_cidr_range", arguments)), iterations)
+    # The path chat() takes: the batch runs on the async engine's shared thread pool
+    concurrent, _ = measure(lambda: asyncio.run(aexecute_tool_uses(batch)), iterations)
+    return {
+        "direct_call": direct,
+        "registry_dispatch": dispatched,
+        "dispatch_overhead_us": round((dispatched["p50_ms"] - direct["p50_ms"]) * 1000, 1),
+        "tool_batch_of_8": concurrent,
+    }
+
+
+class ScriptedBedrock:
+    """
+    Stand-in for the bedrock-runtime client that replays scripted tool-use sequences.
+
+    Each turn of the script is a list of steps; each step is the list of tool calls
+    the "model" makes in one response, and a turn ends with a text answer once its
+    steps are used up. A request whose last message is user text starts the next
+    turn. Token usage is estimated from request size (4 bytes per token) and every
+    request's size is recorded.
+
+    Args:
+    script (List[List[List[Tuple[str, Dict[str, Any]]]]]): Turns of steps of (tool name, input).
+    latency (float): Seconds each model call sleeps, to simulate generation time.
+    """
+
+    def __init__(self, script: List[List[List[Tuple[str, Dict[str, Any]]]]], latency: float = 0.0):
+        self.script = script
+        self.latency = latency
+        self.turn = -1
+        self.step = 0
+        self.calls = 0
+        self.request_bytes: List[int] = []
+
+    def _next_message(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        self.calls += 1
+        size = len(json.dumps(request["messages"], default=str))
+        self.request_bytes.append(size)
+        last = request["messages"][-1]
+        if any("text" in block for block in last["content"]):
+            self.turn = (self.turn + 1) % len(self.script)
+            self.step = 0
+        if self.latency:
+            time.sleep(self.latency)
+        steps = self.script[self.turn]
+        if self.step < len(steps):
+            content = [{"toolUse": _tool_use(name, arguments, self.calls * 100 + i)}
+                       for i, (name, arguments) in enumerate(steps[self.step])]
+            self.step += 1
+        else:
+            content = [{"text": f"Scripted answer for turn {self.turn}."}]
+        return {"role": "assistant", "content": content}, {"inputTokens": size // 4, "outputTokens": 50}
+
+    def converse(self, **request: Any) -> Dict[str, Any]:
+        message, usage = self._next_message(request)
+        stop = "tool_use" if any("toolUse" in block for block in message["content"]) else "end_turn"
+        return {"output": {"message": message}, "stopReason": stop, "usage": usage}
+
+    def converse_stream(self, **request: Any) -> Dict[str, Any]:
+        message, usage = self._next_message(request)
+
+        def events():
+            for index, block in enumerate(message["content"]):
+                if "text" in block:
+                    for word in block["text"].split(" "):
+                        yield {"contentBlockDelta": {"contentBlockIndex": index, "delta": {"text": word + " "}}}
+                else:
+                    tool_use = block["toolUse"]
+                    yield {"contentBlockStart": {"contentBlockIndex": index, "start": {
+                        "toolUse": {"toolUseId": tool_use["toolUseId"], "name": tool_use["name"]}}}}
+                    yield {"contentBlockDelta": {"contentBlockIndex": index,
+                                                 "delta": {"toolUse": {"input": json.dumps(tool_use["input"])}}}}
+                yield {"contentBlockStop": {"contentBlockIndex": index}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            yield {"metadata": {"usage": usage}}
+
+        return {"stream": events()}
+
+
+def chat_script(account: Dict[str, Any]) -> List[List[List[Tuple[str, Dict[str, Any]]]]]:
+    """A short investigation: list, drill into one VPC, check reachability, audit SSH exposure."""
+    vpc_id = account["vpcs"][0]["VpcId"]
+    reachability = []
+    if len(account["addresses"]) == 2:
+        source, destination = account["addresses"]
+        reachability = [[("check_reachability", {"source": source, "destination": destination, "port": 443})]]
+    return [
+        [[("list_vpcs", {})]],
+        [[("get_vpc_topology", {"vpc_ids": [vpc_id]})],
+         [("list_subnets", {"vpc_id": vpc_id}), ("get_route_tables", {"vpc_id": vpc_id}),
+          ("describe_network_acls", {"vpc_id": vpc_id})]],
+        reachability,
+        [[("query_security_group_rules", {"port": 22, "peer": "internet"})],
+         [("describe_security_groups", {"vpc_id": vpc_id})]],
+    ]
+
+
+def bench_chat(account: Dict[str, Any], iterations: int, latency: float, stream: bool) -> Dict[str, Any]:
+    """
+    Run the scripted conversation iterations times against a fake Bedrock, clearing
+    the describe cache before each conversation, and time every turn.
+    """
+    script = chat_script(account)
+    tools = get_all_tools()
+    turns: List[List[float]] = [[] for _ in script]
+    model_calls: List[int] = [0] * len(script)
+    final_request_bytes: List[int] = [0] * len(script)
+    for _ in range(iterations):
+        invalidate_cache()
+        client = ScriptedBedrock(script, latency)
+        messages: List[Dict[str, Any]] = []
+        history = HistoryManager()
+        for index in range(len(script)):
+            messages.append({"role": "user", "content": [{"text": f"Question {index}"}]})
+            calls_before = client.calls
+            started = time.perf_counter()
+            if stream:
+                for _ in chat_stream("", messages, client, tools, history=history):
+                    pass
+            else:
+                chat("", messages, client, tools, history=history)
+            turns[index].append(time.perf_counter() - started)
+            model_calls[index] = client.calls - calls_before
+            final_request_bytes[index] = client.request_bytes[-1]
+    return {
+        "turns": [
+            {
+                "tools": [name for step in script[index] for name, _ in step],
+                "model_calls": model_calls[index],
+                "final_request_bytes": final_request_bytes[index],
+                **summarize(samples),
+            } for index, samples in enumerate(turns)
+        ],
+        "conversation": summarize([sum(samples) for samples in zip(*turns)]),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale: Dict[str, int], iterations: int, chat_iterations: int, model_latency: float) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "iterations": iterations,
+    }
+    with mock_aws():
+        started = time.perf_counter()
+        account = populate(scale)
+        report["populate_seconds"] = round(time.perf_counter() - started, 2)
+        report["tools"] = bench_tools(account, iterations)
+        report["dispatch"] = bench_dispatch(max(iterations, 100))
+        report["chat"] = bench_chat(account, chat_iterations, model_latency, stream=False)
+        report["chat_stream"] = bench_chat(account, chat_iterations, model_latency, stream=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tools, dispatch path and chat loop against a "
+                                                 "local EC2 stand-in (moto) and a scripted Bedrock client.")
+    parser.add_argument("--scale", choices=list(SCALES), default="small", help="Synthetic account size")
+    parser.add_argument("--vpcs", type=int, help="Override the number of VPCs")
+    parser.add_argument("--instances", type=int, help="Override the number of instances")
+    parser.add_argument("--security-groups", type=int, help="Override the number of security groups")
+    parser.add_argument("--rules", type=int, help="Override the total number of security group rules")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed calls per tool and mode")
+    parser.add_argument("--chat-iterations", type=int, default=3, help="Scripted conversations to run")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Simulated time per model call")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        override = getattr(args, key)
+        if override is not None:
+            scale[key] = override
+    if scale["vpcs"] < 1 or scale["vpcs"] > 4096:
+        parser.error("--vpcs must be between 1 and 4096")
+
+    # Progress goes to stderr; stdout carries only the report
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s", datefmt="%H:%M:%S"))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    report = run(scale, args.iterations, args.chat_iterations, args.model_latency_ms / 1000)
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+        logger.info(f"Wrote {args.output}")
+    else:
+        print(encoded)
+
+
+if __name__ == "__main__":
+    main()
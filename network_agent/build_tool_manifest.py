@@ -0,0 +1,20 @@
+import argparse
+import logging
+
+from tools.manifest import MANIFEST_PATH, build_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the tool manifest that lets the agent list its tools "
+                                                 "without importing the tool modules. Run after changing any "
+                                                 "file in tools/.")
+    parser.add_argument("--output", default=MANIFEST_PATH, help=f"Manifest file (default: {MANIFEST_PATH})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    tools = build_manifest(args.output)
+    logging.info(f"Wrote {len(tools)} tools to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 # chat_engine.py
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Any, Optional
 from tool_handler import handle_tool_use
-from bedrock_utils import converse_with_claude, create_converse_request
+from bedrock_utils import converse_with_claude, converse_stream_with_claude, create_converse_request
+from history import HistoryManager
+import telemetry
 
 # Set up logging
 logging.basicConfig(
@@ -13,15 +19,187 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def chat(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# Record spans for turns, model calls, tool calls and AWS calls
+telemetry.install()
+
+# Upper bound on tool calls running at once for a single assistant turn
+MAX_TOOL_WORKERS = 8
+# Seconds a single tool call may run before it is reported as timed out
+TOOL_TIMEOUT_SECONDS = 30
+# Threads shared by every async conversation for blocking tool calls
+MAX_BLOCKING_WORKERS = int(os.environ.get("NW_ASYNC_WORKERS", "64"))
+# Threads shared by every async conversation for blocking Bedrock calls and stream reads
+MAX_MODEL_WORKERS = int(os.environ.get("NW_MODEL_WORKERS", "64"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+
+def _tool_error_result(tool_use_id: str, message: str) -> Dict[str, Any]:
+    """Build an error toolResult block for a single failed tool call."""
+    return {
+        "toolResult": {
+            "toolUseId": tool_use_id,
+            "content": [{"json": {"error": message}}],
+            "status": "error"
+        }
+    }
+
+
+def _dispatch_tool(tool_use: Dict[str, Any]) -> Dict[str, Any]:
+    return handle_tool_use(tool_use)['content'][0]
+
+
+def _shared_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    with _executor_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return _executors[name]
+
+
+def _blocking_executor() -> ThreadPoolExecutor:
+    """Return the thread pool that the async engine runs blocking tool calls on."""
+    return _shared_executor("async", MAX_BLOCKING_WORKERS)
+
+
+def _model_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool that the async engine runs blocking Bedrock calls on.
+
+    It is kept apart from the tool pool because a tool call that times out cannot be
+    stopped and keeps its thread: hung tools fill the tool pool, not this one, so they
+    can never hold up reading a model response.
+    """
+    return _shared_executor("model", MAX_MODEL_WORKERS)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, executor: Optional[ThreadPoolExecutor] = None) -> Any:
+    """
+    Run a blocking call on a shared thread pool, in a copy of the caller's context, and await it.
+
+    Args:
+    func (Callable[..., Any]): The blocking call.
+    *args (Any): Its arguments.
+    executor (Optional[ThreadPoolExecutor]): The pool to run it on (default: the tool pool).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or _blocking_executor(), telemetry.bind(func), *args)
+
+
+class AsyncToolBatch:
+    """
+    Concurrent execution of the tool calls from one assistant turn.
+
+    Tool calls from one assistant turn are independent, so each starts as a task as soon
+    as it is submitted and runs on the shared tool pool. results() returns the
+    toolResult blocks in submission order, and a failing or timed-out call yields an
+    error toolResult without affecting the rest of the batch. A timed-out call cannot be
+    stopped, so it keeps its slot until it really ends: the batch never has more than
+    max_workers calls on the pool.
+
+    Args:
+    max_workers (int): Maximum number of tool calls to run at once.
+    timeout (float): Seconds each tool call may run, measured from when it gets a thread.
+    """
+
+    def __init__(self, max_workers: int = MAX_TOOL_WORKERS, timeout: float = TOOL_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max(1, max_workers))
+        self._tasks: List["asyncio.Task[Dict[str, Any]]"] = []
+
+    async def _run(self, tool_use: Dict[str, Any]) -> Dict[str, Any]:
+        tool_use_id = tool_use['toolUseId']
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+
+        def run() -> Dict[str, Any]:
+            try:
+                loop.call_soon_threadsafe(started.set)
+            except RuntimeError:
+                # The turn ended and its event loop closed while the call was queued
+                pass
+            return _dispatch_tool(tool_use)
+
+        await self._slots.acquire()
+        call = asyncio.ensure_future(run_blocking(run))
+        call.add_done_callback(lambda _: self._slots.release())
+        try:
+            # The clock starts once the call has a thread, not while it queues for one
+            waiting = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait([call, waiting], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiting.cancel()
+            return await asyncio.wait_for(asyncio.shield(call), self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Tool {tool_use['name']} ({tool_use_id}) timed out after {self.timeout}s")
+            return _tool_error_result(tool_use_id, f"Tool {tool_use['name']} timed out after {self.timeout} seconds")
+        except Exception as e:
+            logger.error(f"Error in tool use {tool_use['name']} ({tool_use_id}): {str(e)}")
+            return _tool_error_result(tool_use_id, str(e))
+
+    def submit(self, tool_use: Dict[str, Any]) -> None:
+        """Start running a tool call in the background."""
+        self._tasks.append(asyncio.ensure_future(self._run(tool_use)))
+
+    async def results(self) -> List[Dict[str, Any]]:
+        """Wait for every submitted call and return one toolResult content block per call, in order."""
+        return list(await asyncio.gather(*self._tasks))
+
+    def close(self) -> None:
+        # Tool calls already running on the thread pool finish in the background
+        for task in self._tasks:
+            task.cancel()
+
+
+def _loop_running() -> bool:
+    """Return whether this thread is running an event loop (e.g., in Jupyter or async code)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def aexecute_tool_uses(tool_uses: List[Dict[str, Any]], max_workers: int = MAX_TOOL_WORKERS,
+                             timeout: float = TOOL_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Run a batch of tool calls concurrently and return their toolResult blocks.
+
+    Args:
+    tool_uses (List[Dict[str, Any]]): The toolUse blocks from the assistant message.
+    max_workers (int): Maximum number of tool calls to run at once.
+    timeout (float): Seconds each tool call may run, measured from when it starts.
+
+    Returns:
+    List[Dict[str, Any]]: One toolResult content block per toolUse, in request order.
+    """
+    batch = AsyncToolBatch(max_workers=max_workers, timeout=timeout)
+    try:
+        for tool_use in tool_uses:
+            batch.submit(tool_use)
+        return await batch.results()
+    finally:
+        batch.close()
+
+
+async def achat(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any, tools: List[Dict[str, Any]],
+                max_tool_workers: int = MAX_TOOL_WORKERS, tool_timeout: float = TOOL_TIMEOUT_SECONDS,
+                history: Optional[HistoryManager] = None) -> List[Dict[str, Any]]:
     """
     Main chat function to interact with Claude, handling tool use and maintaining conversation flow.
 
+    Bedrock and tool calls run on shared thread pools, so one event loop can drive many
+    conversations at once; they share the client pool and the describe cache.
+
     Args:
     user_input (str): The user's input text.
     messages (List[Dict[str, Any]]): The conversation history.
     bedrock_client (Any): The Bedrock client for making API calls.
     tools (List[Dict[str, Any]]): List of available tools for Claude to use.
+    max_tool_workers (int): Maximum number of tool calls from one turn to run concurrently.
+    tool_timeout (float): Seconds each tool call may run before it is reported as an error.
+    history (Optional[HistoryManager]): Compacts what is sent to the model; the full history is kept in messages.
 
     Returns:
     List[Dict[str, Any]]: Updated conversation history including Claude's responses and tool uses.
@@ -30,61 +208,186 @@ def chat(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any, t
     and handles any tool use requests from Claude.
     """
     try:
-        # Add user input to messages
-        #messages.append({"role": "user", "content": [{"text": user_input}]})
-        
-        while True:
-            # Get Claude's response
-            request = create_converse_request(messages, tools)
-            response = converse_with_claude(bedrock_client, request)
-
-            # Example Use Claude 3 Sonnet
-            # request = create_converse_request(messages, tools, model_key="claude_3_sonnet")
-            # response = converse_with_claude(bedrock_client, request, model_key="claude_3_sonnet")
-
-            
-            if not response or 'content' not in response:
-                logger.error("Unexpected response format from Claude.")
-                raise ValueError("Invalid response from Claude")
-            
-            # Process Claude's response
-            assistant_message = {"role": "assistant", "content": []}
-            for content in response['content']:
-                if 'text' in content:
-                    logger.info(f"Claude: {content['text']}")
-                    assistant_message['content'].append({"text": content['text']})
-                elif 'toolUse' in content:
-                    tool_use = content['toolUse']
-                    logger.info(f"Claude is using the {tool_use['name']} tool.")
-                    assistant_message['content'].append({"toolUse": tool_use})
-            
-            # Add Claude's response to messages
-            messages.append(assistant_message)
-            
-            # Check if Claude used a tool
-            if any('toolUse' in item for item in assistant_message['content']):
-                # Handle all tool uses
-                user_message = {"role": "user", "content": []}
-                for item in assistant_message['content']:
-                    if 'toolUse' in item:
-                        try:
-                            tool_result = handle_tool_use(item['toolUse'])
-                            user_message['content'].append(tool_result['content'][0])
-                        except Exception as e:
-                            logger.error(f"Error in tool use: {str(e)}")
-                            user_message['content'].append({"toolResult": {"status": "error", "message": str(e)}})
-                
-                # Add tool results as a user message
-                messages.append(user_message)
-            else:
-                # If no tool was used, we're done
-                break
-        
+        with telemetry.span(telemetry.TURN, "chat", streaming=False):
+            while True:
+                # Get Claude's response
+                request = create_converse_request(history.prepare(messages) if history else messages, tools)
+                response = await run_blocking(converse_with_claude, bedrock_client, request, executor=_model_executor())
+
+                if not response or 'content' not in response:
+                    logger.error("Unexpected response format from Claude.")
+                    raise ValueError("Invalid response from Claude")
+
+                # Process Claude's response
+                assistant_message = {"role": "assistant", "content": []}
+                for content in response['content']:
+                    if 'text' in content:
+                        logger.info(f"Claude: {content['text']}")
+                        assistant_message['content'].append({"text": content['text']})
+                    elif 'toolUse' in content:
+                        tool_use = content['toolUse']
+                        logger.info(f"Claude is using the {tool_use['name']} tool.")
+                        assistant_message['content'].append({"toolUse": tool_use})
+
+                # Add Claude's response to messages
+                messages.append(assistant_message)
+
+                # Check if Claude used a tool
+                tool_uses = [item['toolUse'] for item in assistant_message['content'] if 'toolUse' in item]
+                if not tool_uses:
+                    # If no tool was used, we're done
+                    break
+                # Handle all tool uses concurrently, then add their results as a user message
+                messages.append({
+                    "role": "user",
+                    "content": await aexecute_tool_uses(tool_uses, max_workers=max_tool_workers,
+                                                        timeout=tool_timeout)
+                })
+
         return messages
     except Exception as e:
         logger.error(f"An error occurred in the chat function: {str(e)}")
         raise
 
+
+def chat(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any, tools: List[Dict[str, Any]],
+         max_tool_workers: int = MAX_TOOL_WORKERS, tool_timeout: float = TOOL_TIMEOUT_SECONDS,
+         history: Optional[HistoryManager] = None) -> List[Dict[str, Any]]:
+    """
+    Blocking form of achat(). Takes the same arguments.
+
+    Called from a thread that is already running an event loop (Jupyter, async code), the
+    turn runs on a helper thread instead and the caller's loop is blocked until it ends;
+    async callers should await achat() instead.
+
+    Returns:
+    List[Dict[str, Any]]: Updated conversation history including Claude's responses and tool uses.
+    """
+    turn = achat(user_input, messages, bedrock_client, tools, max_tool_workers=max_tool_workers,
+                 tool_timeout=tool_timeout, history=history)
+    if not _loop_running():
+        return asyncio.run(turn)
+    # asyncio.run cannot start a loop on a thread that is already running one
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat") as helper:
+        return helper.submit(telemetry.bind(asyncio.run), turn).result()
+
+
+async def achat_stream(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any,
+                       tools: List[Dict[str, Any]], max_tool_workers: int = MAX_TOOL_WORKERS,
+                       tool_timeout: float = TOOL_TIMEOUT_SECONDS,
+                       history: Optional[HistoryManager] = None) -> AsyncIterator[str]:
+    """
+    Streaming variant of achat() that yields Claude's text as it is generated.
+
+    Each tool call starts as soon as its toolUse block has been fully streamed, while
+    the model may still be generating the rest of the message. The conversation
+    history is updated in place exactly as achat() does.
+
+    Yields:
+    str: Text deltas from Claude, across every model call in the turn.
+    """
+    try:
+        with telemetry.span(telemetry.TURN, "chat", streaming=True):
+            while True:
+                request = create_converse_request(history.prepare(messages) if history else messages, tools)
+                assistant_message = None
+                batch = None
+                streamed_text = False
+                events = converse_stream_with_claude(bedrock_client, request)
+                try:
+                    # Each read from the Bedrock stream blocks, so it runs on the model pool
+                    while True:
+                        event = await run_blocking(next, events, None, executor=_model_executor())
+                        if event is None:
+                            break
+                        if event['type'] == 'text':
+                            streamed_text = True
+                            yield event['text']
+                        elif event['type'] == 'tool_use':
+                            logger.info(f"Claude is using the {event['toolUse']['name']} tool.")
+                            if batch is None:
+                                batch = AsyncToolBatch(max_workers=max_tool_workers, timeout=tool_timeout)
+                            batch.submit(event['toolUse'])
+                        elif event['type'] == 'message':
+                            assistant_message = event['message']
+
+                    if not assistant_message or not assistant_message['content']:
+                        logger.error("Unexpected response format from Claude.")
+                        raise ValueError("Invalid response from Claude")
+
+                    messages.append(assistant_message)
+                    if batch is None:
+                        # If no tool was used, we're done
+                        break
+                    messages.append({"role": "user", "content": await batch.results()})
+                finally:
+                    try:
+                        events.close()
+                    except ValueError:
+                        # Cancelled while a read was still running on the thread pool
+                        pass
+                    if batch is not None:
+                        batch.close()
+
+                if streamed_text:
+                    # Keep text from successive model calls in the turn visually separate
+                    yield "\n\n"
+    except Exception as e:
+        logger.error(f"An error occurred in the chat_stream function: {str(e)}")
+        raise
+
+
+def chat_stream(user_input: str, messages: List[Dict[str, Any]], bedrock_client: Any, tools: List[Dict[str, Any]],
+                max_tool_workers: int = MAX_TOOL_WORKERS, tool_timeout: float = TOOL_TIMEOUT_SECONDS,
+                history: Optional[HistoryManager] = None) -> Iterator[str]:
+    """
+    Blocking form of achat_stream(). Takes the same arguments.
+
+    Called from a thread that is already running an event loop, the stream is driven from
+    a helper thread, as in chat().
+
+    Yields:
+    str: Text deltas from Claude, across every model call in the turn.
+    """
+    loop = asyncio.new_event_loop()
+    # A loop cannot be run from a thread that is already running one
+    helper = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat") if _loop_running() else None
+
+    def run(awaitable: Any) -> Any:
+        if helper is None:
+            return loop.run_until_complete(awaitable)
+        return helper.submit(loop.run_until_complete, awaitable).result()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=1)
+
+    async def pump() -> None:
+        # One task runs the whole stream, so the turn's telemetry context carries across yields
+        try:
+            async for text in achat_stream(user_input, messages, bedrock_client, tools,
+                                           max_tool_workers=max_tool_workers, tool_timeout=tool_timeout,
+                                           history=history):
+                await queue.put(text)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(StopIteration())
+
+    task = loop.create_task(pump())
+    try:
+        while True:
+            item = run(queue.get())
+            if isinstance(item, StopIteration):
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+        run(asyncio.gather(task, return_exceptions=True))
+        loop.close()
+        if helper is not None:
+            helper.shutdown()
+
+
 def print_conversation(messages: List[Dict[str, Any]]) -> None:
     """
     Print the entire conversation history in a readable format.
@@ -0,0 +1,204 @@
+# history.py
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Rough chars-per-token ratio for English text and JSON; good enough for budgeting
+CHARS_PER_TOKEN = 4
+# Estimated token budget for the messages sent with each request
+DEFAULT_TOKEN_BUDGET = 50000
+# Number of most recent user turns that are always sent verbatim
+DEFAULT_KEEP_RECENT_TURNS = 2
+# Tool results at or below this many characters are cheap enough to keep as-is
+MIN_ELIDE_CHARS = 300
+# Cap on resource IDs carried over from an elided tool result
+MAX_KEPT_RESOURCE_IDS = 200
+
+RESOURCE_ID_PATTERN = re.compile(
+    r"\b(?:vpc|subnet|sg|igw|eigw|nat|rtb|acl|eni|i|pcx|tgw|tgw-attach|vpce|eipalloc|ami|vol)-[0-9a-f]{8,17}\b"
+)
+
+
+def estimate_tokens(value: Any) -> int:
+    """Estimate the token count of a message or content block from its JSON size."""
+    return len(json.dumps(value, default=str)) // CHARS_PER_TOKEN + 1
+
+
+def extract_resource_ids(value: Any) -> List[str]:
+    """Return the unique AWS resource IDs mentioned anywhere in a value, in first-seen order."""
+    found = RESOURCE_ID_PATTERN.findall(json.dumps(value, default=str))
+    return list(dict.fromkeys(found))[:MAX_KEPT_RESOURCE_IDS]
+
+
+def summarize_tool_result(result: Any) -> str:
+    """
+    Default summarizer for an elided tool result: its top-level shape without the data.
+
+    Args:
+    result (Any): The JSON payload of the tool result.
+
+    Returns:
+    str: A short description such as "keys: vpcs (12 items), region".
+    """
+    if isinstance(result, dict):
+        parts = []
+        for key, value in result.items():
+            if isinstance(value, (list, dict)):
+                parts.append(f"{key} ({len(value)} items)")
+            else:
+                parts.append(f"{key}={value}" if len(str(value)) <= 40 else key)
+        return "keys: " + ", ".join(parts)
+    if isinstance(result, list):
+        return f"list of {len(result)} items"
+    return str(result)[:80]
+
+
+def _is_turn_start(message: Dict[str, Any]) -> bool:
+    # A user message with text starts a turn; tool results ride along as user messages too
+    return message['role'] == 'user' and any('text' in item for item in message['content'])
+
+
+class HistoryManager:
+    """
+    Keep the messages sent to Bedrock within an estimated token budget.
+
+    The full conversation history is never modified; prepare() returns the view to
+    send. When the history is over budget, older tool results are replaced (oldest
+    first) with a short summary that keeps the resource IDs they mentioned, and if
+    that is not enough, the oldest whole turns are dropped. The most recent turns
+    are always sent verbatim, and because only whole turns are dropped and tool
+    results are replaced in place, the user/assistant alternation and toolUse/
+    toolResult pairing that Bedrock requires are preserved.
+
+    Args:
+    token_budget (int): Estimated token budget for the messages in one request.
+    keep_recent_turns (int): Number of most recent user turns never compacted.
+    summarizer (Optional[Callable[[Any], str]]): Turns a tool result payload into a summary.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 keep_recent_turns: int = DEFAULT_KEEP_RECENT_TURNS,
+                 summarizer: Optional[Callable[[Any], str]] = None):
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.summarizer = summarizer or summarize_tool_result
+        self.last_stats: Dict[str, int] = {}
+        # Message dicts are never mutated once appended, so estimates can be memoized
+        self._token_cache: Dict[int, tuple] = {}
+
+    def _tokens(self, message: Dict[str, Any]) -> int:
+        cached = self._token_cache.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        tokens = estimate_tokens(message)
+        self._token_cache[id(message)] = (message, tokens)
+        return tokens
+
+    def _elide(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return a copy of a tool result message with large payloads summarized, or None if nothing shrank."""
+        content = []
+        changed = False
+        for item in message['content']:
+            tool_result = item.get('toolResult')
+            if tool_result is None or len(json.dumps(tool_result, default=str)) <= MIN_ELIDE_CHARS:
+                content.append(item)
+                continue
+            payloads = [block.get('json', block.get('text')) for block in tool_result.get('content', [])]
+            summary = {
+                "elided": True,
+                "summary": "; ".join(self.summarizer(payload) for payload in payloads),
+                "resource_ids": extract_resource_ids(payloads),
+            }
+            content.append({
+                "toolResult": {
+                    "toolUseId": tool_result['toolUseId'],
+                    "content": [{"json": summary}],
+                    "status": tool_result.get('status', 'success')
+                }
+            })
+            changed = True
+        return {"role": message['role'], "content": content} if changed else None
+
+    def prepare(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Return the messages to send for the next request, compacted to fit the token budget.
+
+        Args:
+        messages (List[Dict[str, Any]]): The full conversation history.
+
+        Returns:
+        List[Dict[str, Any]]: The history itself when it fits, otherwise a compacted copy.
+        """
+        if len(self._token_cache) > 4 * len(messages) + 64:
+            self._token_cache.clear()
+
+        sizes = [self._tokens(message) for message in messages]
+        total = sum(sizes)
+        self.last_stats = {"original_tokens": total, "sent_tokens": total, "elided": 0, "dropped_messages": 0}
+        if total <= self.token_budget:
+            return messages
+
+        turn_starts = [i for i, message in enumerate(messages) if _is_turn_start(message)]
+        if not turn_starts or turn_starts[0] != 0:
+            turn_starts.insert(0, 0)
+        if len(turn_starts) <= self.keep_recent_turns:
+            logger.warning(f"History of ~{total} tokens exceeds budget but has no turns old enough to compact")
+            return messages
+        protected_from = turn_starts[-self.keep_recent_turns]
+
+        compacted = list(messages)
+        # Pass 1: summarize old tool results, oldest first
+        for i in range(protected_from):
+            if total <= self.token_budget:
+                break
+            elided = self._elide(compacted[i])
+            if elided is not None:
+                new_size = estimate_tokens(elided)
+                total += new_size - sizes[i]
+                sizes[i] = new_size
+                compacted[i] = elided
+                self.last_stats["elided"] += 1
+
+        # Pass 2: drop the oldest whole turns
+        drop_until = 0
+        old_turns = [start for start in turn_starts if start < protected_from] + [protected_from]
+        for start, end in zip(old_turns, old_turns[1:]):
+            if total <= self.token_budget:
+                break
+            total -= sum(sizes[start:end])
+            drop_until = end
+        if drop_until:
+            compacted = compacted[drop_until:]
+            self.last_stats["dropped_messages"] = drop_until
+
+        self.last_stats["sent_tokens"] = total
+        logger.info(f"Compacted history from ~{self.last_stats['original_tokens']} to ~{total} tokens "
+                    f"({self.last_stats['elided']} tool results summarized, {drop_until} messages dropped)")
+        return compacted
+
+
+def drop_oldest_turns(messages: List[Dict[str, Any]], max_chars: int) -> int:
+    """
+    Remove the oldest whole turns from messages, in place, until their JSON size is at most
+    max_chars. The latest turn is always kept.
+
+    Returns:
+    int: The number of messages removed.
+    """
+    sizes = [len(json.dumps(message, default=str)) for message in messages]
+    total = sum(sizes)
+    if total <= max_chars:
+        return 0
+    turn_starts = [i for i, message in enumerate(messages) if _is_turn_start(message)]
+    drop_until = 0
+    for start in turn_starts[1:]:
+        if total <= max_chars:
+            break
+        total -= sum(sizes[drop_until:start])
+        drop_until = start
+    del messages[:drop_until]
+    return drop_until
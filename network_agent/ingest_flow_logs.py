@@ -0,0 +1,27 @@
+import argparse
+import json
+import logging
+
+from tools.flow_logs import DEFAULT_LOCATION, open_source
+from tools.flow_store import DEFAULT_STORE, ingest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert raw VPC Flow Logs into the Parquet flow store "
+                                                 "queried by the query_flow_store tool.")
+    parser.add_argument("location", nargs="?", default=DEFAULT_LOCATION,
+                        help="Local file, directory or glob, or s3://bucket/prefix (default: $NW_FLOW_LOG_LOCATION)")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"Store directory (default: {DEFAULT_STORE})")
+    parser.add_argument("--region", default="us-west-2", help="Region of the S3 bucket")
+    parser.add_argument("--force", action="store_true", help="Ingest files the store has already ingested")
+    args = parser.parse_args()
+    if not args.location:
+        parser.error("No location given and NW_FLOW_LOG_LOCATION is not set")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    summary = ingest(open_source(args.location, args.region), args.store, force=args.force)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
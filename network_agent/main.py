@@ -1,32 +1,58 @@
+import os
+
 import streamlit as st
-from chat_engine import chat
+import telemetry
+from chat_engine import chat_stream
 from bedrock_utils import initialize_bedrock_client
+from history import HistoryManager
 from tools import get_all_tools
+from transcript import Transcript, format_tool_call
+
+
+# Chat entries shown at first; "Show older messages" reveals this many more each time
+DISPLAY_WINDOW = int(os.environ.get("NW_UI_WINDOW", "30"))
+
+
+# Streamlit reruns this script on every interaction; the client and tool list are
+# built once per process and shared by every browser session
+@st.cache_resource
+def shared_bedrock_client():
+    return initialize_bedrock_client()
+
+
+@st.cache_resource
+def shared_tools():
+    return get_all_tools()
 
 
 def main():
     st.title("AWS Network Assistant")
     st.write("Ask about VPCs, Internet Gateways, NAT Gateways, Route Tables, and other network components.")
 
-    # Initialize the bedrock client and tools
-    if 'bedrock_client' not in st.session_state:
-        st.session_state.bedrock_client = initialize_bedrock_client()
-    if 'tools' not in st.session_state:
-        st.session_state.tools = get_all_tools()
     if 'messages' not in st.session_state:
         st.session_state.messages = []
+    if 'history' not in st.session_state:
+        st.session_state.history = HistoryManager()
+    if 'transcript' not in st.session_state:
+        st.session_state.transcript = Transcript()
+    if 'window' not in st.session_state:
+        st.session_state.window = DISPLAY_WINDOW
+    transcript = st.session_state.transcript
+    # Picks up anything a previous run added without finishing (e.g., an interrupted turn)
+    transcript.sync(st.session_state.messages)
 
     # Create a chat input
     user_input = st.chat_input("Type your question here...")
 
-    # Display chat history
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            with st.chat_message("user"):
-                st.write(message["content"][0]["text"])
-        else:
-            with st.chat_message("assistant"):
-                st.write(message["content"][0]["text"])
+    # Display the most recent part of the chat history
+    hidden = len(transcript.entries) - st.session_state.window
+    if hidden > 0:
+        st.button(f"Show {min(hidden, DISPLAY_WINDOW)} older messages ({hidden} hidden)", on_click=show_older)
+    for entry in transcript.window(st.session_state.window):
+        with st.chat_message(entry["role"]):
+            if entry["text"]:
+                st.write(entry["text"])
+            show_tool_calls(entry)
 
     # Handle new user input
     if user_input:
@@ -40,18 +66,53 @@ def main():
         with st.chat_message("user"):
             st.write(user_input)
 
-        # Get and display assistant response
-        with st.chat_message("assistant"):
-            response = chat(
+        # Stream the assistant response as it is generated; chat_stream adds
+        # Claude's messages and tool results to the chat history in place
+        with st.chat_message("assistant"), telemetry.collect() as finished:
+            st.write_stream(chat_stream(
                 user_input, 
                 st.session_state.messages, 
-                st.session_state.bedrock_client, 
-                st.session_state.tools
-            )
-            st.write(response[-1]["content"][0]["text"])
+                shared_bedrock_client(), 
+                shared_tools(),
+                history=st.session_state.history
+            ))
+            transcript.sync(st.session_state.messages)
+            reply = transcript.last_reply()
+            if reply:
+                show_tool_calls(reply)
+        if finished:
+            st.session_state.last_turn = telemetry.summarize_turn(finished[-1])
+
+    if 'last_turn' in st.session_state:
+        show_turn_breakdown(st.session_state.last_turn)
+
+
+def show_older():
+    st.session_state.window += DISPLAY_WINDOW
+
+
+def show_tool_calls(entry):
+    """Show the tool calls behind a reply, collapsed."""
+    calls = entry["tool_calls"]
+    if calls:
+        with st.expander(f"{len(calls)} tool call{'s' if len(calls) != 1 else ''}"):
+            st.markdown("\n".join(f"- {format_tool_call(call)}" for call in calls))
+
 
-        # Add assistant response to chat history
-        st.session_state.messages.extend(response)
+def show_turn_breakdown(turn):
+    """Show where the time of the last turn went in the sidebar."""
+    with st.sidebar:
+        st.subheader("Last turn")
+        total, model = st.columns(2)
+        total.metric("Total", f"{turn['total_ms'] / 1000:.2f} s")
+        model.metric("Model", f"{turn['model_ms'] / 1000:.2f} s")
+        tool, other = st.columns(2)
+        tool.metric("Tools", f"{turn['tool_ms'] / 1000:.2f} s")
+        other.metric("Other", f"{turn['other_ms'] / 1000:.2f} s")
+        st.caption(f"{turn['model_calls']} model calls, {turn['tool_calls']} tool calls, "
+                   f"{turn['aws_calls']} AWS calls, {turn['input_tokens']} input / "
+                   f"{turn['output_tokens']} output tokens")
+        st.dataframe(turn['calls'], hide_index=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+
+def profile(module: str) -> List[Dict[str, Any]]:
+    """
+    Import a module in a fresh interpreter with -X importtime and return one row per imported module.
+
+    Args:
+    module (str): The module to import (e.g., "main").
+
+    Returns:
+    List[Dict[str, Any]]: Module name, self and cumulative import time in milliseconds, and nesting depth.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report where the time goes when a module is imported, "
+                                                 "to keep cold start fast.")
+    parser.add_argument("module", nargs="?", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list per ranking (default: 15)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    # Interpreter startup (site, encodings) is listed too; only time under the module itself counts
+    total_ms = next((row["cumulative_ms"] for row in rows
+                     if row["module"] == args.module and row["depth"] == 0), 0.0)
+    by_cumulative = sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:args.top]
+    by_self = sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({"module": args.module, "total_ms": round(total_ms, 1), "modules": len(rows),
+                          "top_cumulative": by_cumulative, "top_self": by_self}, indent=2))
+        return
+
+    print(f"import {args.module}: {total_ms:.1f} ms across {len(rows)} modules\n")
+    for title, ranked, field in (("Cumulative", by_cumulative, "cumulative_ms"), ("Self", by_self, "self_ms")):
+        print(f"Top {len(ranked)} by {title.lower()} time:")
+        for row in ranked:
+            print(f"  {row[field]:9.1f} ms  {row['module']}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
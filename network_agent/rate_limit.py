@@ -0,0 +1,227 @@
+# rate_limit.py
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aws_clients import get_account_id, get_pool
+
+logger = logging.getLogger(__name__)
+
+
+# Requests per second and burst allowed per (account, region, API) before calls queue.
+# EC2 refills non-mutating (Describe*) actions at 20/s from a bucket of 100.
+SERVICE_LIMITS = {
+    "ec2": (float(os.environ.get("NW_EC2_RATE", "20")), int(os.environ.get("NW_EC2_BURST", "100"))),
+    "bedrock-runtime": (float(os.environ.get("NW_BEDROCK_RATE", "10")),
+                        int(os.environ.get("NW_BEDROCK_BURST", "20"))),
+}
+# Longest a call waits in the queue; past it the call goes out anyway
+MAX_WAIT_SECONDS = float(os.environ.get("NW_RATE_LIMIT_MAX_WAIT", "30"))
+# On a throttle the rate is multiplied by this; each success adds this fraction of the configured rate back
+DECREASE_FACTOR = 0.5
+INCREASE_FRACTION = 0.02
+# The adaptive rate never drops below this many requests per second
+MIN_RATE = 0.5
+# Up to this fraction of each wait is added at random, so queued calls don't wake in lockstep
+JITTER = 0.1
+
+THROTTLING_CODES = frozenset({
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException", "RequestLimitExceeded",
+    "RequestThrottled", "SlowDown", "EC2ThrottledException", "BandwidthLimitExceeded",
+})
+
+Key = Tuple[str, str, str, str]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket whose rate adapts to throttling (AIMD).
+
+    acquire() reserves a token and sleeps until it is due, so callers queue in arrival
+    order instead of failing. A throttle response halves the rate; each success raises
+    it by a small step, back up to the configured rate.
+
+    Args:
+    rate (float): Tokens added per second, the highest rate the bucket allows.
+    burst (int): Bucket capacity.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttles = 0
+
+    def _refill(self, now: float) -> None:
+        # Caller must hold self._lock
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait: float = MAX_WAIT_SECONDS) -> float:
+        """Take a token, waiting for it if the bucket is empty. Returns the seconds waited."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            # A negative balance is the queue ahead of this call
+            wait = min(-self._tokens / self.rate * (1 + random.uniform(0, JITTER)), max_wait)
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            time.sleep(wait)
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+                self.waits += 1
+                self.wait_seconds += wait
+        return wait
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.throttles += 1
+            self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            # AWS has run out, so stop spending the remaining burst
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE_FRACTION)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "max_rate": self.max_rate,
+                "burst": self.burst,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "throttles": self.throttles,
+            }
+
+
+class RateLimiter:
+    """
+    One TokenBucket per (account, region, service, API), shared by every session in the process.
+
+    Args:
+    limits (Dict[str, Tuple[float, int]]): Rate and burst per service; other services are not limited.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.limits = dict(SERVICE_LIMITS if limits is None else limits)
+        self._buckets: Dict[Key, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, account: str, region: str, service: str, operation: str) -> Optional[TokenBucket]:
+        limit = self.limits.get(service)
+        if limit is None:
+            return None
+        key = (account, region, service, operation)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(*limit))
+        return bucket
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-bucket rate, queue depth, waits and throttles."""
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return [
+            {"account": account, "region": region, "service": service, "operation": operation, **bucket.stats()}
+            for (account, region, service, operation), bucket in buckets
+        ]
+
+    def render(self) -> str:
+        """Return the bucket stats as Prometheus text metrics."""
+        metrics = [
+            ("nw_aws_rate_limit_rate", "gauge", "Current allowed requests per second", "rate"),
+            ("nw_aws_rate_limit_queue_depth", "gauge", "AWS calls waiting for a token", "queue_depth"),
+            ("nw_aws_rate_limit_waits_total", "counter", "AWS calls that waited for a token", "waits"),
+            ("nw_aws_rate_limit_wait_seconds_total", "counter", "Time AWS calls spent waiting for a token",
+             "wait_seconds"),
+            ("nw_aws_rate_limit_throttles_total", "counter", "Throttling responses from AWS", "throttles"),
+        ]
+        stats = self.stats()
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for row in stats:
+                labels = ",".join(f'{key}="{row[key]}"' for key in ("account", "region", "service", "operation"))
+                lines.append(f"{name}{{{labels}}} {row[field]}")
+        return "\n".join(lines) + "\n"
+
+
+_limiter = RateLimiter()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    return _limiter
+
+
+def _is_throttle(response: Optional[Tuple[Any, Dict[str, Any]]]) -> bool:
+    http_response, parsed = response
+    code = parsed.get("Error", {}).get("Code") if isinstance(parsed, dict) else None
+    return code in THROTTLING_CODES or getattr(http_response, "status_code", None) == 429
+
+
+def _before_attempt(request: Any, event_name: str, **kwargs: Any) -> None:
+    # request-created fires once per attempt, so retries queue for a token too
+    _, service, operation = event_name.split(".", 2)
+    bucket = _limiter.bucket(get_account_id(), request.context.get("client_region"), service, operation)
+    if bucket is not None:
+        waited = bucket.acquire()
+        if waited:
+            request.context["rate_limit_wait"] = request.context.get("rate_limit_wait", 0.0) + waited
+
+
+def _after_attempt(response: Any = None, operation: Any = None, request_dict: Optional[Dict[str, Any]] = None,
+                   **kwargs: Any) -> None:
+    if response is None or operation is None:
+        return
+    region = (request_dict or {}).get("context", {}).get("client_region")
+    bucket = _limiter.bucket(get_account_id(), region, operation.service_model.service_name, operation.name)
+    if bucket is None:
+        return
+    if _is_throttle(response):
+        bucket.on_throttle()
+        logger.warning(f"{operation.name} throttled in {region}; rate lowered to {bucket.rate:.2f}/s")
+    elif getattr(response[0], "status_code", 500) < 400:
+        bucket.on_success()
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install() -> None:
+    """Rate-limit EC2 and Bedrock runtime calls on every pooled client. Safe to call more than once."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+    pool = get_pool()
+    for service in _limiter.limits:
+        pool.add_event_handler(f"request-created.{service}", _before_attempt)
+        pool.add_event_handler(f"needs-retry.{service}", _after_attempt)
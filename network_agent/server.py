@@ -0,0 +1,269 @@
+# server.py
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import tornado.ioloop
+import tornado.web
+from tornado.iostream import StreamClosedError
+
+import rate_limit
+import telemetry
+from bedrock_utils import initialize_bedrock_client
+from chat_engine import achat_stream
+from history import HistoryManager, drop_oldest_turns
+from tools import get_all_tools
+from tools.encoding import ContinuationStore, continuation_scope
+from tools.singleflight import get_flights
+
+logger = logging.getLogger(__name__)
+
+
+# Open sessions allowed at once; creating one more evicts the least recently used
+MAX_SESSIONS = int(os.environ.get("NW_SERVER_MAX_SESSIONS", "500"))
+# Seconds without a request after which a session is evicted
+SESSION_IDLE_SECONDS = int(os.environ.get("NW_SESSION_IDLE_SECONDS", "1800"))
+# Characters of conversation JSON kept per session; older turns are dropped past it
+SESSION_MAX_CHARS = int(os.environ.get("NW_SESSION_MAX_CHARS", "2000000"))
+# Longest user message accepted, in characters
+MAX_MESSAGE_CHARS = int(os.environ.get("NW_MAX_MESSAGE_CHARS", "8000"))
+# Request header naming the user, set by the authenticating proxy in front of the server
+USER_HEADER = os.environ.get("NW_SERVER_USER_HEADER", "X-Forwarded-User")
+# Seconds between idle-session sweeps
+EVICTION_INTERVAL_SECONDS = 60
+
+
+class Session:
+    """
+    One conversation: its full message history, its history compactor, the continuations of
+    its truncated tool results and who owns it.
+    """
+
+    def __init__(self, owner: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.messages: List[Dict[str, Any]] = []
+        self.history = HistoryManager()
+        self.continuations = ContinuationStore()
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        # One turn at a time per session
+        self.busy = False
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "created": round(self.created, 3),
+            "messages": len(self.messages),
+            "busy": self.busy,
+        }
+
+
+class SessionManager:
+    """
+    The open sessions of the server, bounded by count and idle time.
+
+    Args:
+    max_sessions (int): Open sessions allowed at once.
+    idle_seconds (float): Seconds without a request after which a session is evicted.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        # Insertion order is kept as least recently used first
+        self._sessions: Dict[str, Session] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, owner: Optional[str]) -> Session:
+        while len(self._sessions) >= self.max_sessions:
+            idle = next((s for s in self._sessions.values() if not s.busy), None)
+            if idle is None:
+                raise tornado.web.HTTPError(503, reason="Too many active sessions")
+            logger.info(f"Evicting least recently used session {idle.id}")
+            del self._sessions[idle.id]
+        session = Session(owner)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str, owner: Optional[str]) -> Session:
+        """Return a session owned by owner and mark it used. Raises HTTPError 404 otherwise."""
+        session = self._sessions.get(session_id)
+        if session is None or session.owner != owner:
+            raise tornado.web.HTTPError(404, reason="Unknown session")
+        session.touch()
+        self._sessions[session_id] = self._sessions.pop(session_id)
+        return session
+
+    def delete(self, session_id: str, owner: Optional[str]) -> None:
+        self.get(session_id, owner)
+        del self._sessions[session_id]
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than idle_seconds; returns how many were dropped."""
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [s.id for s in self._sessions.values() if s.last_active < cutoff and not s.busy]
+        for session_id in idle:
+            del self._sessions[session_id]
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle sessions, {len(self._sessions)} open")
+        return len(idle)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def initialize(self, sessions: SessionManager, bedrock_client: Any, tools: List[Dict[str, Any]]):
+        self.sessions = sessions
+        self.bedrock_client = bedrock_client
+        self.tools = tools
+
+    @property
+    def owner(self) -> Optional[str]:
+        return self.request.headers.get(USER_HEADER)
+
+    def write_error(self, status_code: int, **kwargs: Any) -> None:
+        self.finish({"error": self._reason})
+
+
+class SessionsHandler(BaseHandler):
+
+    def post(self):
+        session = self.sessions.create(self.owner)
+        self.set_status(201)
+        self.finish(session.to_dict())
+
+
+class SessionHandler(BaseHandler):
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id, self.owner)
+        self.finish({**session.to_dict(), "history": [
+            {"role": message["role"], "text": "".join(item["text"] for item in message["content"] if "text" in item)}
+            for message in session.messages if any("text" in item for item in message["content"])
+        ]})
+
+    def delete(self, session_id):
+        self.sessions.delete(session_id, self.owner)
+        self.set_status(204)
+        self.finish()
+
+
+class MessagesHandler(BaseHandler):
+    """
+    Run one turn of a session and stream it as server-sent events: "text" events with
+    Claude's text as it is generated, then a "done" event with the turn's latency
+    breakdown, or an "error" event.
+    """
+
+    async def post(self, session_id):
+        session = self.sessions.get(session_id, self.owner)
+        try:
+            text = json.loads(self.request.body or b"{}").get("text")
+        except (ValueError, AttributeError):
+            text = None
+        if not isinstance(text, str) or not text.strip():
+            raise tornado.web.HTTPError(400, reason="Body must be a JSON object with a non-empty 'text'")
+        if len(text) > MAX_MESSAGE_CHARS:
+            raise tornado.web.HTTPError(413, reason=f"Message is longer than {MAX_MESSAGE_CHARS} characters")
+        if session.busy:
+            raise tornado.web.HTTPError(409, reason="A turn is already running in this session")
+
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")
+        session.busy = True
+        turn_start = len(session.messages)
+        session.messages.append({"role": "user", "content": [{"text": text}]})
+        stream = achat_stream(text, session.messages, self.bedrock_client, self.tools, history=session.history)
+        completed = False
+        try:
+            with telemetry.collect() as finished, continuation_scope(session.continuations):
+                async for delta in stream:
+                    await self._send("text", {"text": delta})
+            completed = True
+            drop_oldest_turns(session.messages, SESSION_MAX_CHARS)
+            await self._send("done", telemetry.summarize_turn(finished[-1]) if finished else {})
+        except StreamClosedError:
+            logger.info(f"Client of session {session.id} disconnected")
+        except Exception as e:
+            try:
+                await self._send("error", {"error": str(e)})
+            except StreamClosedError:
+                pass
+        finally:
+            await stream.aclose()
+            if not completed:
+                # A turn cut short can leave unanswered tool calls behind, so drop it whole
+                del session.messages[turn_start:]
+            session.busy = False
+            session.touch()
+        self.finish()
+
+    async def _send(self, event: str, data: Dict[str, Any]) -> None:
+        self.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n")
+        await self.flush()
+
+
+class HealthHandler(BaseHandler):
+
+    def get(self):
+        self.finish({"status": "ok", "sessions": len(self.sessions)})
+
+
+class MetricsHandler(BaseHandler):
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(telemetry.prometheus().render() + rate_limit.get_limiter().render() + get_flights().render())
+
+
+def make_app(sessions: Optional[SessionManager] = None, bedrock_client: Any = None,
+             tools: Optional[List[Dict[str, Any]]] = None) -> tornado.web.Application:
+    """
+    Build the server application. Every session shares one Bedrock client, one tool list,
+    and through them the process-wide client pool, describe cache and tool registry.
+    """
+    shared = {
+        "sessions": SessionManager() if sessions is None else sessions,
+        "bedrock_client": initialize_bedrock_client() if bedrock_client is None else bedrock_client,
+        "tools": get_all_tools() if tools is None else tools,
+    }
+    return tornado.web.Application([
+        (r"/sessions", SessionsHandler, shared),
+        (r"/sessions/([0-9a-f]+)", SessionHandler, shared),
+        (r"/sessions/([0-9a-f]+)/messages", MessagesHandler, shared),
+        (r"/health", HealthHandler, shared),
+        (r"/metrics", MetricsHandler, shared),
+    ])
+
+
+async def serve(port: int, address: str) -> None:
+    sessions = SessionManager()
+    app = make_app(sessions)
+    app.listen(port, address)
+    tornado.ioloop.PeriodicCallback(sessions.evict_idle, EVICTION_INTERVAL_SECONDS * 1000).start()
+    logger.info(f"Serving on http://{address}:{port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the network agent over HTTP, streaming turns as "
+                                                 "server-sent events.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--address", default="127.0.0.1", help="Address to bind")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.address))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+# telemetry.py
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from aws_clients import get_pool
+from tools.cache import get_cache
+from tools.registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Append every finished turn as a JSON line to this file
+JSONL_PATH = os.environ.get("NW_TELEMETRY_JSONL")
+# Rewrite this file with Prometheus text metrics after every turn (for the node_exporter textfile collector)
+PROMETHEUS_PATH = os.environ.get("NW_TELEMETRY_PROMETHEUS")
+# Finished turns kept in memory for display
+RECENT_TURNS = 50
+
+# Span kinds
+TURN = "turn"
+MODEL = "model"
+TOOL = "tool"
+AWS = "aws"
+
+
+class Span:
+    """
+    One timed unit of work in a turn: the turn itself, a model call, a tool call or an AWS API call.
+
+    Spans nest: a span started while another is current becomes its child, across
+    threads too when the work is submitted through bind(). Attributes describe the
+    work (tokens, status, payload size) and counters accumulate events that happen
+    while the span is current (cache hits and misses).
+
+    Args:
+    kind (str): TURN, MODEL, TOOL or AWS.
+    name (str): The model key, tool name or API operation.
+    parent (Optional[Span]): The enclosing span.
+    **attributes: Initial attributes.
+    """
+
+    def __init__(self, kind: str, name: str, parent: Optional["Span"] = None, **attributes: Any):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.attributes: Dict[str, Any] = attributes
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.children: List[Span] = []
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent._add_child(self)
+
+    def _add_child(self, child: "Span") -> None:
+        with self._lock:
+            self.children.append(child)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+            if error is not None:
+                self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end if self.end is not None else time.perf_counter()) - self.start) * 1000
+
+    def walk(self, kind: Optional[str] = None) -> Iterator["Span"]:
+        """Yield the descendants of this span (not the span itself), optionally only those of one kind."""
+        with self._lock:
+            children = list(self.children)
+        for child in children:
+            if kind is None or child.kind == kind:
+                yield child
+            yield from child.walk(kind)
+
+    def total(self, counter: str) -> int:
+        """Sum a counter over this span and its descendants."""
+        return self.counters.get(counter, 0) + sum(span.counters.get(counter, 0) for span in self.walk())
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Split this span's wall time into model, tool and other time.
+
+        Tool calls run concurrently (and during streaming, alongside the model), so
+        each category is the union of its spans' intervals rather than their sum;
+        time covered by both is counted as model time.
+        """
+        model = _intervals(self.walk(MODEL))
+        tools = _subtract(_intervals(self.walk(TOOL)), model)
+        model_ms = _length(model) * 1000
+        tool_ms = _length(tools) * 1000
+        return {
+            "total_ms": round(self.duration_ms, 1),
+            "model_ms": round(model_ms, 1),
+            "tool_ms": round(tool_ms, 1),
+            "other_ms": round(max(0.0, self.duration_ms - model_ms - tool_ms), 1),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "kind": self.kind,
+            "name": self.name,
+            "started_at": round(self.started_at, 3),
+            "offset_ms": round((self.start - self.parent.start) * 1000, 1) if self.parent else 0.0,
+            "duration_ms": round(self.duration_ms, 1),
+            **self.attributes,
+        }
+        if self.counters:
+            data.update(self.counters)
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+def _intervals(spans: Iterator[Span]) -> List[Tuple[float, float]]:
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted((span.start, span.end or time.perf_counter()) for span in spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals: List[Tuple[float, float]], other: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    result = []
+    for start, end in intervals:
+        for other_start, other_end in other:
+            if other_end <= start or other_start >= end:
+                continue
+            if other_start > start:
+                result.append((start, other_start))
+            start = max(start, other_end)
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _length(intervals: List[Tuple[float, float]]) -> float:
+    return sum(end - start for start, end in intervals)
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("telemetry_span", default=None)
+# Receives root spans as they finish within a collect() block
+_collector: contextvars.ContextVar[Optional[List[Span]]] = contextvars.ContextVar("telemetry_collector", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start(kind: str, name: str, **attributes: Any) -> Span:
+    """Start a span under the current one without making it current; end it with finish()."""
+    return Span(kind, name, _current.get(), **attributes)
+
+
+def finish(finished: Span, error: Optional[BaseException] = None) -> None:
+    """End a span, exporting it if it is a root span."""
+    finished.finish(error)
+    if finished.parent is None:
+        _export(finished)
+
+
+@contextlib.contextmanager
+def activate(active: Span) -> Iterator[Span]:
+    """Make a span current for a block, so spans and AWS calls in the block nest under it."""
+    token = _current.set(active)
+    try:
+        yield active
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator holding the span was closed from another context
+            _current.set(active.parent)
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Run a block as the current span, nested under the enclosing one. Root spans are exported when they finish.
+
+    Args:
+    kind (str): TURN, MODEL, TOOL or AWS.
+    name (str): The model key, tool name or operation.
+    **attributes: Initial attributes.
+    """
+    new_span = start(kind, name, **attributes)
+    error = None
+    try:
+        with activate(new_span):
+            yield new_span
+    except BaseException as e:
+        error = None if isinstance(e, GeneratorExit) else e
+        raise
+    finally:
+        finish(new_span, error)
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap func to run in a copy of the caller's context, so spans started in a worker thread nest correctly."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[List[Span]]:
+    """Collect the root spans (e.g., turns) that finish inside the block, in addition to exporting them."""
+    finished: List[Span] = []
+    token = _collector.set(finished)
+    try:
+        yield finished
+    finally:
+        _collector.reset(token)
+
+
+class JsonLinesExporter:
+    """
+    Writes each finished root span, with its nested children, as one JSON line.
+
+    Args:
+    path (Optional[str]): File to append to.
+    stream (Optional[TextIO]): Stream to write to instead of a file.
+    """
+
+    def __init__(self, path: Optional[str] = None, stream: Optional[TextIO] = None):
+        self.path = path
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, root: Span) -> None:
+        line = json.dumps({**root.to_dict(), **root.breakdown()}, default=str)
+        with self._lock:
+            if self.stream is not None:
+                self.stream.write(line + "\n")
+                self.stream.flush()
+            else:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class PrometheusExporter:
+    """
+    Aggregates finished spans into Prometheus metrics, rendered in the text exposition format.
+
+    Args:
+    path (Optional[str]): If set, the file is rewritten with the current metrics after every export.
+    """
+
+    HISTOGRAMS = {
+        "nw_turn_duration_seconds": "Wall time of chat turns",
+        "nw_model_call_duration_seconds": "Latency of Bedrock model calls",
+        "nw_tool_call_duration_seconds": "Latency of tool calls",
+        "nw_aws_call_duration_seconds": "Latency of AWS API calls",
+    }
+    COUNTERS = {
+        "nw_model_tokens_total": "Tokens used by model calls",
+        "nw_tool_result_bytes_total": "Bytes of JSON returned by tool calls",
+        "nw_tool_cache_lookups_total": "Describe cache lookups made by tool calls",
+        "nw_aws_call_errors_total": "AWS API calls that failed",
+    }
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        # Serializes file writes, so the file always ends with the latest render
+        self._write_lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = defaultdict(lambda: defaultdict(_Histogram))
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+
+    def _observe(self, metric: str, value: float, **labels: str) -> None:
+        self._histograms[metric][tuple(sorted(labels.items()))].observe(value)
+
+    def _add(self, metric: str, value: float, **labels: str) -> None:
+        if value:
+            self._counters[metric][tuple(sorted(labels.items()))] += value
+
+    def export(self, root: Span) -> None:
+        with self._lock:
+            for item in [root, *root.walk()]:
+                seconds = item.duration_ms / 1000
+                if item.kind == TURN:
+                    self._observe("nw_turn_duration_seconds", seconds)
+                elif item.kind == MODEL:
+                    self._observe("nw_model_call_duration_seconds", seconds, model=item.name)
+                    for token_type in ("input", "output", "cache_read", "cache_write"):
+                        self._add("nw_model_tokens_total", item.attributes.get(f"{token_type}_tokens", 0),
+                                  model=item.name, type=token_type)
+                elif item.kind == TOOL:
+                    status = item.attributes.get("status", "error")
+                    self._observe("nw_tool_call_duration_seconds", seconds, tool=item.name, status=status)
+                    self._add("nw_tool_result_bytes_total", item.attributes.get("result_bytes", 0), tool=item.name)
+                    self._add("nw_tool_cache_lookups_total", item.counters.get("cache_hits", 0),
+                              tool=item.name, result="hit")
+                    self._add("nw_tool_cache_lookups_total", item.counters.get("cache_misses", 0),
+                              tool=item.name, result="miss")
+                elif item.kind == AWS:
+                    labels = {"service": item.attributes.get("service", ""), "operation": item.name}
+                    self._observe("nw_aws_call_duration_seconds", seconds, **labels)
+                    if item.error or item.attributes.get("http_status", 200) >= 400:
+                        self._add("nw_aws_call_errors_total", 1, **labels)
+        if self.path:
+            self.write(self.path)
+
+    def write(self, path: str) -> None:
+        """Replace the file at path with the current metrics, atomically."""
+        with self._write_lock:
+            text = self.render()
+            # A temporary file of its own, so writers in other processes cannot collide with this one
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(path)),
+                                             prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                             delete=False) as f:
+                f.write(text)
+            try:
+                # Readable by the metrics collector, as a file written with open() would be
+                os.chmod(f.name, 0o644)
+                os.replace(f.name, path)
+            except OSError:
+                os.unlink(f.name)
+                raise
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric, help_text in self.HISTOGRAMS.items():
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for labels, histogram in sorted(self._histograms.get(metric, {}).items()):
+                    # Bucket counts are already cumulative
+                    for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                        lines.append(f"{metric}_bucket{_labels(labels, le=str(bound))} {count}")
+                    lines.append(f"{metric}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+            for metric, help_text in self.COUNTERS.items():
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for labels, value in sorted(self._counters.get(metric, {}).items()):
+                    lines.append(f"{metric}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class RecentTurnsExporter:
+    """Keeps the most recent finished turns in memory."""
+
+    def __init__(self, maxlen: int = RECENT_TURNS):
+        self.turns: Deque[Span] = deque(maxlen=maxlen)
+
+    def export(self, root: Span) -> None:
+        if root.kind == TURN:
+            self.turns.append(root)
+
+
+_exporters: List[Any] = []
+_prometheus = PrometheusExporter(PROMETHEUS_PATH)
+_recent = RecentTurnsExporter()
+
+
+def add_exporter(exporter: Any) -> None:
+    """Register an object with an export(root_span) method to receive every finished root span."""
+    _exporters.append(exporter)
+
+
+def prometheus() -> PrometheusExporter:
+    """Return the process-wide Prometheus exporter (always registered)."""
+    return _prometheus
+
+
+def recent_turns() -> List[Span]:
+    """Return the most recently finished turns in the process, oldest first."""
+    return list(_recent.turns)
+
+
+def _export(root: Span) -> None:
+    finished = _collector.get()
+    if finished is not None:
+        finished.append(root)
+    for exporter in _exporters:
+        try:
+            exporter.export(root)
+        except Exception as e:
+            logger.warning(f"Telemetry exporter {type(exporter).__name__} failed: {str(e)}")
+
+
+def summarize_turn(turn: Span) -> Dict[str, Any]:
+    """Return a turn's latency breakdown with per-call rows, for display."""
+    models = list(turn.walk(MODEL))
+    tools = list(turn.walk(TOOL))
+    aws_calls = list(turn.walk(AWS))
+    return {
+        **turn.breakdown(),
+        "model_calls": len(models),
+        "tool_calls": len(tools),
+        "aws_calls": len(aws_calls),
+        "input_tokens": sum(s.attributes.get("input_tokens", 0) for s in models),
+        "output_tokens": sum(s.attributes.get("output_tokens", 0) for s in models),
+        "calls": [
+            {
+                "kind": s.kind,
+                "name": s.name,
+                "offset_ms": round((s.start - turn.start) * 1000, 1),
+                "duration_ms": round(s.duration_ms, 1),
+                "detail": _detail(s),
+            } for s in sorted(models + tools, key=lambda s: s.start)
+        ],
+    }
+
+
+def _detail(item: Span) -> str:
+    if item.kind == MODEL:
+        a = item.attributes
+        return (f"{a.get('input_tokens', 0)} in / {a.get('output_tokens', 0)} out tokens, "
+                f"stop: {a.get('stop_reason')}")
+    a = item.attributes
+    return (f"{a.get('status')}, {a.get('result_bytes', 0)} bytes, {a.get('aws_calls', 0)} AWS calls, "
+            f"{a.get('cache_hits', 0)} cache hits")
+
+
+def _tool_middleware(tool: Any, arguments: Dict[str, Any], call_next: Callable[[Dict[str, Any]], Any]) -> Any:
+    with span(TOOL, tool.name) as tool_span:
+        result = call_next(arguments)
+        status = "error" if isinstance(result, dict) and "error" in result else "success"
+        tool_span.set(status=status, result_bytes=len(json.dumps(result, default=str, separators=(",", ":"))),
+                      aws_calls=sum(1 for _ in tool_span.walk(AWS)),
+                      cache_hits=tool_span.total("cache_hits"), cache_misses=tool_span.total("cache_misses"))
+        return result
+
+
+def _on_cache_lookup(resource_type: str, hit: bool) -> None:
+    current = _current.get()
+    if current is not None:
+        current.count("cache_hits" if hit else "cache_misses")
+
+
+def _before_aws_call(model: Any, context: Dict[str, Any], **kwargs: Any) -> None:
+    parent = _current.get()
+    if parent is not None:
+        context["telemetry_span"] = Span(AWS, model.name, parent, service=model.service_model.service_name,
+                                         region=context.get("client_region"))
+
+
+def _after_aws_call(context: Dict[str, Any], http_response: Any = None, parsed: Optional[Dict[str, Any]] = None,
+                    **kwargs: Any) -> None:
+    aws_span = context.pop("telemetry_span", None)
+    if aws_span is not None:
+        metadata = (parsed or {}).get("ResponseMetadata", {})
+        aws_span.set(http_status=metadata.get("HTTPStatusCode", getattr(http_response, "status_code", None)),
+                     retries=metadata.get("RetryAttempts", 0))
+        if "rate_limit_wait" in context:
+            # Time spent queued for a rate limiter token (see rate_limit.py)
+            aws_span.set(queued_ms=round(context["rate_limit_wait"] * 1000, 1))
+        aws_span.finish()
+
+
+def _after_aws_call_error(context: Dict[str, Any], exception: Optional[BaseException] = None,
+                          **kwargs: Any) -> None:
+    aws_span = context.pop("telemetry_span", None)
+    if aws_span is not None:
+        aws_span.finish(exception)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install(exporters: Sequence[Any] = ()) -> None:
+    """
+    Start instrumenting the process: tool calls (registry middleware), AWS calls (botocore
+    events on pooled clients) and describe cache lookups. Safe to call more than once.
+
+    Args:
+    exporters (Sequence[Any]): Extra exporters to register.
+    """
+    global _installed
+    for exporter in exporters:
+        add_exporter(exporter)
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+    add_exporter(_prometheus)
+    add_exporter(_recent)
+    if JSONL_PATH:
+        add_exporter(JsonLinesExporter(JSONL_PATH))
+    # Outside result encoding, so the span covers encoding and result_bytes is what the model receives
+    get_registry().add_middleware(_tool_middleware, outermost=True)
+    get_cache().add_listener(_on_cache_lookup)
+    pool = get_pool()
+    pool.add_event_handler("before-call", _before_aws_call)
+    pool.add_event_handler("after-call", _after_aws_call)
+    pool.add_event_handler("after-call-error", _after_aws_call_error)
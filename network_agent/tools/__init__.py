@@ -1,22 +1,28 @@
-from .vpc_tools import vpc_tools, handle_vpc_tool
-from .network_tools import network_tools, handle_network_tool
-from .ec2_tools import ec2_tools, handle_ec2_tool
-from .general_tools import general_tools, handle_general_tool
+import rate_limit
+
+from .manifest import import_tool_modules, load_manifest
+from .registry import get_registry
+
+# Tool specs come from the prebuilt manifest, and each tool module is imported the
+# first time one of its tools is called. Without a current manifest, import them all now.
+_manifest = load_manifest()
+if _manifest is None:
+    import_tool_modules()
+else:
+    for _entry in _manifest:
+        get_registry().declare(_entry["name"], _entry["module"], _entry["spec"])
+
+from . import encoding  # noqa: E402
+
+# Compact and size-cap every tool result before it is sent to the model
+get_registry().add_middleware(encoding.encode_middleware)
+# Queue EC2 calls under a shared, throttling-aware rate limit
+rate_limit.install()
 
 
 def get_all_tools():
-    return vpc_tools + network_tools + ec2_tools + general_tools
+    return get_registry().specs()
 
 
 def handle_tool(tool_use):
-    tool_name = tool_use['name']
-    if tool_name in [tool['toolSpec']['name'] for tool in vpc_tools]:
-        return handle_vpc_tool(tool_use)
-    elif tool_name in [tool['toolSpec']['name'] for tool in network_tools]:
-        return handle_network_tool(tool_use)
-    elif tool_name in [tool['toolSpec']['name'] for tool in ec2_tools]:
-        return handle_ec2_tool(tool_use)
-    elif tool_name in [tool['toolSpec']['name'] for tool in general_tools]:
-        return handle_general_tool(tool_use)
-    else:
-        return {"error": f"Unknown tool: {tool_name}"}
+    return get_registry().dispatch(tool_use)
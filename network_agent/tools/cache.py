@@ -0,0 +1,219 @@
+# tools/cache.py
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from aws_clients import get_account_id
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds a describe result stays fresh, per resource type. Topology-level resources
+# change rarely; gateways, SGs and instances churn more and get shorter TTLs.
+DEFAULT_TTLS = {
+    "vpcs": 300,
+    "subnets": 300,
+    "network_acls": 300,
+    "internet_gateways": 300,
+    "route_tables": 120,
+    "nat_gateways": 120,
+    "security_groups": 60,
+    "instances": 60,
+    "regions": 3600,
+    "topology": 120,
+}
+DEFAULT_TTL = 60
+# Maximum entries kept per resource type; least recently used entries are evicted first
+DEFAULT_MAXSIZE = 256
+
+# Schema property shared by every cached tool
+CACHE_PROPERTIES = {
+    "force_refresh": {
+        "type": "boolean",
+        "description": "Bypass the cache and fetch fresh data from AWS"
+    }
+}
+
+
+class DescribeCache:
+    """
+    Thread-safe TTL + LRU cache for AWS describe results.
+
+    Each resource type gets its own cachetools TTLCache, so TTLs and size bounds are
+    tuned per type. Keys are (account, region, api, normalized arguments). Hit, miss
+    and invalidation counts are tracked per resource type.
+
+    Args:
+    ttls (Optional[Dict[str, float]]): Per-resource-type TTLs in seconds.
+    maxsize (int): Maximum number of entries per resource type.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, maxsize: int = DEFAULT_MAXSIZE):
+        self._ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._caches: Dict[str, TTLCache] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._listeners: List[Callable[[str, bool], None]] = []
+
+    def add_listener(self, listener: Callable[[str, bool], None]) -> None:
+        """Call listener(resource_type, hit) after every lookup (e.g., to attribute hits to a tool call)."""
+        self._listeners.append(listener)
+
+    def ttl(self, resource_type: str) -> float:
+        """Return how many seconds a describe result of a resource type stays fresh."""
+        return self._ttls.get(resource_type, DEFAULT_TTL)
+
+    def _cache_for(self, resource_type: str) -> TTLCache:
+        # Caller must hold self._lock
+        cache = self._caches.get(resource_type)
+        if cache is None:
+            cache = TTLCache(maxsize=self._maxsize, ttl=self.ttl(resource_type))
+            self._caches[resource_type] = cache
+            self._stats[resource_type] = {"hits": 0, "misses": 0, "invalidations": 0}
+        return cache
+
+    def get(self, resource_type: str, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) for a key, counting the lookup as a hit or miss."""
+        with self._lock:
+            cache = self._cache_for(resource_type)
+            stats = self._stats[resource_type]
+            try:
+                value = cache[key]
+                found = True
+                stats["hits"] += 1
+            except KeyError:
+                value = None
+                found = False
+                stats["misses"] += 1
+        for listener in self._listeners:
+            listener(resource_type, found)
+        return found, value
+
+    def set(self, resource_type: str, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache_for(resource_type)[key] = value
+
+    def invalidate(self, resource_type: Optional[str] = None, region: Optional[str] = None) -> int:
+        """
+        Drop cached entries.
+
+        Args:
+        resource_type (Optional[str]): Only drop entries of this type. Defaults to all types.
+        region (Optional[str]): Only drop entries for this region. Defaults to all regions.
+
+        Returns:
+        int: The number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            types = [resource_type] if resource_type else list(self._caches)
+            for rtype in types:
+                cache = self._caches.get(rtype)
+                if cache is None:
+                    continue
+                keys = [key for key in list(cache.keys()) if region is None or key[1] == region]
+                for key in keys:
+                    cache.pop(key, None)
+                self._stats[rtype]["invalidations"] += len(keys)
+                removed += len(keys)
+        logger.info(f"Invalidated {removed} cached describe results")
+        return removed
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return hit/miss/size counters per resource type."""
+        with self._lock:
+            report = {}
+            for rtype, cache in self._caches.items():
+                counters = dict(self._stats[rtype])
+                lookups = counters["hits"] + counters["misses"]
+                counters["size"] = len(cache)
+                counters["ttl"] = cache.ttl
+                counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+                report[rtype] = counters
+            return report
+
+
+_default_cache = DescribeCache()
+
+
+def get_cache() -> DescribeCache:
+    """Return the process-wide describe cache."""
+    return _default_cache
+
+
+def invalidate_cache(resource_type: Optional[str] = None, region: Optional[str] = None) -> int:
+    """Drop entries from the process-wide describe cache. See DescribeCache.invalidate."""
+    return _default_cache.invalidate(resource_type, region)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return hit/miss counters for the process-wide describe cache."""
+    return _default_cache.stats()
+
+
+# Set while a force_refresh call runs, so lower layers (e.g., the inventory store) also skip stored data
+_refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar("force_refresh", default=False)
+
+
+def refresh_requested() -> bool:
+    """Return True inside a call made with force_refresh."""
+    return _refreshing.get()
+
+
+def freeze(value: Any) -> Hashable:
+    """Turn tool arguments into a hashable, order-independent cache key component."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def cached(resource_type: str) -> Callable:
+    """
+    Decorator that serves a describe tool function from the process-wide cache.
+
+    The wrapped function gains a force_refresh keyword argument that skips the
+    lookup and overwrites the cached entry with fresh data; refresh_requested()
+    reports it to the layers below while the function runs. The function must take
+    a region argument, which is part of the cache key along with the account ID,
+    the function name and every other argument.
+
+    Args:
+    resource_type (str): The resource type, used to pick the TTL (e.g., "subnets").
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, force_refresh: bool = False, **kwargs: Any) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            key = (get_account_id(), arguments.get("region"), func.__name__,
+                   freeze({k: v for k, v in arguments.items() if k != "region"}))
+
+            if not force_refresh:
+                found, value = _default_cache.get(resource_type, key)
+                if found:
+                    return value
+                value = func(*args, **kwargs)
+            else:
+                token = _refreshing.set(True)
+                try:
+                    value = func(*args, **kwargs)
+                finally:
+                    _refreshing.reset(token)
+            _default_cache.set(resource_type, key, value)
+            return value
+
+        wrapper.resource_type = resource_type
+        return wrapper
+    return decorator
+
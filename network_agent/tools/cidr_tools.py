@@ -0,0 +1,427 @@
+# tools/cidr_tools.py
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cache import CACHE_PROPERTIES
+from .regions import REGIONS_PROPERTIES, fan_out
+from .registry import REGION_PROPERTY, VPC_ID_PROPERTY, tool
+from .topology import get_snapshot
+
+
+# Cap on overlap pairs and free blocks listed in one tool result
+MAX_LISTED = 500
+
+_LOW_MASK = (1 << 64) - 1
+
+
+def _joint_ranks(*pairs: Tuple[np.ndarray, np.ndarray]) -> List[np.ndarray]:
+    """
+    Map (hi, lo) uint64 pair arrays to int64 ranks that preserve order across all of them.
+
+    IPv6 addresses do not fit a NumPy integer, so they are sorted with lexsort on
+    their two 64-bit halves and replaced by dense ranks; comparisons, searchsorted
+    and running maxima then work on the ranks exactly as they would on the values.
+    """
+    hi = np.concatenate([p[0] for p in pairs])
+    lo = np.concatenate([p[1] for p in pairs])
+    order = np.lexsort((lo, hi))
+    sorted_hi, sorted_lo = hi[order], lo[order]
+    new_value = np.ones(len(order), dtype=bool)
+    new_value[1:] = (sorted_hi[1:] != sorted_hi[:-1]) | (sorted_lo[1:] != sorted_lo[:-1])
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.cumsum(new_value) - 1
+    return np.split(ranks, np.cumsum([len(p[0]) for p in pairs])[:-1])
+
+
+class CidrBlocks:
+    """
+    A batch of same-family CIDR blocks held as NumPy arrays of range boundaries.
+
+    IPv4 blocks are stored as uint32 start/end arrays; IPv6 blocks as paired uint64
+    (high, low) halves. Every batch operation sorts once and then works with
+    vectorized comparisons and binary searches, so checking thousands of CIDRs
+    costs O(n log n) rather than the O(n^2) of comparing ipaddress objects pairwise.
+    Because CIDR blocks either nest or are disjoint, two blocks overlap exactly
+    when one contains the other.
+
+    Args:
+    version (int): 4 or 6.
+    starts (Sequence[int]): Network addresses as integers (host bits already cleared).
+    prefixlens (Sequence[int]): Prefix length per block.
+    labels (Optional[Sequence[str]]): Display label per block. Defaults to the CIDR.
+    """
+
+    def __init__(self, version: int, starts: Sequence[int], prefixlens: Sequence[int],
+                 labels: Optional[Sequence[str]] = None):
+        self.version = version
+        self.bits = 32 if version == 4 else 128
+        self.prefixlen = np.array(prefixlens, dtype=np.int64)
+        self._labels = list(labels) if labels is not None else None
+        if version == 4:
+            self.start = np.array(starts, dtype=np.uint32)
+            hostmask = (np.int64(1) << (32 - self.prefixlen)) - 1
+            self.end = (self.start.astype(np.int64) | hostmask).astype(np.uint32)
+        else:
+            ends = [start | ((1 << (128 - length)) - 1) for start, length in zip(starts, prefixlens)]
+            self.start = (np.array([s >> 64 for s in starts], dtype=np.uint64),
+                          np.array([s & _LOW_MASK for s in starts], dtype=np.uint64))
+            self.end = (np.array([e >> 64 for e in ends], dtype=np.uint64),
+                        np.array([e & _LOW_MASK for e in ends], dtype=np.uint64))
+
+    def __len__(self) -> int:
+        return len(self.prefixlen)
+
+    def cidr(self, index: int) -> str:
+        """Return the normalized CIDR string of one block."""
+        if self.version == 4:
+            address = ipaddress.IPv4Address(int(self.start[index]))
+        else:
+            address = ipaddress.IPv6Address((int(self.start[0][index]) << 64) | int(self.start[1][index]))
+        return f"{address}/{self.prefixlen[index]}"
+
+    def label(self, index: int) -> str:
+        return self._labels[index] if self._labels is not None else self.cidr(index)
+
+    def _keys(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Order-preserving int64 keys for start and end (shared scale)."""
+        if self.version == 4:
+            return self.start.astype(np.int64), self.end.astype(np.int64)
+        start, end = _joint_ranks(self.start, self.end)
+        return start, end
+
+    def _values(self, index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact start/end values for the selected blocks: int64 for IPv4, Python ints for IPv6."""
+        if self.version == 4:
+            return self.start[index].astype(np.int64), self.end[index].astype(np.int64)
+        start = np.array([(int(h) << 64) | int(lo) for h, lo in zip(self.start[0][index], self.start[1][index])],
+                         dtype=object)
+        end = np.array([(int(h) << 64) | int(lo) for h, lo in zip(self.end[0][index], self.end[1][index])],
+                       dtype=object)
+        return start, end
+
+    def _sorted(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Start ascending, then widest first, so a containing block precedes what it contains
+        start, end = self._keys()
+        order = np.lexsort((-end, start))
+        return order, start[order], end[order]
+
+    def overlaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return index arrays (outer, inner) of every overlapping pair, where outer contains inner.
+
+        Each block contains exactly the blocks sorted after it whose start is at or before
+        its end, so one searchsorted call finds every block's run of contained blocks.
+        """
+        order, start, end = self._sorted()
+        stop = np.searchsorted(start, end, side='right')
+        counts = stop - np.arange(len(order)) - 1
+        outer = np.repeat(np.arange(len(order)), counts)
+        # Position of each pair's inner block: outer + 1, outer + 2, ... within each run
+        run_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        inner = outer + 1 + run_offsets
+        return order[outer], order[inner]
+
+    def merged(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (starts, ends) of the union of all blocks as sorted, disjoint, non-adjacent ranges.
+
+        Values are int64 arrays for IPv4 and object arrays of Python ints for IPv6.
+        """
+        if not len(self):
+            empty = np.array([], dtype=np.int64 if self.version == 4 else object)
+            return empty, empty
+        order, start, end = self._sorted()
+        # A block is top-level unless an earlier block already reaches its start
+        reach = np.maximum.accumulate(end)
+        top = np.ones(len(order), dtype=bool)
+        top[1:] = start[1:] > reach[:-1]
+        starts, ends = self._values(order[top])
+        # Merge adjacent top-level blocks
+        new_range = np.ones(len(starts), dtype=bool)
+        new_range[1:] = starts[1:] != ends[:-1] + 1
+        first = np.flatnonzero(new_range)
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        return starts[first], ends[last]
+
+    def covered(self, other: "CidrBlocks") -> np.ndarray:
+        """Return a bool per block of other: True if it lies entirely inside the union of these blocks."""
+        starts, ends = self.merged()
+        if not len(starts) or not len(other):
+            return np.zeros(len(other), dtype=bool)
+        query_start, query_end = other._values(np.arange(len(other)))
+        index = np.searchsorted(starts, query_start, side='right') - 1
+        found = index >= 0
+        result = np.zeros(len(other), dtype=bool)
+        result[found] = ends[index[found]] >= query_end[found]
+        return result
+
+    def free_blocks(self, pool: Any, prefix_length: int, count: int) -> List[str]:
+        """
+        Find the first count aligned blocks of prefix_length inside pool that overlap none of these blocks.
+
+        Args:
+        pool (ipaddress._BaseNetwork): The address space to allocate from.
+        prefix_length (int): Size of the blocks to find (e.g., 24).
+        count (int): Maximum number of blocks to return.
+
+        Returns:
+        List[str]: Free CIDR blocks in address order.
+        """
+        size = 1 << (self.bits - prefix_length)
+        pool_start, pool_end = int(pool.network_address), int(pool.broadcast_address)
+        used_start, used_end = self.merged()
+        dtype = np.int64 if self.version == 4 else object
+        # Gaps between used ranges, clipped to the pool
+        gap_start = np.concatenate([np.array([pool_start], dtype=dtype), used_end + 1])
+        gap_end = np.concatenate([used_start - 1, np.array([pool_end], dtype=dtype)])
+        gap_start = np.maximum(gap_start, pool_start)
+        gap_end = np.minimum(gap_end, pool_end)
+        # First aligned block in each gap and how many aligned blocks fit
+        first = (gap_start + size - 1) // size * size
+        fits = np.where(first + size - 1 <= gap_end, (gap_end - first + 1) // size, 0)
+        # ip_network() would read an IPv6 address below 2**32 as IPv4, so pick the class from the version
+        network = ipaddress.IPv4Network if self.version == 4 else ipaddress.IPv6Network
+        blocks = []
+        for start, n in zip(first[fits > 0], fits[fits > 0]):
+            for i in range(min(int(n), count - len(blocks))):
+                blocks.append(str(network((int(start) + i * size, prefix_length))))
+            if len(blocks) >= count:
+                break
+        return blocks
+
+
+def _parse_ipv4(cidr: str) -> Optional[Tuple[int, int]]:
+    """Fast path for dotted-quad IPv4 CIDRs: (network address, prefix length), or None to fall back."""
+    address, slash, length = cidr.partition('/')
+    parts = address.split('.')
+    if len(parts) != 4 or not all(p.isdigit() for p in parts) or (slash and not length.isdigit()):
+        return None
+    prefixlen = int(length) if slash else 32
+    a, b, c, d = (int(p) for p in parts)
+    if a > 255 or b > 255 or c > 255 or d > 255 or prefixlen > 32:
+        return None
+    mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+    return ((a << 24) | (b << 16) | (c << 8) | d) & mask, prefixlen
+
+
+def parse_cidrs(cidrs: Iterable[str], labels: Optional[Iterable[str]] = None
+                ) -> Tuple[Dict[int, CidrBlocks], List[str]]:
+    """
+    Parse CIDR strings into one CidrBlocks batch per address family.
+
+    Host bits are ignored (10.0.0.1/16 is read as 10.0.0.0/16). Plain IPv4 CIDRs are
+    parsed by hand, which is several times faster than ipaddress for large batches.
+
+    Returns:
+    Tuple[Dict[int, CidrBlocks], List[str]]: Batches keyed by IP version, and the inputs that did not parse.
+    """
+    cidrs = list(cidrs)
+    labels = list(labels) if labels is not None else None
+    starts: Dict[int, List[int]] = {4: [], 6: []}
+    prefixlens: Dict[int, List[int]] = {4: [], 6: []}
+    family_labels: Dict[int, List[str]] = {4: [], 6: []}
+    invalid = []
+    for i, cidr in enumerate(cidrs):
+        cidr = cidr.strip()
+        parsed = _parse_ipv4(cidr)
+        if parsed is not None:
+            version = 4
+            start, prefixlen = parsed
+        else:
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError:
+                invalid.append(cidrs[i])
+                continue
+            version, start, prefixlen = network.version, int(network.network_address), network.prefixlen
+        starts[version].append(start)
+        prefixlens[version].append(prefixlen)
+        family_labels[version].append(labels[i] if labels is not None else None)
+    return {
+        v: CidrBlocks(v, starts[v], prefixlens[v], family_labels[v] if labels is not None else None)
+        for v in (4, 6) if starts[v]
+    }, invalid
+
+
+def describe_cidrs(cidrs: Iterable[str]) -> List[Dict[str, Any]]:
+    """Return network/broadcast address, size and netmask for many CIDRs at once."""
+    results = []
+    for cidr in cidrs:
+        try:
+            network = ipaddress.ip_network(cidr, strict=False)
+        except ValueError as e:
+            results.append({"cidr": cidr, "error": f"Invalid CIDR notation: {str(e)}"})
+            continue
+        results.append({
+            "cidr": cidr,
+            "network_address": str(network.network_address),
+            "broadcast_address": str(network.broadcast_address),
+            "num_addresses": network.num_addresses,
+            "netmask": str(network.netmask)
+        })
+    return results
+
+
+def region_cidrs(region: str = "us-west-2", include_subnets: bool = False,
+                 force_refresh: bool = False) -> Dict[str, Any]:
+    """Collect the IPv4 and IPv6 CIDR blocks of every VPC (and optionally subnet) in a region."""
+    snapshot = get_snapshot(region, (), force_refresh=force_refresh)
+    cidrs = []
+    for vpc_id, vpc in snapshot.by_type["vpcs"].items():
+        for assoc in vpc.get('CidrBlockAssociationSet', []):
+            if assoc.get('CidrBlockState', {}).get('State', 'associated') == 'associated':
+                cidrs.append({"cidr": assoc['CidrBlock'], "resource": vpc_id})
+        for assoc in vpc.get('Ipv6CidrBlockAssociationSet', []):
+            if assoc.get('Ipv6CidrBlockState', {}).get('State', 'associated') == 'associated':
+                cidrs.append({"cidr": assoc['Ipv6CidrBlock'], "resource": vpc_id})
+    if include_subnets:
+        for subnet_id, subnet in snapshot.by_type["subnets"].items():
+            if subnet.get('CidrBlock'):
+                cidrs.append({"cidr": subnet['CidrBlock'], "resource": subnet_id})
+            for assoc in subnet.get('Ipv6CidrBlockAssociationSet', []):
+                cidrs.append({"cidr": assoc['Ipv6CidrBlock'], "resource": subnet_id})
+    return {"cidrs": cidrs, "region": region}
+
+
+def _gather(region: str, regions: Optional[List[str]], force_refresh: bool
+            ) -> Tuple[List[str], List[str], Optional[Dict[str, Any]]]:
+    """Return (cidrs, labels, region status) for VPC CIDRs in one region or several."""
+    if regions:
+        results, status = fan_out(region_cidrs, regions, force_refresh=force_refresh)
+    else:
+        results, status = {region: region_cidrs(region, force_refresh=force_refresh)}, None
+    cidrs, labels = [], []
+    for result_region, result in results.items():
+        for item in result['cidrs']:
+            cidrs.append(item['cidr'])
+            labels.append(f"{item['resource']} ({result_region})")
+    return cidrs, labels, status
+
+
+@tool(name="find_cidr_overlaps",
+      description="Find overlapping CIDR blocks in a list of CIDRs, or across the VPCs of one or more regions "
+                  "(e.g., to check peering or transit gateway conflicts). Handles thousands of CIDRs at once.",
+      properties={
+          "cidrs": {"type": "array", "items": {"type": "string"},
+                    "description": "CIDR blocks to check. Omit to check the VPC CIDRs of region/regions."},
+          "region": REGION_PROPERTY,
+          **REGIONS_PROPERTIES,
+          **CACHE_PROPERTIES
+      })
+def find_cidr_overlaps(cidrs: Optional[List[str]] = None, region: str = "us-west-2",
+                       regions: Optional[List[str]] = None, force_refresh: bool = False) -> Dict[str, Any]:
+    status = None
+    labels = None
+    if cidrs is None:
+        cidrs, labels, status = _gather(region, regions, force_refresh)
+    batches, invalid = parse_cidrs(cidrs, labels)
+
+    overlaps = []
+    total = 0
+    for blocks in batches.values():
+        outer, inner = blocks.overlaps()
+        total += len(outer)
+        for i, j in zip(outer[:MAX_LISTED - len(overlaps)], inner[:MAX_LISTED - len(overlaps)]):
+            outer_cidr, inner_cidr = blocks.cidr(i), blocks.cidr(j)
+            overlap = {"cidr": outer_cidr, "overlaps": inner_cidr,
+                       "relation": "equal" if outer_cidr == inner_cidr else "contains"}
+            if labels is not None:
+                overlap.update(resource=blocks.label(i), overlaps_resource=blocks.label(j))
+            overlaps.append(overlap)
+    result = {"checked": len(cidrs), "overlap_count": total, "overlaps": overlaps}
+    if total > len(overlaps):
+        result["truncated"] = True
+    if invalid:
+        result["invalid"] = invalid
+    if status is not None:
+        result["regions"] = status
+    return result
+
+
+@tool(name="find_free_cidr_blocks",
+      description="Find unused CIDR blocks of a given size inside an address pool, e.g. a free /24 in "
+                  "10.0.0.0/8 not used by any VPC, or a free subnet range inside a VPC.",
+      properties={
+          "prefix_length": {"type": "integer", "minimum": 0, "maximum": 128,
+                            "description": "Size of the blocks to find (e.g., 24 for a /24)"},
+          "pool": {"type": "string", "description": "Address space to allocate from (e.g., 10.0.0.0/8). "
+                                                    "Defaults to the VPC's CIDR when vpc_id is given."},
+          "used": {"type": "array", "items": {"type": "string"},
+                   "description": "CIDRs already in use. Omit to use the VPC CIDRs of region/regions, "
+                                  "or the subnets of vpc_id."},
+          "vpc_id": {**VPC_ID_PROPERTY, "description": "Find free subnet ranges inside this VPC"},
+          "count": {"type": "integer", "minimum": 1, "description": "Number of free blocks to return (default 1)"},
+          "region": REGION_PROPERTY,
+          **REGIONS_PROPERTIES,
+          **CACHE_PROPERTIES
+      },
+      required=["prefix_length"])
+def find_free_cidr_blocks(prefix_length: int, pool: Optional[str] = None, used: Optional[List[str]] = None,
+                          vpc_id: Optional[str] = None, count: int = 1, region: str = "us-west-2",
+                          regions: Optional[List[str]] = None, force_refresh: bool = False) -> Dict[str, Any]:
+    status = None
+    if vpc_id:
+        snapshot = get_snapshot(region, (), force_refresh=force_refresh)
+        vpc = snapshot.by_type["vpcs"].get(vpc_id)
+        if vpc is None:
+            return {"error": f"VPC {vpc_id} not found in {region}"}
+        pool = pool or vpc['CidrBlock']
+        if used is None:
+            used = [s['CidrBlock'] for s in snapshot.resources_in_vpc(vpc_id, "subnets") if s.get('CidrBlock')]
+    if pool is None:
+        return {"error": "Provide pool or vpc_id"}
+    try:
+        pool_network = ipaddress.ip_network(pool, strict=False)
+    except ValueError as e:
+        return {"error": f"Invalid pool: {str(e)}"}
+    if not pool_network.prefixlen <= prefix_length <= pool_network.max_prefixlen:
+        return {"error": f"prefix_length must be between {pool_network.prefixlen} and {pool_network.max_prefixlen}"}
+    if used is None:
+        used, _, status = _gather(region, regions, force_refresh)
+
+    batches, invalid = parse_cidrs(used)
+    blocks = batches.get(pool_network.version) or CidrBlocks(pool_network.version, [], [])
+    free = blocks.free_blocks(pool_network, prefix_length, min(count, MAX_LISTED))
+    result = {"pool": str(pool_network), "prefix_length": prefix_length, "free_blocks": free}
+    if len(free) < count:
+        result["note"] = f"Only {len(free)} free /{prefix_length} blocks available in {pool_network}"
+    if invalid:
+        result["invalid"] = invalid
+    if status is not None:
+        result["regions"] = status
+    return result
+
+
+@tool(name="summarize_cidrs",
+      description="Merge a list of CIDR blocks into the smallest equivalent set of CIDRs (removing duplicates "
+                  "and contained blocks, joining adjacent ones) and report the total address count.",
+      properties={
+          "cidrs": {"type": "array", "items": {"type": "string"}, "description": "CIDR blocks to merge"},
+          "within": {"type": "array", "items": {"type": "string"},
+                     "description": "Optional allocated supernets; input CIDRs not fully inside them are "
+                                    "reported as outside"}
+      },
+      required=["cidrs"])
+def summarize_cidrs(cidrs: List[str], within: Optional[List[str]] = None) -> Dict[str, Any]:
+    batches, invalid = parse_cidrs(cidrs)
+    summary = []
+    total = 0
+    for version, blocks in batches.items():
+        starts, ends = blocks.merged()
+        make = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+        for start, end in zip(starts, ends):
+            total += int(end) - int(start) + 1
+            summary.extend(str(n) for n in ipaddress.summarize_address_range(make(int(start)), make(int(end))))
+    result = {"input_count": len(cidrs), "summary": summary, "total_addresses": total}
+    if within is not None:
+        allowed, _ = parse_cidrs(within)
+        outside = []
+        for version, blocks in batches.items():
+            supernets = allowed.get(version) or CidrBlocks(version, [], [])
+            outside.extend(blocks.cidr(i) for i in np.flatnonzero(~supernets.covered(blocks)))
+        result["outside"] = outside
+    if invalid:
+        result["invalid"] = invalid
+    return result
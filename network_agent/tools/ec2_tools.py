@@ -1,39 +1,70 @@
-import boto3
+from typing import Any, Dict, Iterator
 
+from .cache import CACHE_PROPERTIES, cached
+from .inventory import from_inventory
+from .pagination import DEFAULT_MAX_RESULTS, PAGING_PROPERTIES, ResourcePager, vpc_filter, with_next_token
+from .regions import REGIONS_PROPERTIES, fan_out, merge_region_items
+from .registry import REGION_PROPERTY, VPC_ID_PROPERTY, tool
+from .sg_index import format_ports
 
-def describe_instances(region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_instances()
-    instance_ids = []
-    for reservation in response["Reservations"]:
-        for instance in reservation["Instances"]:
-            instance_ids.append(instance["InstanceId"])
-    return {
-        "InstanceIds": instance_ids,
+
+def iter_instances(pager: ResourcePager) -> Iterator[Dict[str, Any]]:
+    """Flatten a describe_instances pager into a stream of instances."""
+    for reservation in pager:
+        yield from reservation["Instances"]
+
+
+@cached('instances')
+def describe_region_instances(region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    # describe_instances pages by reservation, so max_results bounds reservations
+    pager = ResourcePager(region, 'describe_instances', 'Reservations',
+                          max_results=max_results, next_token=next_token)
+    instances = from_inventory(pager, "instances")
+    if instances is pager:
+        instances = iter_instances(pager)
+    return with_next_token({
+        "Instances": [{"InstanceId": instance["InstanceId"]} for instance in instances],
         "region": region
-    }
+    }, pager)
+
+
+@tool(name="describe_instances",
+      description="List ec2 instances in a region, or in several regions at once",
+      properties={'region': REGION_PROPERTY, **REGIONS_PROPERTIES, **PAGING_PROPERTIES, **CACHE_PROPERTIES})
+def describe_instances(region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None, regions=None,
+                       force_refresh=False):
+    if regions:
+        # Fan out across regions; max_results applies per region
+        results, status = fan_out(describe_region_instances, regions, max_results=max_results,
+                                  force_refresh=force_refresh)
+        return {
+            "Instances": merge_region_items(results, "Instances"),
+            "regions": status
+        }
+    return describe_region_instances(region, max_results=max_results, next_token=next_token,
+                                     force_refresh=force_refresh)
 
 
 # Describe security groups in a region
-def describe_security_groups(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_security_groups(
-        Filters=[
-            {
-                'Name': 'vpc-id',
-                'Values': [vpc_id]
-            }
-        ]
-    )
+@tool(name="describe_security_groups",
+      description="Describe security groups in a specified VPC. To find specific rules (by port, protocol or "
+                  "source) across VPCs, use query_security_group_rules instead.",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('security_groups')
+def describe_security_groups(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_security_groups', 'SecurityGroups',
+                          max_results=max_results, next_token=next_token,
+                          Filters=vpc_filter(vpc_id))
     
     security_groups = []
-    for sg in response['SecurityGroups']:
+    for sg in from_inventory(pager, 'security_groups', vpc_id):
         inbound_rules = []
         outbound_rules = []
         
         # Format inbound rules
         for rule in sg['IpPermissions']:
-            port_range = f"{rule.get('FromPort', 'All')} - {rule.get('ToPort', 'All')}"
+            port_range = format_ports(rule.get('IpProtocol', '-1'), rule.get('FromPort', -1), rule.get('ToPort', -1))
             for ip_range in rule.get('IpRanges', []):
                 inbound_rules.append({
                     'Protocol': rule.get('IpProtocol', '-1'),
@@ -47,13 +78,13 @@ def describe_security_groups(vpc_id, region="us-west-2"):
                 inbound_rules.append({
                     'Protocol': rule.get('IpProtocol', '-1'),
                     'Ports': port_range,
-                    'Source': f"sg-{group.get('GroupId')}",
+                    'Source': group.get('GroupId'),
                     'Description': group.get('Description', '')
                 })
         
         # Format outbound rules
         for rule in sg['IpPermissionsEgress']:
-            port_range = f"{rule.get('FromPort', 'All')} - {rule.get('ToPort', 'All')}"
+            port_range = format_ports(rule.get('IpProtocol', '-1'), rule.get('FromPort', -1), rule.get('ToPort', -1))
             for ip_range in rule.get('IpRanges', []):
                 outbound_rules.append({
                     'Protocol': rule.get('IpProtocol', '-1'),
@@ -67,7 +98,7 @@ def describe_security_groups(vpc_id, region="us-west-2"):
                 outbound_rules.append({
                     'Protocol': rule.get('IpProtocol', '-1'),
                     'Ports': port_range,
-                    'Destination': f"sg-{group.get('GroupId')}",
+                    'Destination': group.get('GroupId'),
                     'Description': group.get('Description', '')
                 })
         
@@ -79,65 +110,8 @@ def describe_security_groups(vpc_id, region="us-west-2"):
             'OutboundRules': outbound_rules
         })
     
-    return security_groups
-
-
-
-ec2_tools = [
-    {
-        "toolSpec": {
-            "name": "describe_instances",
-            "description": "List ec2 instances in all a region",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": []
-                }
-            } 
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "describe_security_groups",
-            "description": "Describe security groups in a specified AWS region",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"},
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    }
-]
-
-
-def handle_ec2_tool(tool_use):
-    tool_name = tool_use['name']
-    input_data = tool_use['input']
-    
-    if tool_name == "describe_instances":
-        result = describe_instances(region=input_data.get('region', 'us-west-2'))
-    elif tool_name == "describe_security_groups":
-        result = describe_security_groups(region=input_data.get('region', 'us-west-2'))
-    else:
-        result = {"error": f"Unknown network tool: {tool_name}"}
-
-    return {
-        "role": "user",
-        "content": [
-            {
-                "toolResult": {
-                    "toolUseId": tool_use['toolUseId'],
-                    "content": [{"json": result}],
-                    "status": "success"
-                }
-            }
-        ]
-    }
+    return with_next_token({
+        'vpc_id': vpc_id,
+        'securityGroups': security_groups,
+        "region": region
+    }, pager)
@@ -0,0 +1,227 @@
+# tools/encoding.py
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .registry import tool
+
+logger = logging.getLogger(__name__)
+
+
+# Largest tool result, in bytes of JSON, sent to the model. Longer tables are cut short
+# and the rest is served by fetch_more_results. 0 disables the limit.
+MAX_RESULT_BYTES = int(os.environ.get("NW_TOOL_RESULT_MAX_BYTES", "24000"))
+# A list of at least this many dicts is sent as a table
+MIN_TABLE_ROWS = 2
+# Truncated tables kept for fetch_more_results per conversation, and for how long
+MAX_CONTINUATIONS = int(os.environ.get("NW_MAX_CONTINUATIONS", "32"))
+CONTINUATION_TTL_SECONDS = 900
+# Bytes kept free for the truncation metadata
+TRUNCATION_RESERVE = 256
+
+Path = Tuple[Any, ...]
+
+
+def _is_empty(value: Any) -> bool:
+    # Empty lists and dicts are kept: an empty list of NAT gateways or overlaps is an answer
+    return value is None or value == ""
+
+
+def compact(value: Any) -> Any:
+    """
+    Return a compact copy of a tool result.
+
+    Dict fields that are None or empty strings are dropped, and lists of dicts become
+    tables: {"columns": [...], "rows": [[...], ...]}, naming each key once instead of
+    once per row. Columns that are null in every row are dropped; a row that lacks a
+    column has null in its place.
+    """
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            item = compact(item)
+            if not _is_empty(item):
+                compacted[key] = item
+        return compacted
+    if isinstance(value, (list, tuple)):
+        items = [compact(item) for item in value]
+        if len(items) >= MIN_TABLE_ROWS and all(isinstance(item, dict) for item in items):
+            columns: Dict[str, None] = {}
+            for item in items:
+                columns.update(dict.fromkeys(item))
+            if columns:
+                return {"columns": list(columns), "rows": [[item.get(key) for key in columns] for item in items]}
+        return items
+    return value
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+
+def _lists(value: Any, path: Path = ()) -> List[Tuple[Path, List[Any]]]:
+    """Find every list in a compacted result, with its path."""
+    found = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            found.extend(_lists(item, path + (key,)))
+    elif isinstance(value, list):
+        found.append((path, value))
+        for index, item in enumerate(value):
+            found.extend(_lists(item, path + (index,)))
+    return found
+
+
+def _fit(rows: List[Any], budget: int) -> int:
+    """Return how many leading rows fit in budget bytes of JSON."""
+    used = 2
+    for count, row in enumerate(rows):
+        used += _size(row) + 1
+        if used > budget:
+            return count
+    return len(rows)
+
+
+def _parent(result: Any, path: Path) -> Any:
+    for key in path[:-1]:
+        result = result[key]
+    return result
+
+
+class ContinuationStore:
+    """
+    Holds the full rows of truncated tables so the model can page through them with
+    fetch_more_results. Bounded by count (least recently used first out) and age.
+    """
+
+    def __init__(self, maxsize: int = MAX_CONTINUATIONS, ttl: float = CONTINUATION_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Optional[List[str]], List[Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, columns: Optional[List[str]], rows: List[Any]) -> str:
+        handle = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._entries[handle] = (time.monotonic() + self.ttl, columns, rows)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> Optional[Tuple[Optional[List[str]], List[Any]]]:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[handle]
+                return None
+            self._entries.move_to_end(handle)
+            return entry[1], entry[2]
+
+
+# Used when no conversation has its own store (the Streamlit app and the CLI)
+_default_continuations = ContinuationStore()
+_current_continuations: contextvars.ContextVar[Optional[ContinuationStore]] = contextvars.ContextVar(
+    "continuations", default=None)
+
+
+def _continuations() -> ContinuationStore:
+    store = _current_continuations.get()
+    return _default_continuations if store is None else store
+
+
+@contextlib.contextmanager
+def continuation_scope(store: ContinuationStore) -> Iterator[ContinuationStore]:
+    """
+    Keep the continuations of truncated results in store while the block runs, so each
+    conversation pages through its own results and cannot evict another's. Tool calls
+    made from the block see the store, including those run on worker threads.
+    """
+    token = _current_continuations.set(store)
+    try:
+        yield store
+    finally:
+        _current_continuations.reset(token)
+
+
+def encode_result(result: Any, max_bytes: int = MAX_RESULT_BYTES) -> Any:
+    """
+    Compact a tool result and cut it down to max_bytes of JSON.
+
+    While the result is too big, the largest list in it is cut to the rows that fit and
+    its full rows are kept for fetch_more_results. Each cut is described under
+    "truncated" with the list's path, the rows returned and in total, and the
+    continuation handle and next_offset to pass to fetch_more_results.
+
+    Args:
+    result (Any): The tool result.
+    max_bytes (int): Byte budget for the JSON encoding. 0 disables truncation.
+    """
+    compacted = compact(result)
+    if not max_bytes or _size(compacted) <= max_bytes:
+        return compacted
+    if not isinstance(compacted, dict):
+        compacted = {"result": compacted}
+
+    truncated: List[Dict[str, Any]] = []
+    cut: set = set()
+    while _size(compacted) + len(truncated) * TRUNCATION_RESERVE > max_bytes:
+        candidates = [(path, rows) for path, rows in _lists(compacted) if path not in cut and len(rows) > 1]
+        if not candidates:
+            logger.warning(f"Tool result is {_size(compacted)} bytes and cannot be cut below {max_bytes}")
+            break
+        path, rows = max(candidates, key=lambda candidate: _size(candidate[1]))
+        others = _size(compacted) - _size(rows) + (len(truncated) + 1) * TRUNCATION_RESERVE
+        keep = _fit(rows, max_bytes - others)
+        parent = _parent(compacted, path)
+        columns = parent.get("columns") if isinstance(parent, dict) and path[-1] == "rows" else None
+        handle = _continuations().put(columns, rows)
+        parent[path[-1]] = rows[:keep]
+        cut.add(path)
+        truncated.append({
+            "path": "/".join(str(key) for key in path),
+            "returned": keep,
+            "total": len(rows),
+            "continuation": handle,
+            "next_offset": keep,
+        })
+    compacted["truncated"] = truncated
+    return compacted
+
+
+def encode_middleware(tool_: Any, arguments: Dict[str, Any], call_next: Callable[[Dict[str, Any]], Any]) -> Any:
+    """Registry middleware that sends every tool result through encode_result()."""
+    return encode_result(call_next(arguments))
+
+
+@tool(name="fetch_more_results",
+      description="Fetch more rows of a tool result that was cut short. Pass the continuation listed under "
+                  "'truncated' in that result, and its next_offset as offset.",
+      properties={
+          'continuation': {"type": "string", "description": "Continuation handle from a truncated result"},
+          'offset': {"type": "integer", "minimum": 0,
+                     "description": "Index of the first row to return: the next_offset of the truncated result"},
+      },
+      required=['continuation', 'offset'])
+def fetch_more_results(continuation, offset):
+    entry = _continuations().get(continuation)
+    if entry is None:
+        return {"error": f"Unknown or expired continuation: {continuation}. Call the original tool again."}
+    columns, rows = entry
+    page: Dict[str, Any] = {"columns": columns} if columns else {}
+    remaining = rows[offset:]
+    budget = MAX_RESULT_BYTES - _size(page) - TRUNCATION_RESERVE if MAX_RESULT_BYTES else 0
+    # Always return at least one row so paging makes progress
+    keep = max(1, _fit(remaining, budget)) if budget else len(remaining)
+    page.update({"rows": remaining[:keep], "offset": offset, "total": len(rows)})
+    if offset + keep < len(rows):
+        page.update({"continuation": continuation, "next_offset": offset + keep})
+    return page
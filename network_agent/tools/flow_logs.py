@@ -0,0 +1,543 @@
+# tools/flow_logs.py
+import glob
+import gzip
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from aws_clients import get_client
+
+from .registry import REGION_PROPERTY, tool
+
+logger = logging.getLogger(__name__)
+
+
+# Default (version 2) flow log format
+DEFAULT_FIELDS = ["version", "account-id", "interface-id", "srcaddr", "dstaddr", "srcport", "dstport",
+                  "protocol", "packets", "bytes", "start", "end", "action", "log-status"]
+# Custom LogFormat used by infra/infrastructure.yaml
+INFRA_FIELDS = DEFAULT_FIELDS + ["vpc-id", "subnet-id", "instance-id", "tcp-flags", "type", "pkt-srcaddr",
+                                 "pkt-dstaddr", "region", "az-id", "sublocation-type", "sublocation-id"]
+# Numeric fields; everything else is read as a string
+FIELD_TYPES = {
+    "version": pa.int32(), "srcport": pa.int32(), "dstport": pa.int32(), "protocol": pa.int32(),
+    "packets": pa.int64(), "bytes": pa.int64(), "start": pa.int64(), "end": pa.int64(),
+    "tcp-flags": pa.int32(), "traffic-path": pa.int32(),
+}
+# Fields the analyses read; others are skipped by the parser
+ANALYSIS_FIELDS = ["interface-id", "srcaddr", "dstaddr", "dstport", "protocol", "packets", "bytes", "start", "end",
+                   "action", "vpc-id"]
+
+ANALYSES = ("top_talkers", "rejected", "eni_bytes")
+DEFAULT_TOP_N = 10
+
+# Bytes of decompressed text parsed per batch; bounds memory per file being read
+BLOCK_SIZE = int(os.environ.get("NW_FLOW_LOG_BLOCK_SIZE", str(8 * 1024 * 1024)))
+# Processes used to parse files in parallel (1 parses in the calling process)
+MAX_WORKERS = int(os.environ.get("NW_FLOW_LOG_WORKERS", str(os.cpu_count() or 1)))
+# Files queued or being parsed at once, per worker process; bounds the results waiting to be merged
+IN_FLIGHT_PER_WORKER = 2
+# Default flow log location (a local path, glob, or s3://bucket/prefix); the tool only reads under it
+DEFAULT_LOCATION = os.environ.get("NW_FLOW_LOG_LOCATION")
+# Partial aggregates kept before they are folded together
+COMPACT_EVERY = 16
+
+# S3 flow log keys embed the delivery date: .../vpcflowlogs/<region>/YYYY/MM/DD/...
+_DATE_PATH = re.compile(r"/(\d{4})/(\d{2})/(\d{2})/")
+
+
+class _ReadableStream(io.RawIOBase):
+    """Adapts any object with read(n) (e.g., a botocore StreamingBody) to a raw stream for buffering."""
+
+    def __init__(self, body: Any):
+        self._body = body
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self._body.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        close = getattr(self._body, "close", None)
+        if close:
+            close()
+        super().close()
+
+
+class LocalSource:
+    """
+    Flow log files on the local filesystem: a file, a directory (searched recursively) or a glob.
+
+    Args:
+    path (str): The file, directory or glob pattern.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def list(self) -> List[str]:
+        if os.path.isdir(self.path):
+            names = []
+            for root, _, files in os.walk(self.path):
+                names.extend(os.path.join(root, f) for f in files if not f.startswith("."))
+            return sorted(names)
+        if glob.has_magic(self.path):
+            return sorted(p for p in glob.glob(self.path, recursive=True) if os.path.isfile(p))
+        return [self.path]
+
+    def open(self, name: str) -> BinaryIO:
+        return open(name, "rb")
+
+    def __repr__(self) -> str:
+        return f"LocalSource({self.path!r})"
+
+
+class S3Source:
+    """
+    Flow log objects under an S3 prefix, streamed with GetObject rather than downloaded.
+
+    Only bucket, prefix and region are stored, so the source can be pickled to worker
+    processes, each of which uses its own pooled S3 client.
+
+    Args:
+    bucket (str): The bucket name.
+    prefix (str): Key prefix to list (e.g., "vpc-flow-logs/AWSLogs/").
+    region (str): The bucket's region.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", region: str = "us-west-2"):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.region = region
+
+    def list(self) -> List[str]:
+        paginator = get_client("s3", self.region).get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if not obj['Key'].endswith("/"))
+        return keys
+
+    def open(self, name: str) -> BinaryIO:
+        body = get_client("s3", self.region).get_object(Bucket=self.bucket, Key=name)['Body']
+        return io.BufferedReader(_ReadableStream(body), buffer_size=1024 * 1024)
+
+    def __repr__(self) -> str:
+        return f"S3Source(s3://{self.bucket}/{self.prefix})"
+
+
+FlowLogSource = Union[LocalSource, S3Source]
+
+
+def open_source(location: str, region: str = "us-west-2") -> FlowLogSource:
+    """Return the source for a location: "s3://bucket/prefix" or a local path/glob."""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://"):].partition("/")
+        return S3Source(bucket, prefix, region)
+    return LocalSource(os.path.expanduser(location))
+
+
+def _local_base(path: str) -> str:
+    # The resolved directory or file a local path or glob is rooted at
+    parts = os.path.expanduser(path).split(os.sep)
+    for i, part in enumerate(parts):
+        if glob.has_magic(part):
+            parts = parts[:i]
+            break
+    return os.path.realpath(os.sep.join(parts) or ".")
+
+
+def _is_within(path: str, base: str) -> bool:
+    return path == base or os.path.commonpath([path, base]) == base
+
+
+def within_root(location: str, root: str) -> bool:
+    """
+    Return whether a location lies under a root location: the same bucket and a prefix
+    under the root's for S3, or a path that resolves under the root's directory locally.
+    """
+    if root.startswith("s3://") or location.startswith("s3://"):
+        if not (root.startswith("s3://") and location.startswith("s3://")):
+            return False
+        return (location.rstrip("/") + "/").startswith(root.rstrip("/") + "/")
+    return _is_within(_local_base(location), _local_base(root))
+
+
+def parse_time(value: Union[str, int, float, None]) -> Optional[int]:
+    """Convert an ISO 8601 timestamp or epoch seconds to epoch seconds (naive times are UTC)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def in_time_window(name: str, start_time: Optional[int], end_time: Optional[int]) -> bool:
+    """Skip files whose dated key path falls entirely outside the window; undated names are kept."""
+    match = _DATE_PATH.search(name.replace(os.sep, "/"))
+    if not match or (start_time is None and end_time is None):
+        return True
+    day_start = int(datetime(*map(int, match.groups()), tzinfo=timezone.utc).timestamp())
+    # Records can be delivered a little after their window closes
+    return (start_time is None or day_start + 86400 + 3600 > start_time) and \
+        (end_time is None or day_start <= end_time)
+
+
+def _open_decompressed(source: FlowLogSource, name: str) -> BinaryIO:
+    stream = source.open(name)
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    return stream
+
+
+def _column_names(first_line: bytes) -> Optional[List[str]]:
+    """Return None if the first line is a header, otherwise the field names to assume."""
+    tokens = first_line.decode("utf-8", "replace").split()
+    if tokens and all(token[0].isalpha() for token in tokens):
+        return None
+    if len(tokens) == len(INFRA_FIELDS):
+        return INFRA_FIELDS
+    if len(tokens) == len(DEFAULT_FIELDS):
+        return DEFAULT_FIELDS
+    raise ValueError(f"Cannot infer the flow log format of a headerless file with {len(tokens)} fields")
+
+
+def read_batches(source: FlowLogSource, name: str, fields: Optional[Sequence[str]] = ANALYSIS_FIELDS,
+                 block_size: int = BLOCK_SIZE) -> Iterator[pa.RecordBatch]:
+    """
+    Stream one flow log file (plain or gzip) as Arrow record batches.
+
+    The file is decompressed and parsed block by block, so memory stays bounded by
+    block_size regardless of file size. The header line, when present, decides the
+    column layout, so files in any custom LogFormat parse correctly. Column names
+    have dashes replaced with underscores (interface-id -> interface_id), and "-"
+    placeholders (e.g., in NODATA records) become nulls.
+
+    Args:
+    source (FlowLogSource): Where the file lives.
+    name (str): The path or key returned by source.list().
+    fields (Optional[Sequence[str]]): Fields to parse; others are skipped. None parses all of them.
+    block_size (int): Bytes of text per batch.
+
+    Yields:
+    pa.RecordBatch: Parsed rows.
+    """
+    with _open_decompressed(source, name) as stream:
+        first_line = stream.peek(65536).split(b"\n", 1)[0]
+        if not first_line.strip():
+            return
+        names = _column_names(first_line)
+        present = names or first_line.decode("utf-8").split()
+        include = [f for f in fields if f in present] if fields is not None else present
+        reader = pa_csv.open_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(block_size=block_size, column_names=names),
+            parse_options=pa_csv.ParseOptions(delimiter=" "),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=include,
+                column_types={f: t for f, t in FIELD_TYPES.items() if f in include},
+                null_values=["-"],
+                strings_can_be_null=True,
+            ),
+        )
+        for batch in reader:
+            yield batch.rename_columns([n.replace("-", "_") for n in batch.schema.names])
+
+
+def aggregate_flows(table: pa.Table, keys: List[str], sums: List[str], count: bool) -> pa.Table:
+    """Group a flow table by keys, summing columns (and counting rows into "flows" when count is set)."""
+    aggregations = [(column, "sum") for column in sums]
+    if count:
+        aggregations.append(([], "count_all"))
+    grouped = table.group_by(keys, use_threads=False).aggregate(aggregations)
+    rename = {f"{column}_sum": column for column in sums}
+    rename["count_all"] = "flows"
+    return grouped.rename_columns([rename.get(n, n) for n in grouped.schema.names])
+
+
+# analysis -> (group keys, summed columns)
+_GROUPINGS = {
+    "top_talkers": (["srcaddr", "dstaddr"], ["bytes", "packets"]),
+    "rejected": (["srcaddr", "dstaddr", "dstport", "protocol"], ["packets"]),
+    "eni_bytes": (["interface_id", "action"], ["bytes", "packets"]),
+}
+
+
+class FlowLogAggregator:
+    """
+    Mergeable per-analysis aggregates over flow log batches.
+
+    Each batch is reduced to small grouped tables as soon as it is parsed; partial
+    tables are folded together every few batches and when aggregators from worker
+    processes are merged, so memory grows with the number of distinct keys (address
+    pairs, ENIs), not with the number of records.
+
+    Args:
+    analyses (Sequence[str]): Which of ANALYSES to compute.
+    start_time (Optional[int]): Only flows ending at or after this epoch second.
+    end_time (Optional[int]): Only flows starting at or before this epoch second.
+    interface_id (Optional[str]): Only flows of this ENI.
+    vpc_id (Optional[str]): Only flows of this VPC (needs vpc-id in the log format).
+    """
+
+    def __init__(self, analyses: Sequence[str] = ANALYSES, start_time: Optional[int] = None,
+                 end_time: Optional[int] = None, interface_id: Optional[str] = None, vpc_id: Optional[str] = None):
+        unknown = set(analyses) - set(ANALYSES)
+        if unknown:
+            raise ValueError(f"Unknown analyses: {', '.join(sorted(unknown))}")
+        self.analyses = list(analyses)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.interface_id = interface_id
+        self.vpc_id = vpc_id
+        self.files = 0
+        self.records = 0
+        self.matched = 0
+        self.partials: Dict[str, List[pa.Table]] = {analysis: [] for analysis in self.analyses}
+
+    def _filter(self, table: pa.Table) -> pa.Table:
+        mask = pc.is_valid(table["bytes"])
+        if self.start_time is not None:
+            mask = pc.and_(mask, pc.greater_equal(table["end"], self.start_time))
+        if self.end_time is not None:
+            mask = pc.and_(mask, pc.less_equal(table["start"], self.end_time))
+        if self.interface_id:
+            mask = pc.and_(mask, pc.equal(table["interface_id"], self.interface_id))
+        if self.vpc_id:
+            if "vpc_id" not in table.column_names:
+                raise ValueError("vpc_id filtering needs vpc-id in the flow log format")
+            mask = pc.and_(mask, pc.equal(table["vpc_id"], self.vpc_id))
+        return table.filter(mask)
+
+    def add(self, batch: pa.RecordBatch) -> None:
+        """Fold one parsed batch into the aggregates."""
+        self.records += batch.num_rows
+        table = self._filter(pa.Table.from_batches([batch]))
+        self.matched += table.num_rows
+        if not table.num_rows:
+            return
+        for analysis in self.analyses:
+            keys, sums = _GROUPINGS[analysis]
+            source = table.filter(pc.equal(table["action"], "REJECT")) if analysis == "rejected" else table
+            if source.num_rows:
+                self.partials[analysis].append(
+                    aggregate_flows(source.select(keys + sums), keys, sums, count=True))
+        self._compact(COMPACT_EVERY)
+
+    def _compact(self, threshold: int) -> None:
+        for analysis, partials in self.partials.items():
+            if len(partials) > threshold:
+                keys, sums = _GROUPINGS[analysis]
+                self.partials[analysis] = [
+                    aggregate_flows(pa.concat_tables(partials), keys, sums + ["flows"], count=False)]
+
+    def merge(self, other: "FlowLogAggregator") -> None:
+        """Fold another aggregator (e.g., from a worker process) into this one."""
+        self.files += other.files
+        self.records += other.records
+        self.matched += other.matched
+        for analysis in self.analyses:
+            self.partials[analysis].extend(other.partials.get(analysis, []))
+        self._compact(COMPACT_EVERY)
+
+    def table(self, analysis: str) -> Optional[pa.Table]:
+        """Return the fully merged aggregate table of one analysis, or None if nothing matched."""
+        self._compact(1)
+        partials = self.partials.get(analysis)
+        return partials[0] if partials else None
+
+    def result(self, top_n: int = DEFAULT_TOP_N) -> Dict[str, Any]:
+        """Return the analyses as JSON-ready dictionaries, keeping the top_n entries of each ranking."""
+        result: Dict[str, Any] = {"files": self.files, "records": self.records, "matched_records": self.matched}
+        for analysis in self.analyses:
+            table = self.table(analysis)
+            if analysis == "top_talkers":
+                result[analysis] = _top(table, "bytes", top_n)
+            elif analysis == "rejected":
+                result[analysis] = _rejected_summary(table, top_n)
+            else:
+                result[analysis] = _eni_summary(table, top_n)
+        return result
+
+
+def _top(table: Optional[pa.Table], column: str, top_n: int) -> List[Dict[str, Any]]:
+    if table is None:
+        return []
+    return table.sort_by([(column, "descending")]).slice(0, top_n).to_pylist()
+
+
+def _rejected_summary(table: Optional[pa.Table], top_n: int) -> Dict[str, Any]:
+    if table is None:
+        return {"flows": 0, "packets": 0, "top_flows": [], "top_sources": [], "top_ports": []}
+    by_source = aggregate_flows(table, ["srcaddr"], ["flows", "packets"], count=False)
+    by_port = aggregate_flows(table, ["dstport", "protocol"], ["flows", "packets"], count=False)
+    return {
+        "flows": pc.sum(table["flows"]).as_py(),
+        "packets": pc.sum(table["packets"]).as_py(),
+        "top_flows": _top(table, "flows", top_n),
+        "top_sources": _top(by_source, "flows", top_n),
+        "top_ports": _top(by_port, "flows", top_n),
+    }
+
+
+def _eni_summary(table: Optional[pa.Table], top_n: int) -> List[Dict[str, Any]]:
+    if table is None:
+        return []
+    enis: Dict[str, Dict[str, Any]] = {}
+    for row in table.to_pylist():
+        eni = enis.setdefault(row["interface_id"], {"interface_id": row["interface_id"], "bytes": 0, "packets": 0,
+                                                    "flows": 0, "accepted_bytes": 0, "rejected_bytes": 0})
+        eni["bytes"] += row["bytes"]
+        eni["packets"] += row["packets"]
+        eni["flows"] += row["flows"]
+        if row["action"] in ("ACCEPT", "REJECT"):
+            eni[f"{row['action'].lower()}ed_bytes"] += row["bytes"]
+    return sorted(enis.values(), key=lambda eni: eni["bytes"], reverse=True)[:top_n]
+
+
+def analyze_file(source: FlowLogSource, name: str, analyses: Sequence[str] = ANALYSES,
+                 **filters: Any) -> FlowLogAggregator:
+    """Parse and aggregate one file. Runs in worker processes, so it only takes picklable arguments."""
+    aggregator = FlowLogAggregator(analyses, **filters)
+    for batch in read_batches(source, name):
+        aggregator.add(batch)
+    aggregator.files = 1
+    return aggregator
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _worker_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool that parses flow log files, started on first use and kept
+    for the life of the process. Workers are spawned rather than forked, so none inherits
+    the caller's threads or its pooled AWS connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def analyze(source: FlowLogSource, analyses: Sequence[str] = ANALYSES, start_time: Optional[int] = None,
+            end_time: Optional[int] = None, interface_id: Optional[str] = None, vpc_id: Optional[str] = None,
+            max_workers: int = MAX_WORKERS, names: Optional[Iterable[str]] = None) -> FlowLogAggregator:
+    """
+    Run the analyses over every file in a source.
+
+    Files are parsed in parallel worker processes (one file per task), each of which
+    streams its file and returns only its aggregates. At most IN_FLIGHT_PER_WORKER
+    files per worker are submitted at a time, and results are merged as they finish.
+    Files whose dated S3-style path lies outside the time window are not read at all.
+
+    Args:
+    source (FlowLogSource): Where the files live.
+    analyses (Sequence[str]): Which of ANALYSES to compute.
+    start_time (Optional[int]): Epoch seconds; earlier flows are ignored.
+    end_time (Optional[int]): Epoch seconds; later flows are ignored.
+    interface_id (Optional[str]): Only flows of this ENI.
+    vpc_id (Optional[str]): Only flows of this VPC.
+    max_workers (int): 1 parses in the calling process; otherwise files go to the shared
+        pool of MAX_WORKERS worker processes.
+    names (Optional[Iterable[str]]): Files to read instead of listing the source.
+
+    Returns:
+    FlowLogAggregator: The merged aggregates.
+    """
+    started = time.perf_counter()
+    filters = {"start_time": start_time, "end_time": end_time, "interface_id": interface_id, "vpc_id": vpc_id}
+    names = [n for n in (names if names is not None else source.list()) if in_time_window(n, start_time, end_time)]
+    total = FlowLogAggregator(analyses, **filters)
+    if max_workers > 1 and len(names) > 1:
+        pool = _worker_pool()
+        pending: "set[Future[FlowLogAggregator]]" = set()
+        try:
+            for name in names:
+                if len(pending) >= IN_FLIGHT_PER_WORKER * MAX_WORKERS:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        total.merge(future.result())
+                pending.add(pool.submit(analyze_file, source, name, analyses, **filters))
+            for future in as_completed(pending):
+                total.merge(future.result())
+        except BrokenProcessPool:
+            # A worker died (e.g., out of memory); start a fresh pool next time
+            _discard_pool(pool)
+            raise
+        finally:
+            # After a failure, files not yet started are not parsed for nothing
+            for future in pending:
+                future.cancel()
+    else:
+        for name in names:
+            total.merge(analyze_file(source, name, analyses, **filters))
+    logger.info(f"Analyzed {total.records} flow log records in {len(names)} files from {source} "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return total
+
+
+@tool(name="analyze_flow_logs",
+      description="Analyze VPC Flow Logs from a local path or S3 location: top talkers by bytes, a summary of "
+                  "rejected traffic (top flows, sources and ports) and per-ENI byte counts, optionally limited "
+                  "to a time window, an ENI or a VPC.",
+      properties={
+          "location": {"type": "string",
+                       "description": "Local file, directory or glob, or s3://bucket/prefix, under the "
+                                      "configured flow log location. Defaults to that location."},
+          "analyses": {"type": "array", "items": {"type": "string", "enum": list(ANALYSES)},
+                       "description": "Analyses to run (default all)"},
+          "start_time": {"type": "string", "description": "Window start, ISO 8601 (e.g., 2024-05-01T00:00:00Z)"},
+          "end_time": {"type": "string", "description": "Window end, ISO 8601"},
+          "interface_id": {"type": "string", "description": "Only flows of this ENI"},
+          "vpc_id": {"type": "string", "description": "Only flows of this VPC"},
+          "top_n": {"type": "integer", "minimum": 1, "description": f"Entries per ranking (default {DEFAULT_TOP_N})"},
+          "region": {**REGION_PROPERTY, "description": "Region of the S3 bucket (e.g., us-west-2)"}
+      })
+def analyze_flow_logs(location: Optional[str] = None, analyses: Optional[List[str]] = None,
+                      start_time: Optional[str] = None, end_time: Optional[str] = None,
+                      interface_id: Optional[str] = None, vpc_id: Optional[str] = None,
+                      top_n: int = DEFAULT_TOP_N, region: str = "us-west-2") -> Dict[str, Any]:
+    if not DEFAULT_LOCATION:
+        return {"error": "NW_FLOW_LOG_LOCATION is not set, so no flow logs can be read"}
+    location = location or DEFAULT_LOCATION
+    if not within_root(location, DEFAULT_LOCATION):
+        return {"error": f"Location {location} is outside the configured flow log location {DEFAULT_LOCATION}"}
+    source = open_source(location, region)
+    names = source.list()
+    if isinstance(source, LocalSource):
+        # Symlinks or ".." after a glob character can still lead out of the root
+        base = _local_base(DEFAULT_LOCATION)
+        names = [name for name in names if _is_within(os.path.realpath(name), base)]
+    aggregator = analyze(source, analyses or ANALYSES, parse_time(start_time), parse_time(end_time),
+                         interface_id, vpc_id, names=names)
+    return {"location": location, **aggregator.result(top_n)}
@@ -0,0 +1,343 @@
+# tools/flow_store.py
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .flow_logs import FIELD_TYPES, FlowLogSource, aggregate_flows, parse_time, read_batches
+from .reachability import normalize_protocol
+from .registry import tool
+
+logger = logging.getLogger(__name__)
+
+
+# Default store location
+DEFAULT_STORE = os.path.expanduser(os.environ.get("NW_FLOW_STORE", "~/.network_whisperer/flow_store"))
+MANIFEST_NAME = "_manifest.json"
+
+# Fields kept in the store (flow log names); absent fields are stored as nulls
+STORE_FIELDS = ["account-id", "interface-id", "srcaddr", "dstaddr", "srcport", "dstport", "protocol", "packets",
+                "bytes", "start", "end", "action", "log-status", "subnet-id", "instance-id", "tcp-flags", "vpc-id"]
+# Directory partitions, derived from each record's start time and VPC
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("hour", pa.int8()), ("vpc_id", pa.string())]),
+                               flavor="hive")
+STORE_SCHEMA = pa.schema(
+    [(f.replace("-", "_"), FIELD_TYPES.get(f, pa.string())) for f in STORE_FIELDS if f != "vpc-id"]
+    + list(PARTITIONING.schema)
+)
+# Records without a vpc-id field are filed under this partition
+UNKNOWN_VPC = "unknown"
+
+# Rows per Parquet row group; the unit min/max statistics prune at
+ROW_GROUP_SIZE = 64 * 1024
+# Rows sorted and handed to the writer at a time while ingesting
+WRITE_CHUNK_ROWS = 1024 * 1024
+# Records can be logged up to an aggregation interval (at most 10 minutes) after they start
+PARTITION_SLACK = 3600
+# Partial aggregates kept before they are folded together
+COMPACT_EVERY = 16
+
+# group_by -> (group keys, summed columns)
+GROUPINGS = {
+    "talkers": (["srcaddr", "dstaddr"], ["bytes", "packets"]),
+    "dstport": (["dstport", "protocol"], ["bytes", "packets"]),
+    "interface": (["interface_id", "action"], ["bytes", "packets"]),
+    "srcaddr": (["srcaddr"], ["bytes", "packets"]),
+    "dstaddr": (["dstaddr"], ["bytes", "packets"]),
+}
+RECORD_COLUMNS = ["start", "end", "interface_id", "srcaddr", "dstaddr", "srcport", "dstport", "protocol", "packets",
+                  "bytes", "action", "vpc_id"]
+DEFAULT_LIMIT = 50
+
+
+def _source_uri(source: FlowLogSource, name: str) -> str:
+    bucket = getattr(source, "bucket", None)
+    return f"s3://{bucket}/{name}" if bucket else os.path.abspath(name)
+
+
+def load_manifest(store: str = DEFAULT_STORE) -> Dict[str, Any]:
+    """Return the store's record of ingested files ({"files": {uri: {...}}})."""
+    try:
+        with open(os.path.join(store, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+
+def _save_manifest(store: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(store, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _conform(batch: pa.RecordBatch) -> pa.Table:
+    """Cast a parsed batch to STORE_SCHEMA, adding the partition columns."""
+    table = pa.Table.from_batches([batch])
+    table = table.filter(pc.is_valid(table["start"])) if "start" in table.column_names else table.slice(0, 0)
+    columns = {}
+    for field in STORE_SCHEMA:
+        if field.name in table.column_names:
+            columns[field.name] = table[field.name].cast(field.type)
+        else:
+            columns[field.name] = pa.nulls(table.num_rows, field.type)
+    started = table["start"].cast(pa.timestamp("s")) if table.num_rows else pa.array([], pa.timestamp("s"))
+    columns["date"] = pc.strftime(started, format="%Y-%m-%d")
+    columns["hour"] = pc.hour(started).cast(pa.int8())
+    columns["vpc_id"] = pc.fill_null(columns["vpc_id"], UNKNOWN_VPC)
+    return pa.table(columns, schema=STORE_SCHEMA)
+
+
+def _sorted_chunks(source: FlowLogSource, names: Sequence[str], ingested: Dict[str, Dict[str, Any]],
+                   chunk_rows: int) -> Iterator[pa.RecordBatch]:
+    """
+    Parse files and yield batches sorted by partition, ENI and start time.
+
+    Sorting each chunk before it is written keeps every partition's rows clustered by
+    ENI and time, so row-group statistics on interface_id and start stay narrow.
+    """
+    pending: List[pa.Table] = []
+    rows = 0
+
+    def flush() -> Iterator[pa.RecordBatch]:
+        table = pa.concat_tables(pending).sort_by(
+            [("date", "ascending"), ("hour", "ascending"), ("vpc_id", "ascending"),
+             ("interface_id", "ascending"), ("start", "ascending")])
+        pending.clear()
+        yield from table.to_batches(max_chunksize=ROW_GROUP_SIZE)
+
+    for name in names:
+        count = 0
+        for batch in read_batches(source, name, fields=STORE_FIELDS):
+            table = _conform(batch)
+            count += table.num_rows
+            pending.append(table)
+            rows += table.num_rows
+            if rows >= chunk_rows:
+                yield from flush()
+                rows = 0
+        ingested[_source_uri(source, name)] = {"records": count, "ingested_at": int(time.time())}
+    if pending:
+        yield from flush()
+
+
+def ingest(source: FlowLogSource, store: str = DEFAULT_STORE, force: bool = False,
+           chunk_rows: int = WRITE_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Convert raw flow log files into the Parquet store.
+
+    Records are written as a hive-partitioned dataset (date=YYYY-MM-DD/hour=H/vpc_id=...)
+    with row groups of ROW_GROUP_SIZE rows. Files listed in the store's manifest are
+    skipped, so ingestion can be rerun on a growing source and only converts new files.
+    Each run writes new part files, so earlier data is never rewritten.
+
+    Args:
+    source (FlowLogSource): Where the raw files live.
+    store (str): The store directory.
+    force (bool): Ingest files even if the manifest lists them (duplicates their records).
+    chunk_rows (int): Rows sorted and written at a time; bounds memory while ingesting.
+
+    Returns:
+    Dict[str, Any]: Counts of files ingested and skipped, and records written.
+    """
+    started = time.perf_counter()
+    os.makedirs(store, exist_ok=True)
+    manifest = load_manifest(store)
+    names = source.list()
+    pending = [n for n in names if force or _source_uri(source, n) not in manifest["files"]]
+    ingested: Dict[str, Dict[str, Any]] = {}
+    if pending:
+        ds.write_dataset(
+            _sorted_chunks(source, pending, ingested, chunk_rows),
+            store,
+            schema=STORE_SCHEMA,
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=ROW_GROUP_SIZE,
+            min_rows_per_group=min(ROW_GROUP_SIZE, chunk_rows),
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+        manifest["files"].update(ingested)
+        _save_manifest(store, manifest)
+    records = sum(entry["records"] for entry in ingested.values())
+    logger.info(f"Ingested {records} flow log records from {len(ingested)} files of {source} into {store} "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return {"store": store, "files_ingested": len(ingested), "files_skipped": len(names) - len(pending),
+            "records": records}
+
+
+def _hour_key(epoch: int) -> Dict[str, Any]:
+    moment = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return {"date": moment.strftime("%Y-%m-%d"), "hour": moment.hour}
+
+
+def _after(key: Dict[str, Any]) -> ds.Expression:
+    return (ds.field("date") > key["date"]) | ((ds.field("date") == key["date"]) & (ds.field("hour") >= key["hour"]))
+
+
+def _before(key: Dict[str, Any]) -> ds.Expression:
+    return (ds.field("date") < key["date"]) | ((ds.field("date") == key["date"]) & (ds.field("hour") <= key["hour"]))
+
+
+def build_filter(start_time: Optional[int] = None, end_time: Optional[int] = None, srcaddr: Optional[str] = None,
+                 dstaddr: Optional[str] = None, address: Optional[str] = None, srcport: Optional[int] = None,
+                 dstport: Optional[int] = None, protocol: Optional[str] = None, action: Optional[str] = None,
+                 interface_id: Optional[str] = None, vpc_id: Optional[str] = None) -> Optional[ds.Expression]:
+    """
+    Build the dataset filter for a query.
+
+    Time bounds become conditions on the date/hour partitions (which prune directories)
+    as well as on start/end (which prune row groups by their statistics); the other
+    arguments are equality conditions checked against row-group statistics first.
+    """
+    conditions = []
+    if start_time is not None:
+        conditions += [_after(_hour_key(start_time - PARTITION_SLACK)), ds.field("end") >= start_time]
+    if end_time is not None:
+        conditions += [_before(_hour_key(end_time)), ds.field("start") <= end_time]
+    if vpc_id:
+        conditions.append(ds.field("vpc_id") == vpc_id)
+    if interface_id:
+        conditions.append(ds.field("interface_id") == interface_id)
+    if srcaddr:
+        conditions.append(ds.field("srcaddr") == srcaddr)
+    if dstaddr:
+        conditions.append(ds.field("dstaddr") == dstaddr)
+    if address:
+        conditions.append((ds.field("srcaddr") == address) | (ds.field("dstaddr") == address))
+    if srcport is not None:
+        conditions.append(ds.field("srcport") == srcport)
+    if dstport is not None:
+        conditions.append(ds.field("dstport") == dstport)
+    if protocol is not None:
+        conditions.append(ds.field("protocol") == int(normalize_protocol(protocol)))
+    if action:
+        conditions.append(ds.field("action") == action.upper())
+    if not conditions:
+        return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+
+def open_store(store: str = DEFAULT_STORE) -> ds.FileSystemDataset:
+    """Open the store as a partitioned dataset (files starting with "_" or "." are ignored)."""
+    return ds.dataset(store, schema=STORE_SCHEMA, format="parquet", partitioning=PARTITIONING)
+
+
+def query(store: str = DEFAULT_STORE, group_by: str = "none", limit: int = DEFAULT_LIMIT,
+          **filters: Any) -> Dict[str, Any]:
+    """
+    Query the store, reading only the partitions, row groups and columns a question needs.
+
+    Partition filters drop whole directories, then each remaining file's row groups
+    are checked against their min/max statistics, and only the surviving row groups'
+    projected columns are read. Grouped queries aggregate batch by batch, so memory
+    grows with the number of groups rather than matching records.
+
+    Args:
+    store (str): The store directory.
+    group_by (str): "none" for matching records, or one of GROUPINGS.
+    limit (int): Records (the earliest by start time) or groups (the largest by bytes) to return.
+    **filters: Arguments of build_filter.
+
+    Returns:
+    Dict[str, Any]: Results plus counts of files and row groups scanned.
+    """
+    if group_by != "none" and group_by not in GROUPINGS:
+        raise ValueError(f"Unknown group_by: {group_by}")
+    started = time.perf_counter()
+    dataset = open_store(store)
+    expression = build_filter(**filters)
+    fragments = list(dataset.get_fragments(filter=expression))
+    row_groups = [rg for fragment in fragments for rg in fragment.split_by_row_group(expression, schema=STORE_SCHEMA)]
+    pruned = ds.FileSystemDataset(row_groups, STORE_SCHEMA, dataset.format, dataset.filesystem)
+    result: Dict[str, Any] = {"files_scanned": len(fragments), "files_total": len(dataset.files),
+                              "row_groups_scanned": len(row_groups), "group_by": group_by}
+    if group_by == "none":
+        # Keep a running set of the earliest records, so memory stays near limit rows
+        earliest: List[pa.Table] = []
+        held = matched = 0
+        for batch in pruned.to_batches(columns=RECORD_COLUMNS, filter=expression):
+            if not batch.num_rows:
+                continue
+            matched += batch.num_rows
+            earliest.append(pa.Table.from_batches([batch]))
+            held += batch.num_rows
+            if held > 2 * limit:
+                earliest = [pa.concat_tables(earliest).sort_by([("start", "ascending")]).slice(0, limit)]
+                held = earliest[0].num_rows
+        result["matched_records"] = matched
+        records = pa.concat_tables(earliest).sort_by([("start", "ascending")]).slice(0, limit) if earliest else None
+        result["records"] = records.to_pylist() if records is not None else []
+    else:
+        keys, sums = GROUPINGS[group_by]
+        # NODATA and SKIPDATA records carry no traffic to total
+        with_traffic = ds.field("bytes").is_valid()
+        expression = with_traffic if expression is None else expression & with_traffic
+        partials: List[pa.Table] = []
+        matched = 0
+        for batch in pruned.to_batches(columns=keys + sums, filter=expression):
+            if not batch.num_rows:
+                continue
+            matched += batch.num_rows
+            partials.append(aggregate_flows(pa.Table.from_batches([batch]), keys, sums, count=True))
+            if len(partials) > COMPACT_EVERY:
+                partials = [aggregate_flows(pa.concat_tables(partials), keys, sums + ["flows"], count=False)]
+        result["matched_records"] = matched
+        if partials:
+            table = aggregate_flows(pa.concat_tables(partials), keys, sums + ["flows"], count=False)
+            result["groups"] = table.num_rows
+            result["results"] = table.sort_by([("bytes", "descending")]).slice(0, limit).to_pylist()
+        else:
+            result["groups"] = 0
+            result["results"] = []
+    logger.info(f"Queried flow store {store}: {len(fragments)}/{len(dataset.files)} files, "
+                f"{len(row_groups)} row groups in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return result
+
+
+@tool(name="query_flow_store",
+      description="Query VPC Flow Logs already ingested into the local Parquet flow store (see ingest_flow_logs.py). "
+                  "Filters by time window, addresses, ports, protocol, action, ENI and VPC are pushed down so only "
+                  "the matching partitions and row groups are read. Returns matching records, or totals grouped "
+                  "by talker pair, destination port, interface, source or destination address. Much faster than "
+                  "analyze_flow_logs for repeated questions over the same logs.",
+      properties={
+          "start_time": {"type": "string", "description": "Window start, ISO 8601 (e.g., 2024-05-01T00:00:00Z)"},
+          "end_time": {"type": "string", "description": "Window end, ISO 8601"},
+          "srcaddr": {"type": "string", "description": "Source IP address"},
+          "dstaddr": {"type": "string", "description": "Destination IP address"},
+          "address": {"type": "string", "description": "IP address on either side of the flow"},
+          "srcport": {"type": "integer", "description": "Source port"},
+          "dstport": {"type": "integer", "description": "Destination port"},
+          "protocol": {"type": "string", "description": "Protocol name or number (e.g., tcp, 6)"},
+          "action": {"type": "string", "enum": ["ACCEPT", "REJECT"], "description": "Flow action"},
+          "interface_id": {"type": "string", "description": "ENI ID"},
+          "vpc_id": {"type": "string", "description": "VPC ID"},
+          "group_by": {"type": "string", "enum": ["none", *GROUPINGS],
+                       "description": "none (default) returns the earliest matching records; otherwise totals "
+                                      "per group, largest by bytes first"},
+          "limit": {"type": "integer", "minimum": 1,
+                    "description": f"Records or groups to return (default {DEFAULT_LIMIT})"}
+      })
+def query_flow_store(start_time: Optional[str] = None, end_time: Optional[str] = None, srcaddr: Optional[str] = None,
+                     dstaddr: Optional[str] = None, address: Optional[str] = None, srcport: Optional[int] = None,
+                     dstport: Optional[int] = None, protocol: Optional[str] = None, action: Optional[str] = None,
+                     interface_id: Optional[str] = None, vpc_id: Optional[str] = None, group_by: str = "none",
+                     limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+    if not os.path.isdir(DEFAULT_STORE):
+        return {"error": f"No flow store at {DEFAULT_STORE}; ingest flow logs with ingest_flow_logs.py first"}
+    return query(DEFAULT_STORE, group_by, limit, start_time=parse_time(start_time), end_time=parse_time(end_time),
+                 srcaddr=srcaddr, dstaddr=dstaddr, address=address, srcport=srcport, dstport=dstport,
+                 protocol=protocol, action=action, interface_id=interface_id, vpc_id=vpc_id)
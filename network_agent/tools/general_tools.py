@@ -1,10 +1,14 @@
 # tools/general_tools.py
 from datetime import datetime
-import pytz
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from .cidr_tools import describe_cidrs
+from .registry import tool
 
 
-def get_current_datetime(timezone_str: str = "UTC") -> Dict[str, str]:
+@tool(name="get_current_datetime",
+      description="Get the current date and time in a specified timezone",
+      properties={"timezone": {"type": "string", "description": "The timezone to use (e.g., UTC, America/New_York)"}})
+def get_current_datetime(timezone: str = "UTC") -> Dict[str, str]:
     """
     Get the current date and time in the specified timezone.
 
@@ -12,7 +16,7 @@ def get_current_datetime(timezone_str: str = "UTC") -> Dict[str, str]:
     If no timezone is specified, it defaults to UTC.
 
     Args:
-    timezone_str (str): The timezone to use (e.g., "America/New_York", "Europe/London").
+    timezone (str): The timezone to use (e.g., "America/New_York", "Europe/London").
 
     Returns:
     Dict[str, str]: A dictionary containing the formatted datetime and the timezone used.
@@ -21,18 +25,25 @@ def get_current_datetime(timezone_str: str = "UTC") -> Dict[str, str]:
     Raises:
     pytz.exceptions.UnknownTimeZoneError: If an invalid timezone is provided.
     """
+    # pytz loads its zone index on import, so only pay for it when the tool runs
+    import pytz
     try:
-        tz = pytz.timezone(timezone_str)
+        tz = pytz.timezone(timezone)
         current_time = datetime.now(tz)
         return {
             "datetime": current_time.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            "timezone": timezone_str
+            "timezone": timezone
         }
     except pytz.exceptions.UnknownTimeZoneError:
-        return {"error": f"Unknown timezone: {timezone_str}"}
+        return {"error": f"Unknown timezone: {timezone}"}
 
 
-def calculate_cidr_range(cidr: str) -> Dict[str, Any]:
+@tool(name="calculate_cidr_range",
+      description="Calculate the range of IP addresses for a given CIDR notation, or for a list of CIDRs at once",
+      properties={"cidr": {"type": "string", "description": "The CIDR notation (e.g., 192.168.1.0/24)"},
+                  "cidrs": {"type": "array", "items": {"type": "string"},
+                            "description": "Several CIDRs to calculate in one call"}})
+def calculate_cidr_range(cidr: Optional[str] = None, cidrs: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     Calculate the range of IP addresses for a given CIDR notation.
 
@@ -41,6 +52,7 @@ def calculate_cidr_range(cidr: str) -> Dict[str, Any]:
 
     Args:
     cidr (str): The CIDR notation (e.g., "192.168.1.0/24").
+    cidrs (Optional[List[str]]): Several CIDRs; the result then holds one entry per CIDR under "results".
 
     Returns:
     Dict[str, Any]: A dictionary containing CIDR range details or an error message
@@ -49,6 +61,10 @@ def calculate_cidr_range(cidr: str) -> Dict[str, Any]:
     Raises:
     ValueError: If the CIDR notation is invalid.
     """
+    if cidrs is not None:
+        return {"results": describe_cidrs(cidrs)}
+    if cidr is None:
+        return {"error": "Provide cidr or cidrs"}
     try:
         from ipaddress import ip_network
         network = ip_network(cidr)
@@ -60,75 +76,3 @@ def calculate_cidr_range(cidr: str) -> Dict[str, Any]:
         }
     except ValueError as e:
         return {"error": f"Invalid CIDR notation: {str(e)}"}
-
-
-general_tools = [
-    {
-        "toolSpec": {
-            "name": "get_current_datetime",
-            "description": "Get the current date and time in a specified timezone",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "utc": {"type": "string", "description": "The timezone to use (e.g., UTC)"}
-                    },
-                    "required": []
-                }
-            } 
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "calculate_cidr_range",
-            "description": "Calculate the range of IP addresses for a given CIDR notation",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "cidr": {"type": "string", "description": "The CIDR notation (e.g., 192.168.1.0/24)"}
-                    },
-                    "required": ["cidr"]
-                }
-            } 
-        }
-    }
-]
-
-
-def handle_general_tool(tool_use: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Handle general tool use requests.
-
-    Args:
-    tool_use (Dict[str, Any]): A dictionary containing the tool use request details.
-
-    Returns:
-    Dict[str, Any]: The result of the tool operation or an error message.
-    """
-    tool_name = tool_use['name']
-    input_data = tool_use['input']
-
-    try:
-        if tool_name == "get_current_datetime":
-            result = get_current_datetime(input_data.get('timezone', 'UTC'))
-        elif tool_name == "calculate_cidr_range":
-            result = calculate_cidr_range(input_data['cidr'])
-        else:
-            return {"error": f"Unknown general tool: {tool_name}"}
-
-        return {
-            "toolResult": {
-                "toolUseId": tool_use['toolUseId'],
-                "content": [{"json": result}],
-                "status": "success"
-            }
-        }
-    except Exception as e:
-        return {
-            "toolResult": {
-                "toolUseId": tool_use['toolUseId'],
-                "content": [{"json": {"error": str(e)}}],
-                "status": "error"
-            }
-        }
\ No newline at end of file
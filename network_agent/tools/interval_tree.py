@@ -0,0 +1,85 @@
+# tools/interval_tree.py
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+Interval = Tuple[int, int, Any]
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+    def __init__(self, center: int, overlapping: List[Interval]):
+        self.center = center
+        self.by_start = sorted(overlapping, key=lambda iv: iv[0])
+        self.by_end = sorted(overlapping, key=lambda iv: iv[1], reverse=True)
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed integer intervals [start, end].
+
+    Each node keeps the intervals spanning its center point, sorted by start and by
+    end, so a query only scans intervals that actually match plus one sorted run per
+    level: O(log n + k) for k results.
+
+    Args:
+    intervals (Sequence[Tuple[int, int, Any]]): (start, end, value) triples.
+    """
+
+    def __init__(self, intervals: Sequence[Interval]):
+        self._size = len(intervals)
+        self._root = self._build(list(intervals))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _build(self, intervals: List[Interval]) -> Optional[_Node]:
+        if not intervals:
+            return None
+        points = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = points[len(points) // 2]
+        left = [iv for iv in intervals if iv[1] < center]
+        right = [iv for iv in intervals if iv[0] > center]
+        node = _Node(center, [iv for iv in intervals if iv[0] <= center <= iv[1]])
+        node.left = self._build(left)
+        node.right = self._build(right)
+        return node
+
+    def stab(self, point: int) -> Iterator[Any]:
+        """Yield the value of every interval containing point."""
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for start, _, value in node.by_start:
+                    if start > point:
+                        break
+                    yield value
+                node = node.left
+            elif point > node.center:
+                for _, end, value in node.by_end:
+                    if end < point:
+                        break
+                    yield value
+                node = node.right
+            else:
+                for _, _, value in node.by_start:
+                    yield value
+                return
+
+    def overlapping(self, start: int, end: int) -> Iterator[Any]:
+        """Yield the value of every interval that shares at least one point with [start, end]."""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            for iv_start, iv_end, value in node.by_start:
+                if iv_start > end:
+                    break
+                if iv_end >= start:
+                    yield value
+            if start < node.center:
+                stack.append(node.left)
+            if end > node.center:
+                stack.append(node.right)
@@ -0,0 +1,355 @@
+# tools/inventory.py
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from aws_clients import add_account_resolver, get_account_id, get_pool
+
+from .cache import refresh_requested
+from .pagination import ResourcePager, iter_resources
+from .regions import REGIONS_PROPERTIES, fan_out
+from .registry import REGION_PROPERTY, tool
+
+logger = logging.getLogger(__name__)
+
+
+# resource type -> (describe operation, result key, id key, VPC filter name)
+RESOURCE_TYPES = {
+    "vpcs": ("describe_vpcs", "Vpcs", "VpcId", "vpc-id"),
+    "subnets": ("describe_subnets", "Subnets", "SubnetId", "vpc-id"),
+    "route_tables": ("describe_route_tables", "RouteTables", "RouteTableId", "vpc-id"),
+    "network_acls": ("describe_network_acls", "NetworkAcls", "NetworkAclId", "vpc-id"),
+    "security_groups": ("describe_security_groups", "SecurityGroups", "GroupId", "vpc-id"),
+    "internet_gateways": ("describe_internet_gateways", "InternetGateways", "InternetGatewayId", "attachment.vpc-id"),
+    "nat_gateways": ("describe_nat_gateways", "NatGateways", "NatGatewayId", "vpc-id"),
+    "network_interfaces": ("describe_network_interfaces", "NetworkInterfaces", "NetworkInterfaceId", "vpc-id"),
+}
+# Everything the store keeps: the topology resource types plus instances
+INVENTORY_TYPES = {
+    **RESOURCE_TYPES,
+    "instances": ("describe_instances", "Reservations", "InstanceId", "vpc-id"),
+}
+
+# SQLite database file; an empty value disables the store
+INVENTORY_DB = os.path.expanduser(os.environ.get("NW_INVENTORY_DB", "~/.network_whisperer/inventory.db"))
+# Seconds after a refresh that tools answer from the store instead of AWS (0 disables reads),
+# overridable per type with NW_INVENTORY_MAX_AGE_<TYPE> (e.g., NW_INVENTORY_MAX_AGE_INSTANCES)
+MAX_AGE = int(os.environ.get("NW_INVENTORY_MAX_AGE", "900"))
+MAX_AGES = {rtype: int(os.environ.get(f"NW_INVENTORY_MAX_AGE_{rtype.upper()}", MAX_AGE)) for rtype in INVENTORY_TYPES}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    vpc_id TEXT,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, region, resource_type, resource_id)
+);
+CREATE INDEX IF NOT EXISTS resources_by_vpc ON resources (account, region, resource_type, vpc_id);
+CREATE TABLE IF NOT EXISTS refreshes (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (account, region, resource_type)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def resource_vpc_ids(resource_type: str, resource: Dict[str, Any]) -> List[str]:
+    """Return the VPCs a raw resource belongs to (internet gateways through their attachments)."""
+    if resource_type == "internet_gateways":
+        return [att['VpcId'] for att in resource.get('Attachments', []) if att.get('VpcId')]
+    return [resource['VpcId']] if resource.get('VpcId') else []
+
+
+def content_hash(resource: Dict[str, Any]) -> str:
+    """Hash a resource's canonical JSON, so unchanged resources can be recognized without comparing fields."""
+    canonical = json.dumps(resource, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def fetch_resources(region: str, resource_type: str, vpc_ids: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Fetch every resource of a type in a region (or in some VPCs), flattening instance reservations."""
+    operation, result_key, _, filter_name = INVENTORY_TYPES[resource_type]
+    params = {"Filters": [{'Name': filter_name, 'Values': list(vpc_ids)}]} if vpc_ids else {}
+    resources = iter_resources(region, operation, result_key, **params)
+    if resource_type == "instances":
+        return [instance for reservation in resources for instance in reservation["Instances"]]
+    return list(resources)
+
+
+class InventoryStore:
+    """
+    SQLite store of raw describe results, one row per resource.
+
+    Each row keeps the resource's JSON and a content hash. A refresh compares the
+    fetched resources against the stored hashes and writes only the resources that
+    were added, changed or removed, so refreshing a large, mostly unchanged
+    inventory is a read of the hashes plus a handful of writes. The connection is
+    shared across threads behind a lock.
+
+    Args:
+    path (str): The database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def apply(self, account: str, region: str, resource_type: str,
+              resources: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the stored resources of one type and region match a complete fetch.
+
+        Returns:
+        Dict[str, int]: Counts of added, updated, removed and unchanged resources.
+        """
+        id_key = INVENTORY_TYPES[resource_type][2]
+        now = time.time()
+        fetched = {}
+        for resource in resources:
+            fetched[resource[id_key]] = resource
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            stored = dict(self._conn.execute(
+                "SELECT resource_id, hash FROM resources WHERE account = ? AND region = ? AND resource_type = ?",
+                (account, region, resource_type)))
+            writes = []
+            for resource_id, resource in fetched.items():
+                digest = content_hash(resource)
+                previous = stored.pop(resource_id, None)
+                if previous == digest:
+                    counts["unchanged"] += 1
+                    continue
+                counts["added" if previous is None else "updated"] += 1
+                vpc_ids = resource_vpc_ids(resource_type, resource)
+                writes.append((account, region, resource_type, resource_id, vpc_ids[0] if vpc_ids else None,
+                               digest, json.dumps(resource, default=str), now))
+            counts["removed"] = len(stored)
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?)", writes)
+                self._conn.executemany(
+                    "DELETE FROM resources WHERE account = ? AND region = ? AND resource_type = ? "
+                    "AND resource_id = ?", [(account, region, resource_type, rid) for rid in stored])
+                self._conn.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?)",
+                                   (account, region, resource_type, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return counts
+
+    def resources(self, account: str, region: str, resource_type: str,
+                  vpc_ids: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """Return the stored resources of one type, optionally only those in some VPCs."""
+        query = "SELECT data FROM resources WHERE account = ? AND region = ? AND resource_type = ?"
+        params: List[Any] = [account, region, resource_type]
+        if vpc_ids:
+            query += f" AND vpc_id IN ({', '.join('?' * len(vpc_ids))})"
+            params.extend(vpc_ids)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY rowid", params).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def refreshed_at(self, account: str, region: str) -> Dict[str, float]:
+        """Return when each resource type of a region was last refreshed."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT resource_type, refreshed_at FROM refreshes WHERE account = ? AND region = ?",
+                (account, region)))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+
+_store: Optional[InventoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[InventoryStore]:
+    """Return the process-wide inventory store, opening it on first use (None when disabled)."""
+    global _store
+    if _store is None and INVENTORY_DB:
+        with _store_lock:
+            if _store is None:
+                _store = InventoryStore(INVENTORY_DB)
+    return _store
+
+
+def _stored_account_id(profile: Optional[str]) -> Optional[str]:
+    # Account IDs are remembered per access key, so changed credentials are looked up again
+    store = get_store()
+    access_key = get_pool().access_key_id(profile)
+    if store is None or access_key is None:
+        return None
+    return store.get_meta(f"account:{access_key}")
+
+
+add_account_resolver(_stored_account_id)
+
+
+def _remember_account(account: str) -> None:
+    access_key = get_pool().access_key_id()
+    store = get_store()
+    if store is not None and access_key and account != "unknown":
+        store.set_meta(f"account:{access_key}", account)
+
+
+def record(region: str, resources: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, int]]:
+    """
+    Write complete, unfiltered fetches of some resource types into the store.
+
+    Args:
+    region (str): The region the resources were fetched from.
+    resources (Dict[str, List[Dict[str, Any]]]): Every resource of each type in the region.
+
+    Returns:
+    Dict[str, Dict[str, int]]: Change counts per resource type (empty when the store is disabled).
+    """
+    store = get_store()
+    if store is None:
+        return {}
+    account = get_account_id()
+    if account == "unknown":
+        logger.warning(f"Not recording inventory for {region}: the account ID could not be determined")
+        return {}
+    _remember_account(account)
+    return {rtype: store.apply(account, region, rtype, items) for rtype, items in resources.items()}
+
+
+def stored(region: str, resource_types: Iterable[str], vpc_ids: Sequence[str] = (),
+           max_age: Optional[int] = None) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Return stored resources when every requested type was refreshed within its max age.
+
+    Returns None (meaning "ask AWS") when the store is disabled or stale, when the account
+    is unknown, or inside a force_refresh call.
+
+    Args:
+    region (str): The region.
+    resource_types (Iterable[str]): Types that must all be fresh.
+    vpc_ids (Sequence[str]): Only resources in these VPCs. Empty means all.
+    max_age (Optional[int]): Maximum age in seconds for every type. None means MAX_AGES.
+    """
+    store = get_store()
+    if store is None or refresh_requested():
+        return None
+    account = get_account_id()
+    if account == "unknown":
+        return None
+    refreshed = store.refreshed_at(account, region)
+    resource_types = list(resource_types)
+    now = time.time()
+    for rtype in resource_types:
+        limit = MAX_AGES.get(rtype, MAX_AGE) if max_age is None else max_age
+        if limit <= 0 or refreshed.get(rtype, 0) < now - limit:
+            return None
+    return {rtype: store.resources(account, region, rtype, vpc_ids) for rtype in resource_types}
+
+
+def refreshed_at(region: str, resource_type: str) -> Optional[float]:
+    """Return when a resource type of a region was last written to the store, if ever."""
+    store = get_store()
+    if store is None:
+        return None
+    return store.refreshed_at(get_account_id(), region).get(resource_type)
+
+
+def from_inventory(pager: ResourcePager, resource_type: str,
+                   vpc_id: Optional[str] = None) -> Union[List[Dict[str, Any]], ResourcePager]:
+    """
+    Return the stored resources a describe pager would fetch, or the pager itself.
+
+    The store answers only first pages (no next_token) that fit within max_results,
+    so results served from it are never truncated. When it answers, the pager's
+    stored_at is set to when the rows were fetched, for with_next_token to report.
+
+    Args:
+    pager (ResourcePager): The pager the tool would otherwise iterate.
+    resource_type (str): The inventory type the pager lists.
+    vpc_id (Optional[str]): The VPC the pager is filtered to, if any.
+    """
+    if pager.start_token:
+        return pager
+    resources = stored(pager.region, [resource_type], (vpc_id,) if vpc_id else ())
+    if resources is None or (pager.max_results and len(resources[resource_type]) > pager.max_results):
+        return pager
+    pager.stored_at = refreshed_at(pager.region, resource_type)
+    return resources[resource_type]
+
+
+def refresh(region: str = "us-west-2", resource_types: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Fetch every resource of some types in a region and apply the changes to the store.
+
+    All types are fetched concurrently, one paginated stream per type.
+
+    Args:
+    region (str): The region to refresh.
+    resource_types (Optional[Sequence[str]]): Types to refresh. None means all of INVENTORY_TYPES.
+
+    Returns:
+    Dict[str, Any]: Change counts per resource type.
+    """
+    start = time.perf_counter()
+    resource_types = list(resource_types or INVENTORY_TYPES)
+    unknown = set(resource_types) - set(INVENTORY_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown resource types: {', '.join(sorted(unknown))}")
+    with ThreadPoolExecutor(max_workers=len(resource_types), thread_name_prefix="inventory") as executor:
+        futures = {rtype: executor.submit(contextvars.copy_context().run, fetch_resources, region, rtype)
+                   for rtype in resource_types}
+        resources = {rtype: future.result() for rtype, future in futures.items()}
+    changes = record(region, resources)
+    logger.info(f"Refreshed inventory for {region} ({sum(len(r) for r in resources.values())} resources) "
+                f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return {"region": region, "changes": changes}
+
+
+@tool(name="refresh_inventory",
+      description="Refresh the local inventory store (VPCs, subnets, route tables, NACLs, security groups, "
+                  "gateways, network interfaces and instances) from AWS, writing only what changed. Other tools "
+                  "answer from the store while it is fresh, so call this after making changes in AWS.",
+      properties={
+          "region": REGION_PROPERTY,
+          **REGIONS_PROPERTIES,
+          "resource_types": {"type": "array", "items": {"type": "string", "enum": list(INVENTORY_TYPES)},
+                             "description": "Resource types to refresh (default all)"}
+      })
+def refresh_inventory(region: str = "us-west-2", regions: Optional[List[str]] = None,
+                      resource_types: Optional[List[str]] = None) -> Dict[str, Any]:
+    if get_store() is None:
+        return {"error": "The inventory store is disabled (NW_INVENTORY_DB is empty)"}
+    if regions:
+        results, status = fan_out(refresh, regions, resource_types=resource_types)
+        return {"changes": {name: result["changes"] for name, result in results.items()}, "regions": status}
+    return refresh(region, resource_types)
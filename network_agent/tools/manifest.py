@@ -0,0 +1,74 @@
+# tools/manifest.py
+import hashlib
+import importlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from .registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Modules whose import registers tools, in the order their tools are listed to the model
+TOOL_MODULES = (
+    "vpc_tools", "network_tools", "ec2_tools", "general_tools", "topology", "reachability", "cidr_tools",
+    "sg_index", "flow_logs", "flow_store", "inventory", "encoding",
+)
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(TOOLS_DIR, "tool_manifest.json")
+
+
+def fingerprint() -> str:
+    """Hash the tools package source, so a manifest built from older code is detected."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(TOOLS_DIR)):
+        if name.endswith(".py"):
+            digest.update(name.encode())
+            with open(os.path.join(TOOLS_DIR, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def import_tool_modules() -> None:
+    """Import every tool module, registering all tools."""
+    for module in TOOL_MODULES:
+        importlib.import_module(f"{__package__}.{module}")
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return the manifest's tool entries (name, module, spec), or None if it is missing
+    or was built from different source.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read tool manifest {path}: {str(e)}")
+        return None
+    if manifest.get("fingerprint") != fingerprint():
+        logger.warning("Tool manifest is out of date; importing every tool module. "
+                       "Run `python build_tool_manifest.py` to rebuild it.")
+        return None
+    return manifest["tools"]
+
+
+def build_manifest(path: str = MANIFEST_PATH) -> List[Dict[str, Any]]:
+    """Import every tool module and write the name, module and spec of each registered tool."""
+    import_tool_modules()
+    registry = get_registry()
+    tools = []
+    for module in TOOL_MODULES:
+        for name in registry.names():
+            tool = registry.get(name)
+            if tool.module == f"{__package__}.{module}":
+                tools.append({"name": name, "module": tool.module, "spec": tool.spec})
+    with open(path, "w") as f:
+        json.dump({"fingerprint": fingerprint(), "tools": tools}, f, indent=1)
+        f.write("\n")
+    return tools
+
@@ -1,84 +1,36 @@
-import boto3
-
-
-def list_subnets(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_subnets(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-    subnets = [{'SubnetId': subnet['SubnetId'], 'CidrBlock': subnet['CidrBlock'], 'AvailabilityZone': subnet['AvailabilityZone']} for subnet in response['Subnets']]
-    return {
+from .cache import CACHE_PROPERTIES, cached
+from .inventory import from_inventory
+from .pagination import DEFAULT_MAX_RESULTS, PAGING_PROPERTIES, ResourcePager, vpc_filter, with_next_token
+from .registry import REGION_PROPERTY, VPC_ID_PROPERTY, tool
+
+
+@tool(name="list_subnets",
+      description="List subnets in a specified VPC",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('subnets')
+def list_subnets(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_subnets', 'Subnets', max_results=max_results,
+                          next_token=next_token, Filters=vpc_filter(vpc_id))
+    subnets = [{'SubnetId': subnet['SubnetId'], 'CidrBlock': subnet['CidrBlock'], 'AvailabilityZone': subnet['AvailabilityZone']} for subnet in from_inventory(pager, 'subnets', vpc_id)]
+    return with_next_token({
         'vpc_id': vpc_id,
         'subnets': subnets,
         "region": region
-    }
-
-
-def describe_network_acls(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_network_acls(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
-    nacls = [{'NetworkAclId': nacl['NetworkAclId'], 'IsDefault': nacl['IsDefault']} for nacl in response['NetworkAcls']]
-    return {
+    }, pager)
+
+
+@tool(name="describe_network_acls",
+      description="Describe Network ACLs for a specified VPC",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('network_acls')
+def describe_network_acls(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_network_acls', 'NetworkAcls', max_results=max_results,
+                          next_token=next_token, Filters=vpc_filter(vpc_id))
+    nacls = [{'NetworkAclId': nacl['NetworkAclId'], 'IsDefault': nacl['IsDefault']} for nacl in from_inventory(pager, 'network_acls', vpc_id)]
+    return with_next_token({
         'vpc_id': vpc_id,
         'network_acls': nacls,
         "region": region
-    }
-
-
-network_tools = [
-    {
-        "toolSpec": {
-            "name": "list_subnets",
-            "description": "List subnets in a specified VPC",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "describe_network_acls",
-            "description": "Describe Network ACLs for a specified VPC",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    }
-]
-
-
-def handle_network_tool(tool_use):
-    tool_name = tool_use['name']
-    input_data = tool_use['input']
-    
-    if tool_name == "list_subnets":
-        result = list_subnets(input_data['vpc_id'], region=input_data.get('region', 'us-west-2'))
-    elif tool_name == "describe_network_acls":
-        result = describe_network_acls(input_data['vpc_id'], region=input_data.get('region', 'us-west-2'))
-    else:
-        result = {"error": f"Unknown network tool: {tool_name}"}
-
-    return {
-        "role": "user",
-        "content": [
-            {
-                "toolResult": {
-                    "toolUseId": tool_use['toolUseId'],
-                    "content": [{"json": result}],
-                    "status": "success"
-                }
-            }
-        ]
-    }
\ No newline at end of file
+    }, pager)
@@ -0,0 +1,158 @@
+# tools/pagination.py
+from datetime import datetime, timezone
+from typing import Any, Dict, Generator, Hashable, Iterator, List, Optional, Tuple
+
+from aws_clients import get_account_id, get_client
+
+from .cache import freeze
+from .singleflight import get_flights
+
+
+# Default cap on resources returned by a single tool call. Anything beyond it is
+# reachable through the returned next_token rather than silently dropped.
+DEFAULT_MAX_RESULTS = 1000
+# Listings capped at or below this many resources are fetched whole and shared with
+# identical listings in flight; larger or unbounded ones stream without coalescing
+MAX_COALESCED_RESULTS = DEFAULT_MAX_RESULTS
+
+# Schema properties shared by every paginated tool
+PAGING_PROPERTIES = {
+    "max_results": {
+        "type": "integer",
+        "minimum": 1,
+        "description": f"Maximum number of resources to return (default {DEFAULT_MAX_RESULTS})"
+    },
+    "next_token": {
+        "type": "string",
+        "description": "Cursor returned as next_token by a previous call, to fetch the next page of results"
+    }
+}
+
+
+class ResourcePager:
+    """
+    Stream resources from a paginated AWS describe_* operation, one page at a time.
+
+    Iterating the pager fetches pages lazily from the botocore paginator and yields
+    the items under result_key, so callers never hold more than one page in memory
+    unless they choose to (listings capped at MAX_COALESCED_RESULTS are fetched whole;
+    see pages()). When max_results cuts the listing short, next_token is
+    set after iteration finishes and can be passed back to resume where it stopped.
+
+    Args:
+    region (str): The AWS region to query.
+    operation (str): The client operation name (e.g., "describe_vpcs").
+    result_key (str): The response key holding the resources (e.g., "Vpcs").
+    max_results (Optional[int]): Stop after this many resources. None means no limit.
+    next_token (Optional[str]): Resume token from a previous, truncated iteration.
+    page_size (Optional[int]): Number of resources to request per API call.
+    service (str): The AWS service name. Defaults to "ec2".
+    **params: Additional operation parameters (e.g., Filters).
+    """
+
+    def __init__(self, region: str, operation: str, result_key: str, max_results: Optional[int] = None,
+                 next_token: Optional[str] = None, page_size: Optional[int] = None, service: str = "ec2",
+                 **params: Any):
+        self.region = region
+        self.operation = operation
+        self.result_key = result_key
+        self.max_results = max_results
+        self.start_token = next_token
+        self.page_size = page_size
+        self.service = service
+        self.params = params
+        self.next_token: Optional[str] = None
+        # Set when the resources come from the inventory store rather than AWS (epoch seconds)
+        self.stored_at: Optional[float] = None
+
+    def _pagination_config(self) -> Dict[str, Any]:
+        config = {}
+        if self.max_results:
+            config["MaxItems"] = self.max_results
+        if self.start_token:
+            config["StartingToken"] = self.start_token
+        if self.page_size:
+            config["PageSize"] = self.page_size
+        return config
+
+    def _request_key(self) -> Hashable:
+        params = dict(self.params)
+        if "Filters" in params:
+            # Filter order and value order don't change the result
+            params["Filters"] = sorted((f["Name"], sorted(f["Values"])) for f in params["Filters"])
+        return (get_account_id(), self.service, self.region, self.operation,
+                freeze(params), freeze(self._pagination_config()))
+
+    def _fetch_pages(self) -> Generator[List[Dict[str, Any]], None, Optional[str]]:
+        client = get_client(self.service, self.region)
+        paginator = client.get_paginator(self.operation)
+        page_iterator = paginator.paginate(PaginationConfig=self._pagination_config(), **self.params)
+        for page in page_iterator:
+            yield page.get(self.result_key, [])
+        # Only set by botocore when MaxItems truncated the listing
+        return page_iterator.resume_token
+
+    def _fetch_all(self) -> Tuple[List[List[Dict[str, Any]]], Optional[str]]:
+        pages = []
+        fetch = self._fetch_pages()
+        while True:
+            try:
+                pages.append(next(fetch))
+            except StopIteration as stop:
+                return pages, stop.value
+
+    def pages(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield each page's list of resources as it arrives.
+
+        A listing capped at MAX_COALESCED_RESULTS or fewer resources is fetched whole, and
+        an identical listing (same API, region, filters and paging) already in flight in
+        another thread is joined rather than repeated; see tools/singleflight.py. Larger
+        and unbounded listings stream page by page without coalescing.
+        """
+        self.next_token = None
+        if self.max_results is None or self.max_results > MAX_COALESCED_RESULTS:
+            self.next_token = yield from self._fetch_pages()
+            return
+        pages, self.next_token = get_flights().do(self._request_key(), self._fetch_all, self.operation)
+        yield from pages
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for page in self.pages():
+            yield from page
+
+
+def iter_resources(region: str, operation: str, result_key: str, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every resource returned by a paginated describe_* operation.
+
+    This is the unbounded streaming form of ResourcePager, for callers that want
+    to walk a whole inventory without materializing it.
+
+    Args:
+    region (str): The AWS region to query.
+    operation (str): The client operation name (e.g., "describe_subnets").
+    result_key (str): The response key holding the resources (e.g., "Subnets").
+    **kwargs: Passed through to ResourcePager (filters, page_size, service).
+
+    Returns:
+    Iterator[Dict[str, Any]]: Raw resource dictionaries, in API order.
+    """
+    return iter(ResourcePager(region, operation, result_key, **kwargs))
+
+
+def vpc_filter(vpc_id: str, name: str = "vpc-id") -> List[Dict[str, Any]]:
+    """Build the Filters parameter that scopes a describe call to one VPC."""
+    return [{'Name': name, 'Values': [vpc_id]}]
+
+
+def with_next_token(result: Dict[str, Any], pager: ResourcePager) -> Dict[str, Any]:
+    """
+    Add the pager's next_token to a tool result when the listing was truncated, and
+    inventory_as_of when it was answered from the inventory store.
+    """
+    if pager.next_token:
+        result['next_token'] = pager.next_token
+    if pager.stored_at is not None:
+        result['inventory_as_of'] = datetime.fromtimestamp(pager.stored_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return result
@@ -0,0 +1,159 @@
+# tools/prefix_trie.py
+import ipaddress
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class _Node:
+    __slots__ = ("key", "length", "value", "has_value", "children")
+
+    def __init__(self, key: int, length: int, value: Any = None, has_value: bool = False):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.has_value = has_value
+        self.children: List[Optional["_Node"]] = [None, None]
+
+
+class PrefixTrie:
+    """
+    Path-compressed binary (Patricia) trie of IP prefixes for one address family.
+
+    Lookups walk at most one node per distinct branching point, so longest-prefix
+    match costs a handful of integer operations regardless of how many prefixes are
+    stored. Keys are integer addresses; use ip_key() to convert strings.
+
+    Args:
+    version (int): 4 for IPv4, 6 for IPv6.
+    """
+
+    def __init__(self, version: int = 4):
+        self.version = version
+        self.bits = 32 if version == 4 else 128
+        full = (1 << self.bits) - 1
+        self._masks = [full ^ ((1 << (self.bits - length)) - 1) for length in range(self.bits + 1)]
+        self._root = _Node(0, 0)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _bit(self, key: int, position: int) -> int:
+        # Bit at position counted from the most significant bit (0-based)
+        return (key >> (self.bits - 1 - position)) & 1
+
+    def _common_length(self, a: int, b: int, max_length: int) -> int:
+        diff = (a ^ b) & self._masks[max_length]
+        return max_length if diff == 0 else self.bits - diff.bit_length()
+
+    def insert(self, prefix: Union[str, Network], value: Any) -> None:
+        """Insert or replace the value stored for a prefix (e.g., "10.0.0.0/16")."""
+        network = ipaddress.ip_network(prefix, strict=False) if isinstance(prefix, str) else prefix
+        if network.version != self.version:
+            raise ValueError(f"{network} is not an IPv{self.version} prefix")
+        key, length = int(network.network_address), network.prefixlen
+
+        node = self._root
+        while True:
+            if node.length == length:
+                # Invariant: node's prefix is a prefix of the key, so equal lengths mean equal prefixes
+                if not node.has_value:
+                    self._size += 1
+                node.value, node.has_value = value, True
+                return
+            bit = self._bit(key, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(key, length, value, True)
+                self._size += 1
+                return
+            common = self._common_length(child.key, key, min(child.length, length))
+            if common == child.length:
+                node = child
+                continue
+            if common == length:
+                # New prefix sits between node and child
+                new = _Node(key, length, value, True)
+                new.children[self._bit(child.key, length)] = child
+                node.children[bit] = new
+            else:
+                # Prefixes diverge below node: add a branching node without a value
+                branch = _Node(key & self._masks[common], common)
+                branch.children[self._bit(child.key, common)] = child
+                branch.children[self._bit(key, common)] = _Node(key, length, value, True)
+                node.children[bit] = branch
+            self._size += 1
+            return
+
+    def longest_match(self, address: int) -> Optional[Tuple[int, int, Any]]:
+        """
+        Return (network key, prefix length, value) of the most specific prefix containing the address.
+
+        Args:
+        address (int): Integer address of this trie's family.
+
+        Returns:
+        Optional[Tuple[int, int, Any]]: The match, or None if no prefix contains the address.
+        """
+        masks = self._masks
+        node = self._root
+        best = None
+        while node is not None:
+            if (address ^ node.key) & masks[node.length]:
+                break
+            if node.has_value:
+                best = node
+            if node.length == self.bits:
+                break
+            node = node.children[(address >> (self.bits - 1 - node.length)) & 1]
+        return (best.key, best.length, best.value) if best else None
+
+    def covering(self, address: int, length: Optional[int] = None) -> Iterator[Tuple[int, int, Any]]:
+        """Yield every stored prefix that contains the address (or the prefix address/length), shortest first."""
+        length = self.bits if length is None else length
+        masks = self._masks
+        node = self._root
+        while node is not None and node.length <= length:
+            if (address ^ node.key) & masks[node.length]:
+                return
+            if node.has_value:
+                yield node.key, node.length, node.value
+            if node.length == self.bits:
+                return
+            node = node.children[(address >> (self.bits - 1 - node.length)) & 1]
+
+    def covered_by(self, address: int, length: int) -> Iterator[Tuple[int, int, Any]]:
+        """Yield every stored prefix contained in the prefix address/length (including itself)."""
+        masks = self._masks
+        key = address & masks[length]
+        node = self._root
+        # Descend to the first node at or below the query prefix
+        while node is not None and node.length < length:
+            if (key ^ node.key) & masks[node.length]:
+                return
+            node = node.children[self._bit(key, node.length)]
+        if node is None or (node.key ^ key) & masks[length]:
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.has_value:
+                yield current.key, current.length, current.value
+            stack.extend(child for child in current.children if child is not None)
+
+    def items(self) -> Iterator[Tuple[int, int, Any]]:
+        """Yield every stored (network key, prefix length, value)."""
+        return self.covered_by(0, 0)
+
+
+def ip_key(address: str) -> Tuple[int, int]:
+    """Return (version, integer) for an IP address string."""
+    parsed = ipaddress.ip_address(address)
+    return parsed.version, int(parsed)
+
+
+def network_key(prefix: str) -> Tuple[int, int, int]:
+    """Return (version, integer network address, prefix length) for a CIDR string."""
+    network = ipaddress.ip_network(prefix, strict=False)
+    return network.version, int(network.network_address), network.prefixlen
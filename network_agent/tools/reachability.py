@@ -0,0 +1,455 @@
+# tools/reachability.py
+import ipaddress
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .cache import CACHE_PROPERTIES
+from .prefix_trie import PrefixTrie
+from .registry import REGION_PROPERTY, tool
+from .topology import TopologySnapshot, get_snapshot
+
+
+# Protocol names accepted from callers, mapped to the IANA numbers NACLs use
+PROTOCOL_NUMBERS = {"all": "-1", "-1": "-1", "tcp": "6", "udp": "17", "icmp": "1", "icmpv6": "58"}
+PORTED_PROTOCOLS = {"6", "17"}
+# Representative client port for return traffic through stateless NACLs
+EPHEMERAL_PORT = 49152
+
+REACHABLE = "reachable"
+BLOCKED = "blocked"
+UNKNOWN = "unknown"
+
+# (version, network address, mask, cidr)
+CompiledCidr = Tuple[int, int, int, str]
+
+
+def normalize_protocol(protocol: Any) -> str:
+    """Return the IANA protocol number string for a protocol name or number ("-1" for all)."""
+    value = str(protocol).lower()
+    return PROTOCOL_NUMBERS.get(value, value)
+
+
+def _compile_cidr(cidr: str) -> CompiledCidr:
+    network = ipaddress.ip_network(cidr, strict=False)
+    return network.version, int(network.network_address), int(network.netmask), cidr
+
+
+def _ports_match(protocol: str, port: Optional[int], rule_protocol: str, from_port: int, to_port: int) -> bool:
+    if rule_protocol == "-1":
+        return True
+    if rule_protocol != protocol:
+        return False
+    if protocol not in PORTED_PROTOCOLS or port is None:
+        return True
+    return from_port <= port <= to_port
+
+
+class Endpoint:
+    """
+    One end of a path, resolved against a snapshot.
+
+    kind is "interface" (an ENI), "subnet" (an IP inside a known subnet with no known
+    ENI) or "external" (anything outside the snapshot).
+    """
+
+    __slots__ = ("label", "kind", "ip", "version", "address", "interface", "subnet", "vpc_id", "groups",
+                 "public_ip", "via_public_ip")
+
+    def __init__(self, label: str, kind: str, ip: str, interface: Optional[Dict[str, Any]] = None,
+                 subnet: Optional[Dict[str, Any]] = None):
+        parsed = ipaddress.ip_address(ip)
+        self.label = label
+        self.kind = kind
+        self.ip = ip
+        self.version = parsed.version
+        self.address = int(parsed)
+        self.interface = interface
+        self.subnet = subnet
+        self.vpc_id = subnet['VpcId'] if subnet else None
+        self.groups: FrozenSet[str] = frozenset(g['GroupId'] for g in (interface or {}).get('Groups', []))
+        self.public_ip = (interface or {}).get('Association', {}).get('PublicIp')
+        # True when the caller addressed the ENI by its public IP rather than a private one
+        self.via_public_ip = bool(self.public_ip) and ip == self.public_ip
+
+    @property
+    def internal(self) -> bool:
+        return self.subnet is not None
+
+
+class ReachabilityEngine:
+    """
+    Answers "can A reach B on this port?" from a TopologySnapshot without further AWS calls.
+
+    Route tables are compiled into per-family prefix tries for longest-prefix match,
+    NACLs into rule lists sorted by rule number, and security groups into flat rule
+    tuples, each once per snapshot and on first use. Endpoint resolution is memoized
+    too, so evaluating a port matrix costs a few dictionary lookups and trie walks
+    per path.
+
+    Args:
+    snapshot (TopologySnapshot): The topology to evaluate against.
+    """
+
+    def __init__(self, snapshot: TopologySnapshot):
+        self.snapshot = snapshot
+        self._route_tries: Dict[str, Dict[int, PrefixTrie]] = {}
+        self._nacl_rules: Dict[Tuple[str, bool], List[tuple]] = {}
+        self._sg_rules: Dict[Tuple[str, bool], List[tuple]] = {}
+        self._endpoints: Dict[str, Endpoint] = {}
+
+    # Compilation
+
+    def _routes(self, route_table: Dict[str, Any]) -> Dict[int, PrefixTrie]:
+        rt_id = route_table['RouteTableId']
+        tries = self._route_tries.get(rt_id)
+        if tries is None:
+            tries = {4: PrefixTrie(4), 6: PrefixTrie(6)}
+            for route in route_table.get('Routes', []):
+                # Prefix-list destinations cannot be resolved from the snapshot and are skipped
+                cidr = route.get('DestinationCidrBlock') or route.get('DestinationIpv6CidrBlock')
+                if cidr:
+                    network = ipaddress.ip_network(cidr, strict=False)
+                    tries[network.version].insert(network, route)
+            self._route_tries[rt_id] = tries
+        return tries
+
+    def _nacl(self, acl: Dict[str, Any], egress: bool) -> List[tuple]:
+        key = (acl['NetworkAclId'], egress)
+        rules = self._nacl_rules.get(key)
+        if rules is None:
+            rules = []
+            for entry in acl.get('Entries', []):
+                if entry.get('Egress', False) != egress:
+                    continue
+                cidr = entry.get('CidrBlock') or entry.get('Ipv6CidrBlock')
+                if not cidr:
+                    continue
+                port_range = entry.get('PortRange') or {}
+                rules.append((entry['RuleNumber'], normalize_protocol(entry.get('Protocol', '-1')),
+                              port_range.get('From', 0), port_range.get('To', 65535),
+                              _compile_cidr(cidr), entry.get('RuleAction') == 'allow'))
+            rules.sort(key=lambda rule: rule[0])
+            self._nacl_rules[key] = rules
+        return rules
+
+    def _security_group(self, group_id: str, egress: bool) -> List[tuple]:
+        key = (group_id, egress)
+        rules = self._sg_rules.get(key)
+        if rules is None:
+            rules = []
+            group = self.snapshot.by_type["security_groups"].get(group_id) or {}
+            for permission in group.get('IpPermissionsEgress' if egress else 'IpPermissions', []):
+                cidrs = [_compile_cidr(r['CidrIp']) for r in permission.get('IpRanges', [])]
+                cidrs += [_compile_cidr(r['CidrIpv6']) for r in permission.get('Ipv6Ranges', [])]
+                groups = frozenset(pair['GroupId'] for pair in permission.get('UserIdGroupPairs', [])
+                                   if pair.get('GroupId'))
+                from_port = permission.get('FromPort', 0)
+                to_port = permission.get('ToPort', 65535)
+                if from_port == -1:
+                    from_port, to_port = 0, 65535
+                rules.append((normalize_protocol(permission.get('IpProtocol', '-1')), from_port, to_port,
+                              cidrs, groups))
+            self._sg_rules[key] = rules
+        return rules
+
+    # Resolution
+
+    def resolve(self, target: str) -> Endpoint:
+        """
+        Resolve an IP address, ENI ID or instance ID to an Endpoint.
+
+        Raises:
+        ValueError: If an ENI or instance ID is not in the snapshot, or the target is not an IP.
+        """
+        endpoint = self._endpoints.get(target)
+        if endpoint is not None:
+            return endpoint
+
+        snapshot = self.snapshot
+        subnets = snapshot.by_type["subnets"]
+        if target.startswith("eni-") or target.startswith("i-"):
+            if target.startswith("eni-"):
+                interface = snapshot.by_type["network_interfaces"].get(target)
+            else:
+                interfaces = sorted(snapshot.interfaces_for_instance(target),
+                                    key=lambda eni: eni.get('Attachment', {}).get('DeviceIndex', 0))
+                interface = interfaces[0] if interfaces else None
+            if interface is None:
+                raise ValueError(f"{target} not found in the {snapshot.region} topology")
+            endpoint = Endpoint(target, "interface", interface['PrivateIpAddress'], interface,
+                                subnets.get(interface['SubnetId']))
+        else:
+            try:
+                ipaddress.ip_address(target)
+            except ValueError:
+                raise ValueError(f"{target} is not an IP address, ENI ID or instance ID")
+            interface = snapshot.interface_for_ip(target)
+            if interface is not None:
+                endpoint = Endpoint(target, "interface", target, interface, subnets.get(interface['SubnetId']))
+            else:
+                subnet = snapshot.subnet_for_ip(target)
+                endpoint = Endpoint(target, "subnet" if subnet else "external", target, subnet=subnet)
+
+        self._endpoints[target] = endpoint
+        return endpoint
+
+    # Evaluation steps
+
+    def _evaluate_nacl(self, subnet_id: str, egress: bool, protocol: str, port: Optional[int],
+                       version: int, address: int) -> Tuple[bool, str, str]:
+        acl = self.snapshot.network_acl_for_subnet(subnet_id)
+        if acl is None:
+            return True, "-", "no network ACL in snapshot"
+        for number, rule_protocol, from_port, to_port, (rule_version, network, mask, cidr), allow \
+                in self._nacl(acl, egress):
+            if rule_version == version and address & mask == network \
+                    and _ports_match(protocol, port, rule_protocol, from_port, to_port):
+                rule = "*" if number == 32767 else number
+                return allow, acl['NetworkAclId'], f"rule {rule} {'allow' if allow else 'deny'} {cidr}"
+        return False, acl['NetworkAclId'], "no rule matched (implicit deny)"
+
+    def _evaluate_security_groups(self, groups: Iterable[str], egress: bool, protocol: str, port: Optional[int],
+                                  version: int, address: int, peer_groups: FrozenSet[str]) -> Tuple[bool, str]:
+        for group_id in groups:
+            for rule_protocol, from_port, to_port, cidrs, referenced in self._security_group(group_id, egress):
+                if not _ports_match(protocol, port, rule_protocol, from_port, to_port):
+                    continue
+                for rule_version, network, mask, cidr in cidrs:
+                    if rule_version == version and address & mask == network:
+                        return True, f"{group_id} allows {cidr}"
+                matched = referenced & peer_groups
+                if matched:
+                    return True, f"{group_id} allows members of {sorted(matched)[0]}"
+        return False, "no rule matched"
+
+    def _route(self, subnet_id: str, version: int, address: int) -> Tuple[Optional[Dict[str, Any]], str, str]:
+        route_table = self.snapshot.route_table_for_subnet(subnet_id)
+        if route_table is None:
+            return None, "-", "no route table"
+        match = self._routes(route_table)[version].longest_match(address)
+        if match is None:
+            return None, route_table['RouteTableId'], "no matching route"
+        return match[2], route_table['RouteTableId'], ""
+
+    @staticmethod
+    def _route_target(route: Dict[str, Any]) -> str:
+        for key in ('GatewayId', 'NatGatewayId', 'TransitGatewayId', 'VpcPeeringConnectionId',
+                    'EgressOnlyInternetGatewayId', 'NetworkInterfaceId', 'InstanceId', 'LocalGatewayId',
+                    'CarrierGatewayId', 'CoreNetworkArn'):
+            if route.get(key):
+                return route[key]
+        return "unknown"
+
+    def check(self, source: str, destination: str, port: Optional[int] = None, protocol: str = "tcp",
+              include_hops: bool = True) -> Dict[str, Any]:
+        """
+        Evaluate one path hop by hop and stop at the first hop that blocks it.
+
+        Checks, in order: source security group egress, source subnet NACL outbound,
+        the source subnet's route (longest-prefix match) and its target, destination
+        subnet NACL inbound, destination security group ingress, and the NACL rules
+        for return traffic (NACLs are stateless, security groups are not). NACLs are
+        skipped when both ends share a subnet. Paths that leave the VPC through a
+        peering connection, transit gateway or similar are reported as "unknown".
+
+        Args:
+        source (str): Source IP, ENI ID or instance ID.
+        destination (str): Destination IP, ENI ID or instance ID.
+        port (Optional[int]): Destination port, required for TCP and UDP.
+        protocol (str): "tcp", "udp", "icmp", "all" or an IP protocol number.
+        include_hops (bool): Include the hop list in the result.
+
+        Returns:
+        Dict[str, Any]: verdict ("reachable", "blocked" or "unknown"), blocked_at and hops.
+        """
+        protocol = normalize_protocol(protocol)
+        if protocol in PORTED_PROTOCOLS and port is None:
+            raise ValueError("port is required for TCP and UDP")
+        src = self.resolve(source)
+        dst = self.resolve(destination)
+        hops: List[Dict[str, Any]] = []
+        verdict = self._evaluate(src, dst, protocol, port, hops)
+        result = {"source": source, "destination": destination, "protocol": protocol, "port": port,
+                  "verdict": verdict,
+                  "blocked_at": hops[-1]["step"] if verdict == BLOCKED else None}
+        if include_hops:
+            result["hops"] = hops
+        return result
+
+    def _evaluate(self, src: Endpoint, dst: Endpoint, protocol: str, port: Optional[int],
+                  hops: List[Dict[str, Any]]) -> str:
+        def hop(step: str, resource: str, allowed: bool, detail: str) -> bool:
+            hops.append({"step": step, "resource": resource, "result": "allow" if allowed else "deny",
+                         "detail": detail})
+            return allowed
+
+        if not src.internal and not dst.internal:
+            hops.append({"step": "resolve", "resource": "-", "result": "unknown",
+                         "detail": "neither endpoint is in the snapshot"})
+            return UNKNOWN
+        if src.version != dst.version:
+            hop("resolve", "-", False, "source and destination use different IP versions")
+            return BLOCKED
+
+        same_subnet = src.internal and dst.internal and src.subnet['SubnetId'] == dst.subnet['SubnetId']
+        # The address the destination sees traffic coming from
+        seen_source_ip = src.ip
+        private_path = False
+
+        if src.internal:
+            source_subnet = src.subnet['SubnetId']
+            # Group references only match traffic sent to private addresses
+            peer_groups = dst.groups if not dst.via_public_ip else frozenset()
+            if src.interface is not None:
+                allowed, detail = self._evaluate_security_groups(
+                    sorted(src.groups), True, protocol, port, dst.version, dst.address, peer_groups)
+                if not hop("source security group egress", ",".join(sorted(src.groups)) or "-", allowed, detail):
+                    return BLOCKED
+            if not same_subnet:
+                allowed, acl_id, detail = self._evaluate_nacl(source_subnet, True, protocol, port,
+                                                              dst.version, dst.address)
+                if not hop("source network ACL outbound", acl_id, allowed, detail):
+                    return BLOCKED
+
+            route, rt_id, detail = self._route(source_subnet, dst.version, dst.address)
+            if route is None:
+                hop("route", rt_id, False, detail)
+                return BLOCKED
+            target = self._route_target(route)
+            cidr = route.get('DestinationCidrBlock') or route.get('DestinationIpv6CidrBlock')
+            if route.get('State') == 'blackhole':
+                hop("route", rt_id, False, f"{cidr} -> {target} is a blackhole")
+                return BLOCKED
+            hop("route", rt_id, True, f"{cidr} -> {target}")
+
+            if target == "local":
+                if not dst.internal or dst.vpc_id != src.vpc_id:
+                    hop("route", rt_id, False, f"no subnet in {src.vpc_id} contains {dst.ip}")
+                    return BLOCKED
+                private_path = True
+            elif target.startswith("igw-") or target.startswith("eigw-"):
+                if target.startswith("igw-"):
+                    if not src.public_ip:
+                        hop("internet gateway", target, False, "source has no public IP")
+                        return BLOCKED
+                    seen_source_ip = src.public_ip
+                hop("internet gateway", target, True, f"leaves {src.vpc_id} as {seen_source_ip}")
+            elif target.startswith("nat-"):
+                natgw = self.snapshot.by_type["nat_gateways"].get(target) or {}
+                if natgw.get('State') != 'available':
+                    hop("NAT gateway", target, False, f"NAT gateway is {natgw.get('State', 'not in snapshot')}")
+                    return BLOCKED
+                nat_route, nat_rt_id, detail = self._route(natgw['SubnetId'], dst.version, dst.address)
+                nat_target = self._route_target(nat_route) if nat_route else ""
+                if not nat_target.startswith("igw-"):
+                    hop("NAT gateway", target, False,
+                        f"NAT subnet {natgw['SubnetId']} has no internet gateway route ({detail or nat_target})")
+                    return BLOCKED
+                addresses = natgw.get('NatGatewayAddresses') or [{}]
+                seen_source_ip = addresses[0].get('PublicIp') or seen_source_ip
+                hop("NAT gateway", target, True, f"translated to {seen_source_ip}, then {nat_target}")
+            else:
+                hops.append({"step": "route", "resource": target, "result": "unknown",
+                             "detail": f"traffic leaves {src.vpc_id} via {target}; not evaluated further"})
+                return UNKNOWN
+
+            if not dst.internal:
+                return self._return_to_source(src, dst, protocol, same_subnet, hop)
+        else:
+            # Inbound from outside: the destination must be addressed by its public IP
+            if not dst.via_public_ip:
+                reason = "destination has no public IP" if not dst.public_ip else \
+                    f"destination is only reachable from outside at {dst.public_ip}"
+                hop("internet gateway", "-", False, reason)
+                return BLOCKED
+            route, rt_id, detail = self._route(dst.subnet['SubnetId'], src.version, src.address)
+            target = self._route_target(route) if route else ""
+            if not target.startswith("igw-"):
+                hop("internet gateway", rt_id, False, f"destination subnet has no internet gateway route "
+                                                      f"for return traffic ({detail or target})")
+                return BLOCKED
+            hop("internet gateway", target, True, f"{dst.public_ip} -> {dst.interface['PrivateIpAddress']}")
+
+        if not private_path and src.internal and dst.internal and not dst.via_public_ip:
+            hop("route", "-", False, f"{dst.ip} is a private address outside {src.vpc_id}")
+            return BLOCKED
+
+        seen = ipaddress.ip_address(seen_source_ip)
+        seen_version, seen_address = seen.version, int(seen)
+        destination_subnet = dst.subnet['SubnetId']
+        if not same_subnet:
+            allowed, acl_id, detail = self._evaluate_nacl(destination_subnet, False, protocol, port,
+                                                          seen_version, seen_address)
+            if not hop("destination network ACL inbound", acl_id, allowed, detail):
+                return BLOCKED
+        if dst.interface is not None:
+            peer_groups = src.groups if private_path else frozenset()
+            allowed, detail = self._evaluate_security_groups(
+                sorted(dst.groups), False, protocol, port, seen_version, seen_address, peer_groups)
+            if not hop("destination security group ingress", ",".join(sorted(dst.groups)) or "-", allowed, detail):
+                return BLOCKED
+        else:
+            hops.append({"step": "destination security group ingress", "resource": "-", "result": "unknown",
+                         "detail": f"no network interface owns {dst.ip}; security groups not evaluated"})
+
+        if not same_subnet:
+            allowed, acl_id, detail = self._evaluate_nacl(destination_subnet, True, protocol, EPHEMERAL_PORT,
+                                                          seen_version, seen_address)
+            if not hop("return: destination network ACL outbound", acl_id, allowed, detail):
+                return BLOCKED
+        if src.internal:
+            return self._return_to_source(src, dst, protocol, same_subnet, hop)
+        return REACHABLE if dst.interface is not None else UNKNOWN
+
+    def _return_to_source(self, src: Endpoint, dst: Endpoint, protocol: str, same_subnet: bool, hop) -> str:
+        if not same_subnet:
+            allowed, acl_id, detail = self._evaluate_nacl(src.subnet['SubnetId'], False, protocol, EPHEMERAL_PORT,
+                                                          dst.version, dst.address)
+            if not hop("return: source network ACL inbound", acl_id, allowed, detail):
+                return BLOCKED
+        return REACHABLE if dst.kind != "subnet" else UNKNOWN
+
+    def check_matrix(self, sources: Iterable[str], destinations: Iterable[str], ports: Iterable[int],
+                     protocol: str = "tcp") -> List[Dict[str, Any]]:
+        """Evaluate every source/destination/port combination, without hop details."""
+        destinations = list(destinations)
+        ports = list(ports)
+        return [self.check(source, destination, port, protocol, include_hops=False)
+                for source in sources for destination in destinations for port in ports]
+
+
+def get_engine(snapshot: TopologySnapshot) -> ReachabilityEngine:
+    """Return the engine for a snapshot, building it once; it goes away with the snapshot."""
+    return snapshot.derived("reachability", ReachabilityEngine)
+
+
+@tool(name="check_reachability",
+      description="Check whether traffic can flow from a source to a destination (IP address, ENI ID or "
+                  "instance ID) on a port, evaluating security groups, network ACLs (including return "
+                  "traffic) and route tables hop by hop. Pass ports to check several ports at once.",
+      properties={
+          "source": {"type": "string", "description": "Source IP address, ENI ID or instance ID"},
+          "destination": {"type": "string", "description": "Destination IP address, ENI ID or instance ID"},
+          "port": {"type": "integer", "minimum": 0, "maximum": 65535,
+                   "description": "Destination port (required for tcp/udp unless ports is given)"},
+          "ports": {"type": "array", "items": {"type": "integer", "minimum": 0, "maximum": 65535},
+                    "description": "Several destination ports to check; returns a compact verdict per port"},
+          "protocol": {"type": "string", "description": "tcp, udp, icmp, all, or an IP protocol number "
+                                                        "(default tcp)"},
+          "region": REGION_PROPERTY,
+          **CACHE_PROPERTIES
+      },
+      required=["source", "destination"])
+def check_reachability(source: str, destination: str, port: Optional[int] = None,
+                       ports: Optional[List[int]] = None, protocol: str = "tcp", region: str = "us-west-2",
+                       force_refresh: bool = False) -> Dict[str, Any]:
+    engine = get_engine(get_snapshot(region, (), force_refresh=force_refresh))
+    if not ports:
+        return engine.check(source, destination, port, protocol)
+    results = engine.check_matrix([source], [destination], ports, protocol)
+    return {
+        "source": source,
+        "destination": destination,
+        "protocol": normalize_protocol(protocol),
+        "reachable_ports": [r["port"] for r in results if r["verdict"] == REACHABLE],
+        "results": [{"port": r["port"], "verdict": r["verdict"], "blocked_at": r["blocked_at"]} for r in results]
+    }
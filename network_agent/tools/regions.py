@@ -0,0 +1,114 @@
+# tools/regions.py
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from aws_clients import get_client
+
+from .cache import cached
+
+logger = logging.getLogger(__name__)
+
+
+# Global cap on concurrent per-region calls across every fan-out in the process
+MAX_REGION_WORKERS = int(os.environ.get("NW_MAX_REGION_WORKERS", "8"))
+# Region used to discover which regions are enabled for the account
+DISCOVERY_REGION = os.environ.get("NW_DISCOVERY_REGION", "us-east-1")
+
+# Schema property shared by every tool that supports multi-region fan-out
+REGIONS_PROPERTIES = {
+    "regions": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Query several regions in one call (e.g., [\"us-east-1\", \"eu-west-1\"]), "
+                       "or [\"all\"] for every enabled region. Overrides region."
+    }
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # One shared pool enforces the global concurrency cap across concurrent fan-outs
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_REGION_WORKERS, thread_name_prefix="region")
+    return _executor
+
+
+@cached('regions')
+def list_enabled_regions(region: str = DISCOVERY_REGION) -> List[str]:
+    """
+    Return the names of all regions enabled for the account.
+
+    Args:
+    region (str): The region to send the DescribeRegions call to.
+
+    Returns:
+    List[str]: Sorted region names.
+    """
+    # DescribeRegions is not paginated and, without AllRegions, lists only enabled regions
+    response = get_client('ec2', region).describe_regions()
+    return sorted(r['RegionName'] for r in response['Regions'])
+
+
+def resolve_regions(regions: Union[str, Sequence[str]]) -> List[str]:
+    """Expand "all" to the enabled regions and de-duplicate an explicit region list."""
+    if isinstance(regions, str):
+        regions = [regions]
+    if any(r.lower() == "all" for r in regions):
+        return list_enabled_regions()
+    return list(dict.fromkeys(regions))
+
+
+def fan_out(func: Callable[..., Dict[str, Any]], regions: Union[str, Sequence[str]],
+            **kwargs: Any) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Call a single-region tool function for many regions concurrently.
+
+    Calls run on a shared worker pool capped at MAX_REGION_WORKERS, so concurrent
+    fan-outs from different sessions never exceed the global limit. A failing region
+    is recorded in the status map and does not affect the others.
+
+    Args:
+    func (Callable[..., Dict[str, Any]]): Tool function taking a region keyword argument.
+    regions (Union[str, Sequence[str]]): Region names, or "all" for every enabled region.
+    **kwargs: Extra keyword arguments passed to every call.
+
+    Returns:
+    Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]: Results for the regions
+        that succeeded, and a per-region status map ({"status": "ok"} or
+        {"status": "error", "error": ...}) covering every region.
+    """
+    region_list = resolve_regions(regions)
+    executor = _get_executor()
+    # Each call runs in a copy of the caller's context, so context variables (e.g., telemetry spans) carry over
+    futures = {region: executor.submit(contextvars.copy_context().run, func, region=region, **kwargs)
+               for region in region_list}
+
+    results = {}
+    status = {}
+    for region, future in futures.items():
+        try:
+            results[region] = future.result()
+            status[region] = {"status": "ok"}
+            if results[region].get('next_token'):
+                status[region]["next_token"] = results[region]['next_token']
+        except Exception as e:
+            logger.error(f"Error querying region {region}: {str(e)}")
+            status[region] = {"status": "error", "error": str(e)}
+    return results, status
+
+
+def merge_region_items(results: Dict[str, Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    """Concatenate the list under key from each region's result, tagging items with their Region."""
+    merged = []
+    for region, result in results.items():
+        merged.extend(dict(item, Region=region) for item in result.get(key, []))
+    return merged
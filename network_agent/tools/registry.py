@@ -0,0 +1,219 @@
+# tools/registry.py
+import importlib
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Schema fragments shared by the tool modules
+REGION_PROPERTY = {"type": "string", "description": "AWS region (e.g., us-west-2)"}
+VPC_ID_PROPERTY = {"type": "string", "description": "VPC ID"}
+
+# Middleware signature: (tool, arguments, call_next) -> result, where call_next(arguments) runs the rest of the chain
+Middleware = Callable[["Tool", Dict[str, Any], Callable[[Dict[str, Any]], Any]], Any]
+
+
+class Tool:
+    """
+    A tool the model can call: its Bedrock spec, input schema and handler, declared once.
+
+    The input schema is compiled into a jsonschema validator on the tool's first call and
+    kept, so later calls only pay for validation, and registering a tool never loads jsonschema.
+
+    Args:
+    name (str): The tool name the model uses.
+    description (str): The description shown to the model.
+    input_schema (Dict[str, Any]): JSON schema of the tool input.
+    handler (Callable[..., Any]): Called with the validated input as keyword arguments.
+    """
+
+    def __init__(self, name: str, description: str, input_schema: Dict[str, Any], handler: Callable[..., Any]):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.module = handler.__module__
+        self.properties = frozenset(input_schema.get("properties", {}))
+        self._validator = None
+        self.spec = {
+            "toolSpec": {
+                "name": name,
+                "description": description,
+                "inputSchema": {"json": input_schema}
+            }
+        }
+
+    @property
+    def validator(self) -> Any:
+        if self._validator is None:
+            from jsonschema.validators import validator_for
+            validator_cls = validator_for(self.input_schema)
+            validator_cls.check_schema(self.input_schema)
+            self._validator = validator_cls(self.input_schema)
+        return self._validator
+
+    def validate(self, arguments: Dict[str, Any]) -> List[str]:
+        """Return human-readable validation errors for the input (empty if valid)."""
+        return [
+            f"{'/'.join(str(p) for p in error.absolute_path) or 'input'}: {error.message}"
+            for error in self.validator.iter_errors(arguments)
+        ]
+
+    def __call__(self, arguments: Dict[str, Any]) -> Any:
+        return self.handler(**arguments)
+
+
+class ToolRegistry:
+    """
+    Name-indexed collection of tools with a single dispatch path.
+
+    Dispatch is a dict lookup followed by schema validation and a middleware chain,
+    which is the one place to hang cross-cutting concerns like caching, timing or
+    concurrency limits.
+
+    Tools can also be declared ahead of registration, by name, spec and the module
+    that registers them (see tools/manifest.py). A declared tool's spec is served
+    as-is, and its module is imported the first time the tool is looked up.
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+        self._declared: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._middleware: List[Middleware] = []
+
+    def register(self, name: str, description: str, handler: Callable[..., Any],
+                 properties: Optional[Dict[str, Any]] = None, required: Iterable[str] = ()) -> Tool:
+        """Register a handler as a tool. Raises ValueError on a duplicate name."""
+        if name in self._tools:
+            raise ValueError(f"Tool already registered: {name}")
+        schema = {"type": "object", "properties": dict(properties or {}), "required": list(required)}
+        tool = Tool(name, description, schema, handler)
+        self._tools[name] = tool
+        return tool
+
+    def tool(self, name: str, description: str, properties: Optional[Dict[str, Any]] = None,
+             required: Iterable[str] = ()) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """
+        Decorator form of register(). The decorated function is returned unchanged.
+
+        Args:
+        name (str): The tool name the model uses.
+        description (str): The description shown to the model.
+        properties (Optional[Dict[str, Any]]): JSON schema properties of the tool input.
+        required (Iterable[str]): Names of required properties.
+        """
+        def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(name, description, handler, properties, required)
+            return handler
+        return decorator
+
+    def declare(self, name: str, module: str, spec: Dict[str, Any]) -> None:
+        """Declare a tool registered by importing module, without importing it yet."""
+        self._declared[name] = (module, spec)
+
+    def add_middleware(self, middleware: Middleware, outermost: bool = False) -> None:
+        """
+        Add a middleware. Middleware added first runs outermost, unless outermost is set,
+        which puts this one outside every middleware added so far.
+        """
+        if outermost:
+            self._middleware.insert(0, middleware)
+        else:
+            self._middleware.append(middleware)
+
+    def get(self, name: str) -> Optional[Tool]:
+        """Return a tool by name, importing its module first if it is declared but not registered yet."""
+        tool = self._tools.get(name)
+        if tool is None and name in self._declared:
+            module = self._declared[name][0]
+            start = time.perf_counter()
+            importlib.import_module(module)
+            logger.debug(f"Loaded {module} for tool {name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+            tool = self._tools.get(name)
+        return tool
+
+    def names(self) -> List[str]:
+        return list(self._declared) + [name for name in self._tools if name not in self._declared]
+
+    def specs(self, module: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return Bedrock tool specs, optionally only those declared in one module."""
+        specs = []
+        for name in self.names():
+            tool = self._tools.get(name)
+            tool_module, spec = (tool.module, tool.spec) if tool else self._declared[name]
+            if module is None or tool_module == module:
+                specs.append(spec)
+        return specs
+
+    def call(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Validate arguments and run a tool through the middleware chain.
+
+        Input keys that are not in the tool's schema are ignored, so a model that sends
+        an extra argument still gets an answer.
+
+        Raises:
+        KeyError: If the tool is unknown.
+        ValueError: If the input does not match the tool's schema.
+        """
+        tool = self.get(name)
+        if tool is None:
+            raise KeyError(f"Unknown tool: {name}")
+
+        errors = tool.validate(arguments)
+        if errors:
+            raise ValueError(f"Invalid input for {name}: {'; '.join(errors)}")
+        ignored = [key for key in arguments if key not in tool.properties]
+        if ignored:
+            logger.warning(f"Ignoring unknown input for {name}: {', '.join(ignored)}")
+            arguments = {k: v for k, v in arguments.items() if k in tool.properties}
+
+        call_next = tool
+        for middleware in reversed(self._middleware):
+            call_next = self._bind(middleware, tool, call_next)
+        return call_next(arguments)
+
+    @staticmethod
+    def _bind(middleware: Middleware, tool: Tool, call_next: Callable[[Dict[str, Any]], Any]
+              ) -> Callable[[Dict[str, Any]], Any]:
+        return lambda arguments: middleware(tool, arguments, call_next)
+
+    def dispatch(self, tool_use: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handle a toolUse block from Claude and return the toolResult content block.
+
+        Unknown tools, invalid input and handler exceptions produce an error toolResult
+        rather than raising, so one bad call never fails a batch.
+        """
+        name = tool_use['name']
+        start = time.perf_counter()
+        try:
+            if self.get(name) is None:
+                raise ValueError(f"Unknown tool: {name}")
+            result = self.call(name, tool_use.get('input') or {})
+            status = "error" if isinstance(result, dict) and "error" in result else "success"
+        except Exception as e:
+            logger.error(f"Error in tool {name}: {str(e)}")
+            result = {"error": str(e)}
+            status = "error"
+        logger.debug(f"Tool {name} finished in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return {
+            "toolResult": {
+                "toolUseId": tool_use['toolUseId'],
+                "content": [{"json": result}],
+                "status": status
+            }
+        }
+
+
+_default_registry = ToolRegistry()
+
+# Decorator that registers a tool in the process-wide registry
+tool = _default_registry.tool
+
+
+def get_registry() -> ToolRegistry:
+    """Return the process-wide tool registry."""
+    return _default_registry
@@ -0,0 +1,262 @@
+# tools/sg_index.py
+import ipaddress
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .cache import CACHE_PROPERTIES
+from .interval_tree import IntervalTree
+from .prefix_trie import PrefixTrie
+from .reachability import PORTED_PROTOCOLS, normalize_protocol
+from .regions import REGIONS_PROPERTIES, fan_out, merge_region_items
+from .registry import REGION_PROPERTY, VPC_ID_PROPERTY, tool
+from .topology import TopologySnapshot, get_snapshot
+
+
+# Default number of matching rules returned by one query
+DEFAULT_RULE_LIMIT = 200
+
+DIRECTIONS = ("ingress", "egress")
+PROTOCOL_NAMES = {"-1": "all", "6": "tcp", "17": "udp", "1": "icmp", "58": "icmpv6"}
+# Peer value matching any address on the internet
+INTERNET = "internet"
+
+
+def format_ports(protocol: str, from_port: int, to_port: int) -> str:
+    if protocol == "-1" or (from_port, to_port) in ((0, 65535), (-1, -1)):
+        return "all"
+    return str(from_port) if from_port == to_port else f"{from_port}-{to_port}"
+
+
+class _DirectionIndex:
+    """Indexes for the rules of one direction."""
+
+    def __init__(self):
+        self.ports: Dict[str, IntervalTree] = {}
+        self.by_protocol: Dict[str, List[int]] = defaultdict(list)
+        self.cidrs = {4: PrefixTrie(4), 6: PrefixTrie(6)}
+        self.peers: Dict[str, List[int]] = defaultdict(list)
+        self.all: List[int] = []
+
+
+class SecurityGroupRuleIndex:
+    """
+    Flattened, indexed security group rules for answering audit queries locally.
+
+    Every (group, direction, protocol, port range, peer) combination becomes one rule.
+    Rules are indexed three ways: port ranges in an interval tree per protocol, peer
+    CIDRs in a prefix trie per address family, and peer security groups/prefix
+    lists in a reference map that also forms the group-to-group graph. A query
+    intersects the candidate sets of its predicates, so it touches only matching
+    rules rather than scanning every group.
+
+    Args:
+    security_groups (Iterable[Dict[str, Any]]): Raw DescribeSecurityGroups results.
+    """
+
+    def __init__(self, security_groups: Iterable[Dict[str, Any]]):
+        self.rules: List[Dict[str, Any]] = []
+        self._directions = {direction: _DirectionIndex() for direction in DIRECTIONS}
+        self._by_group: Dict[str, List[int]] = defaultdict(list)
+        self._by_vpc: Dict[str, List[int]] = defaultdict(list)
+        # Group graph: group -> groups its ingress rules allow traffic from, and the reverse
+        self.allows_from: Dict[str, Set[str]] = defaultdict(set)
+        self.allowed_by: Dict[str, Set[str]] = defaultdict(set)
+
+        port_intervals: Dict[str, Dict[str, list]] = {d: defaultdict(list) for d in DIRECTIONS}
+        trie_entries: Dict[str, Dict[Any, List[int]]] = {d: defaultdict(list) for d in DIRECTIONS}
+        networks: Dict[str, Any] = {}
+        for group in security_groups:
+            for direction, key in (("ingress", 'IpPermissions'), ("egress", 'IpPermissionsEgress')):
+                index = self._directions[direction]
+                for permission in group.get(key, []):
+                    protocol = normalize_protocol(permission.get('IpProtocol', '-1'))
+                    from_port = permission.get('FromPort', 0)
+                    to_port = permission.get('ToPort', 65535)
+                    peers = [('cidr', r['CidrIp'], r.get('Description')) for r in permission.get('IpRanges', [])]
+                    peers += [('cidr', r['CidrIpv6'], r.get('Description'))
+                              for r in permission.get('Ipv6Ranges', [])]
+                    peers += [('ref', p['GroupId'], p.get('Description'))
+                              for p in permission.get('UserIdGroupPairs', []) if p.get('GroupId')]
+                    peers += [('ref', p['PrefixListId'], p.get('Description'))
+                              for p in permission.get('PrefixListIds', [])]
+                    for kind, peer, description in peers:
+                        rule_id = len(self.rules)
+                        self.rules.append({
+                            "GroupId": group['GroupId'],
+                            "GroupName": group.get('GroupName'),
+                            "VpcId": group.get('VpcId'),
+                            "Direction": direction,
+                            "Protocol": PROTOCOL_NAMES.get(protocol, protocol),
+                            "Ports": format_ports(protocol, from_port, to_port),
+                            "Peer": peer,
+                            "Description": description or "",
+                        })
+                        index.all.append(rule_id)
+                        index.by_protocol[protocol].append(rule_id)
+                        self._by_group[group['GroupId']].append(rule_id)
+                        self._by_vpc[group.get('VpcId')].append(rule_id)
+                        if protocol in PORTED_PROTOCOLS:
+                            port_intervals[direction][protocol].append((from_port, to_port, rule_id))
+                        if kind == 'cidr':
+                            network = networks.get(peer)
+                            if network is None:
+                                network = networks[peer] = ipaddress.ip_network(peer, strict=False)
+                            trie_entries[direction][network].append(rule_id)
+                        else:
+                            index.peers[peer].append(rule_id)
+                            if direction == "ingress" and peer.startswith("sg-"):
+                                self.allows_from[group['GroupId']].add(peer)
+                                self.allowed_by[peer].add(group['GroupId'])
+
+        for direction, index in self._directions.items():
+            for protocol, intervals in port_intervals[direction].items():
+                index.ports[protocol] = IntervalTree(intervals)
+            for network, rule_ids in trie_entries[direction].items():
+                index.cidrs[network.version].insert(network, rule_ids)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _port_candidates(self, index: _DirectionIndex, protocol: Optional[str], port: Optional[int],
+                         to_port: Optional[int]) -> Optional[Set[int]]:
+        if protocol is None and port is None:
+            return None
+        if protocol == "-1":
+            return set(index.by_protocol.get("-1", []))
+        protocols = [protocol] if protocol else sorted(PORTED_PROTOCOLS)
+        candidates = set(index.by_protocol.get("-1", []))
+        for proto in protocols:
+            if proto in PORTED_PROTOCOLS and port is not None:
+                tree = index.ports.get(proto)
+                if tree is not None:
+                    candidates.update(tree.overlapping(port, port if to_port is None else to_port))
+            else:
+                candidates.update(index.by_protocol.get(proto, []))
+        return candidates
+
+    def _peer_candidates(self, index: _DirectionIndex, peer: str, peer_match: str) -> Set[int]:
+        if peer.startswith("sg-") or peer.startswith("pl-"):
+            return set(index.peers.get(peer, []))
+        if peer == INTERNET:
+            networks = [ipaddress.ip_network("0.0.0.0/0"), ipaddress.ip_network("::/0")]
+        else:
+            networks = [ipaddress.ip_network(peer, strict=False)]
+        candidates: Set[int] = set()
+        for network in networks:
+            trie = index.cidrs[network.version]
+            address, length = int(network.network_address), network.prefixlen
+            if peer_match in ("covers", "overlaps"):
+                # Rules whose CIDR includes the whole peer range
+                for _, _, rule_ids in trie.covering(address, length):
+                    candidates.update(rule_ids)
+            if peer_match in ("within", "overlaps"):
+                # Rules whose CIDR lies inside the peer range
+                for _, _, rule_ids in trie.covered_by(address, length):
+                    candidates.update(rule_ids)
+        return candidates
+
+    def query(self, direction: str = "ingress", protocol: Optional[str] = None, port: Optional[int] = None,
+              to_port: Optional[int] = None, peer: Optional[str] = None, peer_match: str = "covers",
+              vpc_id: Optional[str] = None, group_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return the rules matching every given predicate.
+
+        Args:
+        direction (str): "ingress" or "egress".
+        protocol (Optional[str]): "tcp", "udp", "icmp", "all" or a protocol number. Rules allowing all
+            traffic always match.
+        port (Optional[int]): Match rules allowing this port (or any port in port..to_port).
+        to_port (Optional[int]): End of the port range to match.
+        peer (Optional[str]): CIDR, IP, security group ID, prefix list ID, or "internet".
+        peer_match (str): For CIDR peers: "covers" (rule allows the whole peer range), "within"
+            (rule CIDR lies inside the peer range) or "overlaps" (either).
+        vpc_id (Optional[str]): Only rules of groups in this VPC.
+        group_id (Optional[str]): Only rules of this group.
+
+        Returns:
+        List[Dict[str, Any]]: Matching rules in index order.
+        """
+        if direction not in self._directions:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        if peer_match not in ("covers", "within", "overlaps"):
+            raise ValueError("peer_match must be covers, within or overlaps")
+        index = self._directions[direction]
+        protocol = normalize_protocol(protocol) if protocol is not None else None
+
+        candidate_sets = [self._port_candidates(index, protocol, port, to_port)]
+        if peer:
+            candidate_sets.append(self._peer_candidates(index, peer, peer_match))
+        if vpc_id:
+            candidate_sets.append(set(self._by_vpc.get(vpc_id, [])))
+        if group_id:
+            candidate_sets.append(set(self._by_group.get(group_id, [])))
+        candidate_sets = sorted((s for s in candidate_sets if s is not None), key=len)
+        if not candidate_sets:
+            return [self.rules[rule_id] for rule_id in index.all]
+        matches = candidate_sets[0].intersection(*candidate_sets[1:])
+        # VPC and group sets span both directions
+        return [self.rules[rule_id] for rule_id in sorted(matches) if self.rules[rule_id]["Direction"] == direction]
+
+
+def get_rule_index(snapshot: TopologySnapshot) -> SecurityGroupRuleIndex:
+    """Return the rule index for a snapshot, building it once."""
+    return snapshot.derived("sg_rules", lambda s: SecurityGroupRuleIndex(s.by_type["security_groups"].values()))
+
+
+def query_region_rules(region: str = "us-west-2", limit: int = DEFAULT_RULE_LIMIT, force_refresh: bool = False,
+                       **predicates: Any) -> Dict[str, Any]:
+    """Run a rule query against one region's index and return at most limit rules."""
+    index = get_rule_index(get_snapshot(region, (), force_refresh=force_refresh))
+    rules = index.query(**predicates)
+    result = {"region": region, "total": len(rules), "rules": rules[:limit]}
+    group_id = predicates.get("group_id")
+    if group_id:
+        result["allows_traffic_from_groups"] = sorted(index.allows_from.get(group_id, ()))
+        result["referenced_by_groups"] = sorted(index.allowed_by.get(group_id, ()))
+    return result
+
+
+@tool(name="query_security_group_rules",
+      description="Search security group rules across all VPCs by port, protocol and source/destination, "
+                  "returning only the matching rules. Use it for audits such as \"which groups expose port 22 "
+                  "to the internet\" (port=22, peer=\"internet\") or \"what allows traffic from sg-123\".",
+      properties={
+          "port": {"type": "integer", "minimum": 0, "maximum": 65535,
+                   "description": "Match rules that allow this port (rules allowing all traffic always match)"},
+          "to_port": {"type": "integer", "minimum": 0, "maximum": 65535,
+                      "description": "With port, match rules allowing any port in port..to_port"},
+          "protocol": {"type": "string", "description": "tcp, udp, icmp, all or a protocol number. "
+                                                        "Omit to match tcp and udp."},
+          "peer": {"type": "string",
+                   "description": "Source (ingress) or destination (egress): a CIDR, IP, security group ID, "
+                                  "prefix list ID, or \"internet\" for 0.0.0.0/0 and ::/0"},
+          "peer_match": {"type": "string", "enum": ["covers", "within", "overlaps"],
+                         "description": "For CIDR peers: rules whose CIDR covers the whole peer (default), "
+                                        "lies within it, or either"},
+          "direction": {"type": "string", "enum": list(DIRECTIONS), "description": "Default ingress"},
+          "vpc_id": VPC_ID_PROPERTY,
+          "group_id": {"type": "string", "description": "Only rules of this security group; also returns "
+                                                        "which groups it references and is referenced by"},
+          "limit": {"type": "integer", "minimum": 1,
+                    "description": f"Maximum rules to return per region (default {DEFAULT_RULE_LIMIT})"},
+          "region": REGION_PROPERTY,
+          **REGIONS_PROPERTIES,
+          **CACHE_PROPERTIES
+      })
+def query_security_group_rules(port: Optional[int] = None, to_port: Optional[int] = None,
+                               protocol: Optional[str] = None, peer: Optional[str] = None,
+                               peer_match: str = "covers", direction: str = "ingress",
+                               vpc_id: Optional[str] = None, group_id: Optional[str] = None,
+                               limit: int = DEFAULT_RULE_LIMIT, region: str = "us-west-2",
+                               regions: Optional[List[str]] = None, force_refresh: bool = False) -> Dict[str, Any]:
+    predicates = dict(direction=direction, protocol=protocol, port=port, to_port=to_port, peer=peer,
+                      peer_match=peer_match, vpc_id=vpc_id, group_id=group_id)
+    if regions:
+        results, status = fan_out(query_region_rules, regions, limit=limit, force_refresh=force_refresh,
+                                  **predicates)
+        return {
+            "total": sum(result["total"] for result in results.values()),
+            "rules": merge_region_items(results, "rules"),
+            "regions": status
+        }
+    return query_region_rules(region, limit=limit, force_refresh=force_refresh, **predicates)
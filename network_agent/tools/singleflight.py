@@ -0,0 +1,109 @@
+# tools/singleflight.py
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds a waiting caller tolerates for the call it joined before fetching on its own
+FOLLOWER_TIMEOUT_SECONDS = 60
+
+
+class _Flight:
+    """One in-flight call and how it ended."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical requests into one upstream call.
+
+    The first caller for a key (the leader) runs the function; callers that arrive
+    while it is running wait for it and receive its return value or exception.
+    Nothing is kept once the call ends, so this only merges calls that overlap in
+    time; the describe cache handles repeats. The result is shared, so only bounded
+    calls should go through here. If the leader stalls, its followers call the
+    function themselves.
+    """
+
+    def __init__(self, follower_timeout: float = FOLLOWER_TIMEOUT_SECONDS):
+        self.follower_timeout = follower_timeout
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "coalesced": 0})
+
+    def do(self, key: Hashable, func: Callable[[], Any], label: str = "") -> Any:
+        """
+        Return func(), shared with concurrent callers using the same key.
+
+        Args:
+        key (Hashable): Identifies identical requests.
+        func (Callable[[], Any]): Makes the upstream request.
+        label (str): Groups the stats (e.g., the API name).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            self._stats[label]["calls" if leader else "coalesced"] += 1
+        if leader:
+            return self._lead(key, flight, func)
+        if not flight.done.wait(self.follower_timeout):
+            logger.warning(f"Coalesced {label or 'request'} did not finish in "
+                           f"{self.follower_timeout}s; fetching separately")
+            return func()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _lead(self, key: Hashable, flight: _Flight, func: Callable[[], Any]) -> Any:
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return upstream calls made and calls saved by coalescing, per label."""
+        with self._lock:
+            report = {}
+            for label, counters in self._stats.items():
+                total = counters["calls"] + counters["coalesced"]
+                report[label] = {**counters, "saved_rate": round(counters["coalesced"] / total, 3) if total else 0.0}
+            return report
+
+    def render(self) -> str:
+        """Return the stats as Prometheus text metrics."""
+        lines = [
+            "# HELP nw_aws_calls_coalesced_total Describe calls served from an identical call already in flight",
+            "# TYPE nw_aws_calls_coalesced_total counter",
+        ]
+        for label, counters in self.stats().items():
+            lines.append(f'nw_aws_calls_coalesced_total{{operation="{label}"}} {counters["coalesced"]}')
+        return "\n".join(lines) + "\n"
+
+
+_default_flights = SingleFlight()
+
+
+def get_flights() -> SingleFlight:
+    """Return the process-wide single-flight group."""
+    return _default_flights
+
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Return calls made and saved per API for the process-wide single-flight group."""
+    return _default_flights.stats()
@@ -0,0 +1,302 @@
+# tools/topology.py
+import bisect
+import contextvars
+import ipaddress
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from .cache import CACHE_PROPERTIES, cached
+from .inventory import RESOURCE_TYPES, fetch_resources, record, resource_vpc_ids, stored
+from .registry import REGION_PROPERTY, tool
+
+logger = logging.getLogger(__name__)
+
+
+class TopologySnapshot:
+    """
+    Indexed, in-memory graph of the network resources in one region.
+
+    Built from a single bulk fetch, it answers topology questions (which route table
+    or NACL governs a subnet, which subnet holds an IP, which ENIs belong to an
+    instance or security group) with dictionary lookups and binary searches instead
+    of further AWS calls.
+
+    Args:
+    region (str): The region the resources were fetched from.
+    resources (Dict[str, List[Dict[str, Any]]]): Raw describe results per resource type.
+    """
+
+    def __init__(self, region: str, resources: Dict[str, List[Dict[str, Any]]]):
+        self.region = region
+        self.fetched_at = time.time()
+        self.by_type: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.type_of: Dict[str, str] = {}
+        self.by_vpc: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        self.by_cidr: Dict[str, List[str]] = defaultdict(list)
+
+        for resource_type, (_, _, id_key, _) in RESOURCE_TYPES.items():
+            indexed = {}
+            for resource in resources.get(resource_type, []):
+                resource_id = resource[id_key]
+                indexed[resource_id] = resource
+                self.by_id[resource_id] = resource
+                self.type_of[resource_id] = resource_type
+                for vpc_id in resource_vpc_ids(resource_type, resource):
+                    self.by_vpc[vpc_id][resource_type].append(resource_id)
+            self.by_type[resource_type] = indexed
+
+        self._index_cidrs()
+        self._index_subnets()
+        self._index_interfaces()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    def _index_cidrs(self) -> None:
+        for vpc_id, vpc in self.by_type["vpcs"].items():
+            for assoc in vpc.get('CidrBlockAssociationSet', [{'CidrBlock': vpc.get('CidrBlock')}]):
+                if assoc.get('CidrBlock'):
+                    self.by_cidr[assoc['CidrBlock']].append(vpc_id)
+        # Subnets within a VPC never overlap, so a sorted start list per VPC supports bisect lookups
+        self._subnet_ranges: Dict[str, List[tuple]] = defaultdict(list)
+        for subnet_id, subnet in self.by_type["subnets"].items():
+            if not subnet.get('CidrBlock'):
+                continue  # IPv6-only subnet
+            self.by_cidr[subnet['CidrBlock']].append(subnet_id)
+            network = ipaddress.ip_network(subnet['CidrBlock'])
+            self._subnet_ranges[subnet['VpcId']].append(
+                (int(network.network_address), int(network.broadcast_address), subnet_id))
+        self._subnet_starts = {}
+        for vpc_id, ranges in self._subnet_ranges.items():
+            ranges.sort()
+            self._subnet_starts[vpc_id] = [start for start, _, _ in ranges]
+
+    def _index_subnets(self) -> None:
+        self.main_route_table: Dict[str, str] = {}
+        self.subnet_route_table: Dict[str, str] = {}
+        self.subnet_network_acl: Dict[str, str] = {}
+        self.subnet_nat_gateways: Dict[str, List[str]] = defaultdict(list)
+        for rt_id, rt in self.by_type["route_tables"].items():
+            for assoc in rt.get('Associations', []):
+                if assoc.get('Main'):
+                    self.main_route_table[rt['VpcId']] = rt_id
+                elif assoc.get('SubnetId'):
+                    self.subnet_route_table[assoc['SubnetId']] = rt_id
+        for acl_id, acl in self.by_type["network_acls"].items():
+            for assoc in acl.get('Associations', []):
+                if assoc.get('SubnetId'):
+                    self.subnet_network_acl[assoc['SubnetId']] = acl_id
+        for natgw_id, natgw in self.by_type["nat_gateways"].items():
+            self.subnet_nat_gateways[natgw['SubnetId']].append(natgw_id)
+
+    def _index_interfaces(self) -> None:
+        self.subnet_interfaces: Dict[str, List[str]] = defaultdict(list)
+        self.instance_interfaces: Dict[str, List[str]] = defaultdict(list)
+        self.group_interfaces: Dict[str, List[str]] = defaultdict(list)
+        self.ip_interface: Dict[str, str] = {}
+        for eni_id, eni in self.by_type["network_interfaces"].items():
+            self.subnet_interfaces[eni.get('SubnetId')].append(eni_id)
+            instance_id = eni.get('Attachment', {}).get('InstanceId')
+            if instance_id:
+                self.instance_interfaces[instance_id].append(eni_id)
+            for group in eni.get('Groups', []):
+                self.group_interfaces[group['GroupId']].append(eni_id)
+            for address in eni.get('PrivateIpAddresses', []):
+                self.ip_interface[address['PrivateIpAddress']] = eni_id
+                public_ip = address.get('Association', {}).get('PublicIp')
+                if public_ip:
+                    self.ip_interface[public_ip] = eni_id
+            if eni.get('Association', {}).get('PublicIp'):
+                self.ip_interface[eni['Association']['PublicIp']] = eni_id
+
+    def derived(self, name: str, factory: Callable[["TopologySnapshot"], Any]) -> Any:
+        """
+        Return an index built from this snapshot, building it on first use.
+
+        Lets query engines (reachability, rule indexes) compile their structures once
+        per snapshot; they are discarded together with the snapshot when it expires.
+        """
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = factory(self)
+            return self._derived[name]
+
+    # Query functions
+
+    def get(self, resource_id: str) -> Optional[Dict[str, Any]]:
+        """Return the raw resource for any ID in the snapshot."""
+        return self.by_id.get(resource_id)
+
+    def vpc_ids(self) -> List[str]:
+        return list(self.by_type["vpcs"])
+
+    def resources_in_vpc(self, vpc_id: str, resource_type: str) -> List[Dict[str, Any]]:
+        """Return raw resources of one type in a VPC."""
+        return [self.by_id[rid] for rid in self.by_vpc.get(vpc_id, {}).get(resource_type, [])]
+
+    def route_table_for_subnet(self, subnet_id: str) -> Optional[Dict[str, Any]]:
+        """Return the subnet's explicitly associated route table, or its VPC's main route table."""
+        rt_id = self.subnet_route_table.get(subnet_id)
+        if rt_id is None:
+            subnet = self.by_type["subnets"].get(subnet_id)
+            rt_id = self.main_route_table.get(subnet['VpcId']) if subnet else None
+        return self.by_type["route_tables"].get(rt_id) if rt_id else None
+
+    def network_acl_for_subnet(self, subnet_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_type["network_acls"].get(self.subnet_network_acl.get(subnet_id))
+
+    def subnet_for_ip(self, ip: str, vpc_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the subnet whose CIDR contains the IP, searching one VPC or all of them."""
+        address = ipaddress.ip_address(ip)
+        if address.version != 4:
+            return None
+        address = int(address)
+        for candidate_vpc in ([vpc_id] if vpc_id else list(self._subnet_starts)):
+            starts = self._subnet_starts.get(candidate_vpc, [])
+            index = bisect.bisect_right(starts, address) - 1
+            if index >= 0:
+                start, end, subnet_id = self._subnet_ranges[candidate_vpc][index]
+                if start <= address <= end:
+                    return self.by_type["subnets"][subnet_id]
+        return None
+
+    def interface_for_ip(self, ip: str) -> Optional[Dict[str, Any]]:
+        """Return the ENI that owns a private (or associated public) IP."""
+        eni_id = self.ip_interface.get(ip)
+        return self.by_type["network_interfaces"].get(eni_id) if eni_id else None
+
+    def interfaces_for_instance(self, instance_id: str) -> List[Dict[str, Any]]:
+        return [self.by_id[eni_id] for eni_id in self.instance_interfaces.get(instance_id, [])]
+
+    def interfaces_in_group(self, group_id: str) -> List[Dict[str, Any]]:
+        return [self.by_id[eni_id] for eni_id in self.group_interfaces.get(group_id, [])]
+
+    def is_public_subnet(self, subnet_id: str) -> bool:
+        """A subnet is public when its route table sends a default route to an internet gateway."""
+        rt = self.route_table_for_subnet(subnet_id)
+        return bool(rt) and any(
+            route.get('GatewayId', '').startswith('igw-')
+            and route.get('DestinationCidrBlock') == '0.0.0.0/0'
+            for route in rt['Routes']
+        )
+
+    def vpc_summary(self, vpc_id: str) -> Dict[str, Any]:
+        """
+        Summarize a VPC's topology and flag common health problems.
+
+        Returns:
+        Dict[str, Any]: Gateways, subnets with their route table/NACL/ENI counts, and a list of findings.
+        """
+        vpc = self.by_type["vpcs"].get(vpc_id)
+        if vpc is None:
+            return {"vpc_id": vpc_id, "error": f"VPC {vpc_id} not found in {self.region}"}
+
+        findings = []
+        igws = self.by_vpc[vpc_id]["internet_gateways"]
+        nat_gateways = []
+        for natgw in self.resources_in_vpc(vpc_id, "nat_gateways"):
+            nat_gateways.append({"NatGatewayId": natgw['NatGatewayId'], "SubnetId": natgw['SubnetId'],
+                                 "State": natgw['State']})
+            if natgw['State'] not in ("available", "deleted"):
+                findings.append(f"NAT gateway {natgw['NatGatewayId']} is {natgw['State']}")
+
+        subnets = []
+        for subnet in sorted(self.resources_in_vpc(vpc_id, "subnets"), key=lambda s: s.get('CidrBlock', '')):
+            subnet_id = subnet['SubnetId']
+            rt = self.route_table_for_subnet(subnet_id)
+            acl = self.network_acl_for_subnet(subnet_id)
+            public = self.is_public_subnet(subnet_id)
+            subnets.append({
+                "SubnetId": subnet_id,
+                "CidrBlock": subnet.get('CidrBlock'),
+                "AvailabilityZone": subnet['AvailabilityZone'],
+                "RouteTableId": rt['RouteTableId'] if rt else None,
+                "NetworkAclId": acl['NetworkAclId'] if acl else None,
+                "Public": public,
+                "AvailableIps": subnet.get('AvailableIpAddressCount'),
+                "NetworkInterfaces": len(self.subnet_interfaces.get(subnet_id, [])),
+            })
+            if subnet.get('AvailableIpAddressCount') == 0:
+                findings.append(f"Subnet {subnet_id} has no free IP addresses")
+            if rt is None:
+                findings.append(f"Subnet {subnet_id} has no route table")
+
+        for rt in self.resources_in_vpc(vpc_id, "route_tables"):
+            for route in rt['Routes']:
+                if route.get('State') == 'blackhole':
+                    findings.append(f"Route {route.get('DestinationCidrBlock') or route.get('DestinationPrefixListId')} "
+                                    f"in {rt['RouteTableId']} is a blackhole")
+        if any(s["Public"] for s in subnets) and not igws:
+            findings.append("Public routes exist but no internet gateway is attached")
+
+        return {
+            "vpc_id": vpc_id,
+            "CidrBlocks": [cidr for cidr, ids in self.by_cidr.items() if vpc_id in ids],
+            "IsDefault": vpc.get('IsDefault'),
+            "InternetGateways": igws,
+            "NatGateways": nat_gateways,
+            "RouteTables": len(self.by_vpc[vpc_id]["route_tables"]),
+            "NetworkAcls": len(self.by_vpc[vpc_id]["network_acls"]),
+            "SecurityGroups": len(self.by_vpc[vpc_id]["security_groups"]),
+            "NetworkInterfaces": len(self.by_vpc[vpc_id]["network_interfaces"]),
+            "Subnets": subnets,
+            "Findings": findings,
+        }
+
+
+@cached('topology')
+def get_snapshot(region: str = "us-west-2", vpc_ids: Sequence[str] = ()) -> TopologySnapshot:
+    """
+    Fetch every network resource type for some or all VPCs in a region and index them.
+
+    While the inventory store is fresh the snapshot is built from it without any AWS
+    calls. Otherwise all resource types are fetched concurrently, one paginated
+    stream per type, and a region-wide fetch is written back to the store.
+
+    Args:
+    region (str): The AWS region to snapshot.
+    vpc_ids (Sequence[str]): VPCs to include. Empty means every VPC in the region.
+
+    Returns:
+    TopologySnapshot: The indexed snapshot.
+    """
+    start = time.perf_counter()
+    vpc_ids = sorted(vpc_ids)
+    resources = stored(region, RESOURCE_TYPES, vpc_ids)
+    origin = "inventory store"
+    if resources is None:
+        origin = "AWS"
+        with ThreadPoolExecutor(max_workers=len(RESOURCE_TYPES), thread_name_prefix="topology") as executor:
+            # Each fetch runs in a copy of the caller's context (force_refresh, telemetry spans)
+            futures = {rtype: executor.submit(contextvars.copy_context().run, fetch_resources, region, rtype, vpc_ids)
+                       for rtype in RESOURCE_TYPES}
+            resources = {rtype: future.result() for rtype, future in futures.items()}
+        if not vpc_ids:
+            record(region, resources)
+    snapshot = TopologySnapshot(region, resources)
+    logger.info(f"Built topology snapshot for {region} ({len(snapshot.by_id)} resources) from {origin} "
+                f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return snapshot
+
+
+@tool(name="get_vpc_topology",
+      description="Get a one-shot topology and health summary of one or more VPCs: gateways, subnets with "
+                  "their route tables, NACLs and public/private status, resource counts and detected problems. "
+                  "Prefer this over calling the individual VPC, subnet, route table and NACL tools.",
+      properties={
+          "vpc_ids": {"type": "array", "items": {"type": "string"},
+                      "description": "VPC IDs to summarize. Omit for every VPC in the region."},
+          "region": REGION_PROPERTY,
+          **CACHE_PROPERTIES
+      })
+def get_vpc_topology(vpc_ids: Optional[Iterable[str]] = None, region: str = "us-west-2",
+                     force_refresh: bool = False) -> Dict[str, Any]:
+    snapshot = get_snapshot(region, tuple(sorted(vpc_ids or ())), force_refresh=force_refresh)
+    return {
+        "region": region,
+        "vpcs": [snapshot.vpc_summary(vpc_id) for vpc_id in (vpc_ids or snapshot.vpc_ids())]
+    }
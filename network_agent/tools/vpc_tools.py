@@ -1,72 +1,89 @@
-import boto3
+from .cache import CACHE_PROPERTIES, cached
+from .inventory import from_inventory
+from .pagination import DEFAULT_MAX_RESULTS, PAGING_PROPERTIES, ResourcePager, vpc_filter, with_next_token
+from .regions import REGIONS_PROPERTIES, fan_out, merge_region_items
+from .registry import REGION_PROPERTY, VPC_ID_PROPERTY, tool
 
 
-def list_vpcs(region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_vpcs()
+@cached('vpcs')
+def list_region_vpcs(region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_vpcs', 'Vpcs', max_results=max_results, next_token=next_token)
     vpcs = [{'VpcId': vpc['VpcId'], 'CidrBlock': vpc['CidrBlock'], 
-             'IsDefault': vpc['IsDefault']} for vpc in response['Vpcs']]
-    return {
+             'IsDefault': vpc['IsDefault']} for vpc in from_inventory(pager, 'vpcs')]
+    return with_next_token({
         'vpcs': vpcs,
         "region": region
-    }
+    }, pager)
 
-def check_internet_gateway(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_internet_gateways(
-        Filters=[
-            {
-                'Name': 'attachment.vpc-id',
-                'Values': [vpc_id]
-            }
-        ]
-    )
+@tool(name="list_vpcs",
+      description="List VPCs in a specified AWS region, or in several regions at once",
+      properties={'region': REGION_PROPERTY, **REGIONS_PROPERTIES, **PAGING_PROPERTIES, **CACHE_PROPERTIES})
+def list_vpcs(region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None, regions=None,
+              force_refresh=False):
+    if regions:
+        # Fan out across regions; max_results applies per region
+        results, status = fan_out(list_region_vpcs, regions, max_results=max_results,
+                                  force_refresh=force_refresh)
+        return {
+            'vpcs': merge_region_items(results, 'vpcs'),
+            'regions': status
+        }
+    return list_region_vpcs(region, max_results=max_results, next_token=next_token,
+                            force_refresh=force_refresh)
+
+@tool(name="check_internet_gateway",
+      description="Check Internet Gateway for a specified VPC",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('internet_gateways')
+def check_internet_gateway(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_internet_gateways', 'InternetGateways',
+                          max_results=max_results, next_token=next_token,
+                          Filters=vpc_filter(vpc_id, 'attachment.vpc-id'))
     internet_gateways = [
         {
             'InternetGatewayId': ig['InternetGatewayId'],
             'AttachedToVpc': vpc_id in [att['VpcId'] for att in ig['Attachments']]
-        } for ig in response['InternetGateways']
+        } for ig in from_inventory(pager, 'internet_gateways', vpc_id)
     ]
-    return {
+    return with_next_token({
         'vpc_id': vpc_id,
         'internetGateways': internet_gateways
-    }
+    }, pager)
 
-def check_nat_gateway(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_nat_gateways(
-        Filters=[
-            {
-                'Name': 'vpc-id',
-                'Values': [vpc_id]
-            }
-        ]
-    )
+@tool(name="check_nat_gateway",
+      description="Check NAT Gateway for a specified VPC",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('nat_gateways')
+def check_nat_gateway(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_nat_gateways', 'NatGateways',
+                          max_results=max_results, next_token=next_token,
+                          Filters=vpc_filter(vpc_id))
     nat_gateways = [
         {
             'NatGatewayId': natgw['NatGatewayId'],
             'SubnetId': natgw['SubnetId'],
             'State': natgw['State'],
             'PublicIp': natgw['NatGatewayAddresses'][0]['PublicIp'] if natgw['NatGatewayAddresses'] else None
-        } for natgw in response['NatGateways']
+        } for natgw in from_inventory(pager, 'nat_gateways', vpc_id)
     ]
-    return {
+    return with_next_token({
         'vpc_id': vpc_id,
         'NatGateways': nat_gateways
-    }
+    }, pager)
 
-def get_route_tables(vpc_id, region="us-west-2"):
-    ec2 = boto3.client('ec2', region_name=region)
-    response = ec2.describe_route_tables(
-        Filters=[
-            {
-                'Name': 'vpc-id',
-                'Values': [vpc_id]
-            }
-        ]
-    )
+@tool(name="get_route_tables",
+      description="Get route tables for a specified VPC",
+      properties={'vpc_id': VPC_ID_PROPERTY, 'region': REGION_PROPERTY, **PAGING_PROPERTIES, **CACHE_PROPERTIES},
+      required=['vpc_id'])
+@cached('route_tables')
+def get_route_tables(vpc_id, region="us-west-2", max_results=DEFAULT_MAX_RESULTS, next_token=None):
+    pager = ResourcePager(region, 'describe_route_tables', 'RouteTables',
+                          max_results=max_results, next_token=next_token,
+                          Filters=vpc_filter(vpc_id))
     route_tables = []
-    for rt in response['RouteTables']:
+    for rt in from_inventory(pager, 'route_tables', vpc_id):
         routes = []
         for route in rt['Routes']:
             route_data = {
@@ -85,102 +102,7 @@ def get_route_tables(vpc_id, region="us-west-2"):
             'Routes': routes
         })
     
-    return {
+    return with_next_token({
         'vpc_id': vpc_id,
         'routeTables': route_tables
-    }
-
-
-vpc_tools = [
-    {
-        "toolSpec": {
-            "name": "list_vpcs",
-            "description": "List VPCs in a specified AWS region",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    }
-                }
-            }
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "check_internet_gateway",
-            "description": "Check Internet Gateway for a specified VPC",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "check_nat_gateway",
-            "description": "Check NAT Gateway for a specified VPC",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    },
-    {
-        "toolSpec": {
-            "name": "get_route_tables",
-            "description": "Get route tables for a specified VPC",
-            "inputSchema": {
-                "json": {
-                    "type": "object",
-                    "properties": {
-                        "vpc_id": {"type": "string", "description": "VPC ID"},
-                        "region": {"type": "string", "description": "AWS region (e.g., us-west-2)"}
-                    },
-                    "required": ["vpc_id"]
-                }
-            }
-        }
-    }
-]
-
-
-def handle_vpc_tool(tool_use):
-    tool_name = tool_use['name']
-    input_data = tool_use['input']
-    
-    if tool_name == "list_vpcs":
-        result = list_vpcs(region=input_data.get('region', 'us-west-2'))
-    elif tool_name == "check_internet_gateway":
-        result = check_internet_gateway(input_data['vpc_id'], region=input_data.get('region', 'us-west-2'))
-    elif tool_name == "check_nat_gateway":
-        result = check_nat_gateway(input_data['vpc_id'], region=input_data.get('region', 'us-west-2'))
-    elif tool_name == "get_route_tables":
-        result = get_route_tables(input_data['vpc_id'], region=input_data.get('region', 'us-west-2'))
-    else:
-        result = {"error": f"Unknown VPC tool: {tool_name}"}
-
-    return {
-        "role": "user",
-        "content": [
-            {
-                "toolResult": {
-                    "toolUseId": tool_use['toolUseId'],
-                    "content": [{"json": result}],
-                    "status": "success"
-                }
-            }
-        ]
-    }
+    }, pager)
@@ -0,0 +1,91 @@
+# transcript.py
+import json
+from typing import Any, Dict, List, Optional
+
+
+class Transcript:
+    """
+    The display form of a conversation, kept in step with its message history.
+
+    Each user question becomes one entry, and everything Claude sends back until the next
+    question (text, tool calls and their outcomes) becomes a single assistant entry, so tool
+    traffic is shown collapsed under the reply rather than as messages of its own. Messages
+    are only ever appended to the history, so sync() processes just the new ones; entries
+    that are already built are never recomputed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.entries: List[Dict[str, Any]] = []
+        self._synced = 0
+        # Tool calls still waiting for their result, by toolUseId
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def sync(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        Add the messages appended since the last sync.
+
+        Args:
+        messages (List[Dict[str, Any]]): The conversation history.
+
+        Returns:
+        int: The number of messages processed.
+        """
+        if len(messages) < self._synced:
+            # The history was replaced or trimmed, so start over
+            self.reset()
+        new = messages[self._synced:]
+        for message in new:
+            self._add(message)
+        self._synced = len(messages)
+        return len(new)
+
+    def _add(self, message: Dict[str, Any]) -> None:
+        text = "".join(item["text"] for item in message["content"] if "text" in item)
+        if message["role"] == "user":
+            for item in message["content"]:
+                if "toolResult" in item:
+                    call = self._pending.pop(item["toolResult"].get("toolUseId"), None)
+                    if call is not None:
+                        call["status"] = item["toolResult"].get("status", "success")
+            if text:
+                self.entries.append({"role": "user", "text": text, "tool_calls": []})
+            return
+        entry = self._reply()
+        if text:
+            entry["text"] = f"{entry['text']}\n\n{text}" if entry["text"] else text
+        for item in message["content"]:
+            if "toolUse" in item:
+                tool_use = item["toolUse"]
+                call = {"name": tool_use["name"], "input": tool_use.get("input", {}), "status": "pending"}
+                entry["tool_calls"].append(call)
+                self._pending[tool_use["toolUseId"]] = call
+
+    def _reply(self) -> Dict[str, Any]:
+        # The assistant entry of the current turn, started on its first message
+        if not self.entries or self.entries[-1]["role"] != "assistant":
+            self.entries.append({"role": "assistant", "text": "", "tool_calls": []})
+        return self.entries[-1]
+
+    def window(self, size: int) -> List[Dict[str, Any]]:
+        """Return the most recent size entries."""
+        return self.entries[-size:] if size > 0 else []
+
+    def last_reply(self) -> Optional[Dict[str, Any]]:
+        """Return the newest assistant entry, if the conversation ends with one."""
+        if self.entries and self.entries[-1]["role"] == "assistant":
+            return self.entries[-1]
+        return None
+
+
+def format_tool_call(call: Dict[str, Any]) -> str:
+    """Return a one-line markdown summary of a tool call: its name, input and outcome."""
+    arguments = ", ".join(f"{key}={json.dumps(value, default=str)}" for key, value in call["input"].items())
+    line = f"`{call['name']}({arguments})`"
+    if call["status"] == "error":
+        line += " failed"
+    elif call["status"] == "pending":
+        line += " (no result)"
+    return line